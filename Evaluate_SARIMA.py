@@ -1,67 +1,128 @@
+import os
+import time
 import pandas as pd
 import matplotlib.pyplot as plt
-from statsmodels.tsa.statespace.sarimax import SARIMAX
 from statsmodels.tsa.stattools import adfuller
 from statsmodels.graphics.tsaplots import plot_acf, plot_pacf
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 from pmdarima import auto_arima
 import numpy as np
 
-df_day = pd.read_csv("Katherine_InputData_Time_Series.csv")
-df_day.columns = df_day.columns.str.strip()
-df_day['Date'] = pd.to_datetime(df_day['Date'], dayfirst=True, errors='coerce')
-df_day = df_day.dropna(subset=['Date'])
+from experiment_store import auto_arima_trial, trial_fingerprint
+from model_store import data_fingerprint
+from sarima_backtest import walk_forward_backtest
+from fourier_terms import DAILY_MODES, fourier_terms
+from monthly_data import load_frames, monthly_means
+from sarima_fit import refit_sarimax
+from sarima_search import best_candidate, search_orders
 
+# Modes of run_sarima_forecast
+MODES = ('monthly', 'wet_season') + DAILY_MODES
 
-def run_sarima_forecast(df_input, mode='monthly', seasonal_period=12):
+
+def _show(figure_dir, *names):
+    """Show the open figures, or save them as <figure_dir>/<name>.png (one name per figure) and close them."""
+    if figure_dir is None:
+        plt.show()
+        return
+    os.makedirs(figure_dir, exist_ok=True)
+    for num, name in zip(plt.get_fignums(), names):
+        plt.figure(num).savefig(os.path.join(figure_dir, f'{name}.png'), dpi=100)
+    plt.close('all')
+
+
+def run_sarima_forecast(df_input, mode='monthly', seasonal_period=12, exog_vars=None,
+                        order_search='stepwise', n_jobs=None, search_timeout=None,
+                        backtest_origins=None, backtest_horizon=24, refit_every=None, fourier_harmonics=2,
+                        df_monthly=None, figure_dir=None, store=None, site=None):
     """
-    Run SARIMA forecasting on soil temperature data in two modes:
+    Run SARIMA forecasting on soil temperature data in one of four modes:
     - 'monthly': Full year data
     - 'wet_season': Only wet season months (December, January, February)
+    - 'daily' / 'daily_wet_season': Daily data (all days or wet season days), with
+      the annual cycle as Fourier regressors next to a low-order ARIMA
 
     Parameters:
         df_input: pandas DataFrame with columns 'Date' and 'Soil_Temperature'
-        mode: 'monthly' or 'wet_season'
-        forecast_periods: Number of steps to forecast
+        mode: one of MODES: 'monthly', 'wet_season', 'daily' or 'daily_wet_season'
+        exog_vars: list of column names to use as exogenous regressors (observed
+                   values are used over the test period)
         seasonal_period: Seasonal period (12 for monthly, 3 for wet season)
+        order_search: 'stepwise' (auto_arima), 'grid' (exhaustive search across a process pool)
+                      or 'screened' (grid ranked by a cheap regression, top 10 fitted)
+        n_jobs: worker processes for the grid search (default: all cores)
+        search_timeout: time budget in seconds for the grid search
+        backtest_origins: number of rolling forecast origins for a walk-forward
+                          backtest over the test period (None = single split only)
+        backtest_horizon: maximum horizon of the walk-forward backtest
+        refit_every: re-estimate the parameters every N steps during the backtest
+        fourier_harmonics: Fourier pairs for the annual cycle in the daily modes
+                           (1 = annual, 2 = annual + semi-annual)
+        df_monthly: monthly means of df_input if already computed (e.g. by load_frames)
+        figure_dir: save the figures to this directory instead of showing them
+        store: experiment_store.ExperimentStore recording every order-search
+               trial and the run's metrics (grid searches also reuse the
+               trials recorded for the same data)
+        site: site name recorded with the trials and the run
+
+    Returns:
+        dict of the test-period metrics (MAE, MSE, RMSE, R2), the selected
+        orders and AIC, and the mean backtest MAE/RMSE when a backtest is run
     """
 
-    df = df_day.copy()
+    start = time.perf_counter()
+    df = df_input.copy()
     df['Date'] = pd.to_datetime(df['Date'])
     df['Year'] = df['Date'].dt.year
     df['Month'] = df['Date'].dt.month
 
+    if exog_vars is None:
+        exog_vars = []
+    columns_needed = ['Soil_Temperature'] + list(exog_vars)
+
     # Monthly average
-    df_monthly = df.groupby(['Year', 'Month']).mean(numeric_only=True).reset_index()
-    df_monthly = df_monthly.dropna(subset=['Soil_Temperature'])
-    df_monthly['Date'] = pd.to_datetime(df_monthly[['Year', 'Month']].assign(DAY=1))
-    df_monthly = df_monthly.sort_values('Date').set_index('Date')
-    df_monthly = df_monthly[['Soil_Temperature']]
+    df_monthly = monthly_means(df) if df_monthly is None else df_monthly.copy()
+    df_monthly = df_monthly.dropna(subset=columns_needed)
+    df_monthly = df_monthly[columns_needed]
 
     if mode == 'wet_season':
         df_monthly['Month'] = df_monthly.index.month
         df_model = df_monthly[df_monthly['Month'].isin([12, 1, 2])]
         seasonal_period = 3  # override
-
-    if mode == 'daily_wet_season':
+    elif mode == 'daily':
+        df_model = df.set_index('Date')
+    elif mode == 'daily_wet_season':
         df_model = df[df['Month'].isin([12, 1, 2])].copy()
         df_model = df_model.set_index('Date')
-        seasonal_period = 365
     else:
         df_model = df_monthly.copy()
 
     #df_model.index.freq = 'MS'
-    df_model = df_model[['Soil_Temperature']]
+    df_model = df_model[columns_needed].dropna()
+
+    # A 365-day seasonal state space is far too large to fit; the daily modes
+    # carry the annual cycle in a few Fourier regressors next to a low-order,
+    # undifferenced (d=0) ARIMA with an intercept
+    fourier_cols = []
+    if mode in DAILY_MODES:
+        fourier = fourier_terms(df_model.index, harmonics=fourier_harmonics)
+        df_model = df_model.join(fourier)
+        fourier_cols = list(fourier.columns)
+        seasonal_period = 1
+    # Thousands of daily observations make every ARMA candidate slow to fit (the MA
+    # terms most of all), so the daily search stops at ARMA(2,1)
+    max_p, max_q = (2, 1) if fourier_cols else (3, 3)
+    model_exog_vars = list(exog_vars) + fourier_cols
 
     print(f"\n--- Mode: {mode.upper()} | Data Points: {len(df_model)} ---")
 
     # Plot data
     plt.figure(figsize=(10, 4))
-    plt.plot(df_model.index, df_model['Soil_Temperature'], marker='o')
+    plt.plot(df_model.index, df_model['Soil_Temperature'], marker='o' if mode not in DAILY_MODES else None)
     plt.title(f"Soil Temperature - {mode}")
     plt.grid(True)
     plt.tight_layout()
-    plt.show()
+    _show(figure_dir, 'series')
 
     # Check stationarity
     adf_result = adfuller(df_model['Soil_Temperature'])
@@ -70,39 +131,86 @@ def run_sarima_forecast(df_input, mode='monthly', seasonal_period=12):
     # ACF & PACF plots
     plot_acf(df_model['Soil_Temperature'])
     plot_pacf(df_model['Soil_Temperature'])
-    plt.show()
+    _show(figure_dir, 'acf', 'pacf')
 
     # Train/Test split
     split_index = int(len(df_model) * 0.8)
     train = df_model.iloc[:split_index]
     test = df_model.iloc[split_index:]
+    train_exog = train[model_exog_vars] if model_exog_vars else None
+    test_exog = test[model_exog_vars] if model_exog_vars else None
+    train_endog = train['Soil_Temperature']
+
+    # Dates with gaps (e.g. wet seasons only) have no frequency statsmodels can
+    # forecast from; such series are modelled on positions and dated afterwards
+    if df_model.index.inferred_freq is None:
+        train_endog = train_endog.reset_index(drop=True)
+        if train_exog is not None:
+            train_exog = train_exog.reset_index(drop=True)
+            test_exog = test_exog.set_axis(pd.RangeIndex(len(train), len(df_model)))
 
     # Auto ARIMA
-    auto_model = auto_arima(
-        train['Soil_Temperature'],
-        seasonal=True,
-        m=seasonal_period,
-        start_p=0, start_q=0, max_p=3, max_q=3,
-        start_P=0, start_Q=0, max_P=2, max_Q=2,
-        d=None, D=None,
-        trace=True,
-        error_action='ignore',
-        suppress_warnings=True,
-        stepwise=True
-    )
-    print(auto_model.summary())
-
-    # SARIMA model
-    order = auto_model.order
-    seasonal_order = auto_model.seasonal_order
-    model = SARIMAX(train['Soil_Temperature'], order=order, seasonal_order=seasonal_order)
-    results = model.fit()
+    if order_search in ('grid', 'screened'):
+        # Exhaustive (p,d,q)(P,D,Q,m) grid fitted across a process pool; 'screened'
+        # ranks the grid by Hannan-Rissanen regressions and fits only the top 10
+        search_table = search_orders(
+            train_endog,
+            exog=train_exog,
+            m=seasonal_period,
+            d=0 if fourier_cols else None,
+            with_intercept=True if fourier_cols else 'auto',
+            max_p=max_p, max_q=max_q, max_P=2, max_Q=2,
+            trace=True,
+            n_jobs=n_jobs,
+            timeout=search_timeout,
+            prescreen_top_k=10 if order_search == 'screened' else None,
+            store=store,
+            store_labels={'site': site, 'mode': mode}
+        )
+        print(search_table[['order', 'seasonal_order', 'aic', 'bic', 'screen_ic', 'fit_time', 'status']].to_string())
+        best = best_candidate(search_table)
+        order = best['order']
+        seasonal_order = best['seasonal_order']
+        source = best['params']
+    else:
+        auto_fits = auto_arima(
+            train_endog,
+            X=train_exog,
+            seasonal=seasonal_period > 1,
+            m=seasonal_period,
+            start_p=0, start_q=0, max_p=max_p, max_q=max_q,
+            start_P=0, start_Q=0, max_P=2, max_Q=2,
+            d=0 if fourier_cols else None, D=None,
+            with_intercept=True if fourier_cols else 'auto',
+            trace=True,
+            error_action='ignore',
+            suppress_warnings=True,
+            stepwise=True,
+            return_valid_fits=store is not None
+        )
+        if store is not None:
+            # Every model the stepwise search fitted is recorded (only grid searches look trials up)
+            store.record_trials(trial_fingerprint(train_endog, train_exog, {'fitter': 'pmdarima'}),
+                                [auto_arima_trial(fit) for fit in auto_fits], site=site, mode=mode,
+                                source='auto_arima')
+            auto_model = min(auto_fits, key=lambda fit: fit.aic())
+        else:
+            auto_model = auto_fits
+        print(auto_model.summary())
+        order = auto_model.order
+        seasonal_order = auto_model.seasonal_order
+        source = auto_model
+
+    # SARIMA model, reusing the estimates from the order search
+    results = refit_sarimax(train_endog, order, seasonal_order, exog=train_exog, source=source)
     print(results.summary())
 
     # Forecast
-    forecast = results.get_forecast(steps=len(test))
+    forecast = results.get_forecast(steps=len(test), exog=test_exog)
     forecast_mean = forecast.predicted_mean
     forecast_ci = forecast.conf_int()
+    forecast_mean.index = test.index
+    forecast_ci.index = test.index
 
     # Plot forecast
     plt.figure(figsize=(14, 6))
@@ -115,20 +223,62 @@ def run_sarima_forecast(df_input, mode='monthly', seasonal_period=12):
     plt.ylabel('Soil Temperature (°C)')
     plt.legend()
     plt.tight_layout()
-    plt.show()
+    _show(figure_dir, 'forecast')
 
     # Evaluate
-    mae = mean_absolute_error(df_model.iloc[split_index:], forecast_mean)
-    mse = mean_squared_error(df_model.iloc[split_index:], forecast_mean)
-    r2 = r2_score(df_model.iloc[split_index:], forecast_mean)
+    mae = mean_absolute_error(test['Soil_Temperature'], forecast_mean)
+    mse = mean_squared_error(test['Soil_Temperature'], forecast_mean)
+    r2 = r2_score(test['Soil_Temperature'], forecast_mean)
     print(f" Evaluation ({mode}):")
     print(f"MAE: {mae:.3f}")
     print(f"MSE: {mse:.3f}")
     print(f"R²: {r2:.3f}")
+    evaluation = {'mode': mode, 'exog_vars': ', '.join(exog_vars), 'observations': len(df_model),
+                  'order': order, 'seasonal_order': seasonal_order, 'aic': results.aic, 'adf_pvalue': adf_result[1],
+                  'MAE': mae, 'MSE': mse, 'RMSE': np.sqrt(mse), 'R2': r2}
+
+    # Walk-forward backtest: roll the fitted model through the test period
+    if backtest_origins:
+        horizon = min(backtest_horizon, len(test))
+        n_origins = min(backtest_origins, len(test) - horizon + 1)
+        metrics, _ = walk_forward_backtest(results, df_model['Soil_Temperature'],
+                                           exog=df_model[model_exog_vars] if model_exog_vars else None, horizon=horizon,
+                                           n_origins=n_origins, refit_every=refit_every)
+        print(f" Walk-forward backtest ({mode}): {n_origins} origins, "
+              f"{metrics.attrs['n_refits']} re-estimation(s), {metrics.attrs['seconds']:.2f} s")
+        print(metrics.round(3).to_string())
+
+        plt.figure(figsize=(10, 4))
+        plt.plot(metrics.index, metrics['MAE'], marker='o', label='MAE')
+        plt.plot(metrics.index, metrics['RMSE'], marker='o', label='RMSE')
+        plt.title(f'Walk-forward Backtest Error by Horizon - {mode}')
+        plt.xlabel('Horizon (steps ahead)')
+        plt.ylabel('Error (°C)')
+        plt.grid(True)
+        plt.legend()
+        plt.tight_layout()
+        _show(figure_dir, 'backtest')
+        evaluation.update({'backtest_MAE': metrics['MAE'].mean(), 'backtest_RMSE': metrics['RMSE'].mean()})
+
+    if store is not None:
+        store.record_run(evaluation, site=site, fingerprint=data_fingerprint(df_model), order_search=order_search,
+                         seconds=time.perf_counter() - start,
+                         settings={'seasonal_period': seasonal_period, 'fourier_harmonics': fourier_harmonics,
+                                   'backtest_origins': backtest_origins, 'backtest_horizon': backtest_horizon,
+                                   'refit_every': refit_every})
+
+    return evaluation
+
+# The guard keeps worker processes of the grid search from re-running the forecasts
+if __name__ == '__main__':
+    # Typed daily frame and monthly means, from the preprocessing cache after the first run
+    df_day, df_month = load_frames("Katherine_InputData_Time_Series.csv")
 
-# Forecast for full year (monthly)
-run_sarima_forecast(df_day, mode='monthly', seasonal_period=12)
-# Forecast for wet season only
-#run_sarima_forecast(df_day, mode='wet_season', seasonal_period=3)
-# Forecast for wet season only
-#run_sarima_forecast(df_day, mode='daily_wet_season', seasonal_period=365)
\ No newline at end of file
+    # Forecast for full year (monthly)
+    run_sarima_forecast(df_day, mode='monthly', seasonal_period=12, backtest_origins=30, backtest_horizon=24, df_monthly=df_month)
+    # Forecast for wet season only
+    #run_sarima_forecast(df_day, mode='wet_season', seasonal_period=3, df_monthly=df_month)
+    # Forecast for wet season only
+    #run_sarima_forecast(df_day, mode='daily_wet_season', df_monthly=df_month)
+    # Forecast for all days, annual + semi-annual cycle as Fourier terms
+    #run_sarima_forecast(df_day, mode='daily', fourier_harmonics=2)
\ No newline at end of file
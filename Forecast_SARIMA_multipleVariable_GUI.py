@@ -1,188 +1,177 @@
-import pandas as pd
-import matplotlib.pyplot as plt
 from tkinter import *
 from tkinter import messagebox
 from datetime import datetime
-from pmdarima import auto_arima
-from statsmodels.tsa.statespace.sarimax import SARIMAX
-
-# --- Load & preprocess data ---
-df_day = pd.read_csv("Katherine_InputData_Time_Series.csv")
-df_day.columns = df_day.columns.str.strip()
-df_day['Date'] = pd.to_datetime(df_day['Date'], dayfirst=True, errors='coerce')
-df_day = df_day.dropna(subset=['Date'])
-df_day['Year'] = df_day['Date'].dt.year
-df_day['Month'] = df_day['Date'].dt.month
-
-# Select exogenous variables you want to include
+from concurrent.futures import ThreadPoolExecutor
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+
+from forecast_service import ForecastService, parse_site
+
+# Fitted models for every site / exogenous set used in this session are kept
+# in an LRU cache, so switching back to one of them does not refit. Models
+# that need fitting are fitted in parallel worker processes.
+# Forecasts (mean + CI) are precomputed to max_horizon months and sliced per request
+service = ForecastService(max_models=8, max_horizon=60)
+
+# Exogenous variables included by default
 exog_vars = ['T.Max', 'Radn', 'RHminT']
 
-df_monthly = df_day.groupby(['Year', 'Month']).mean(numeric_only=True).reset_index()
-df_monthly = df_monthly.dropna(subset=['Soil_Temperature'] + exog_vars)
-df_monthly['Date'] = pd.to_datetime(df_monthly[['Year', 'Month']].assign(DAY=1))
-df_monthly = df_monthly.sort_values('Date')
-df_monthly.set_index('Date', inplace=True)
-
-# Global variables to store fitted models
-model_results = None
-exog_models = {}
-
-# --- Build & Fit All Models ---
-def build_and_fit_models():
-    """Builds and fits the main SARIMAX model and all exogenous models once."""
-    global model_results, exog_models
-    
-    print("Building and fitting main SARIMAX model... This may take a moment.")
-    auto_model = auto_arima(
-        df_monthly['Soil_Temperature'],
-        exogenous=df_monthly[exog_vars],
-        seasonal=True, m=12,
-        start_p=0, start_q=0, max_p=3, max_q=3,
-        start_P=0, start_Q=0, max_P=2, max_Q=2,
-        d=None, D=None,
-        trace=False,
-        error_action='ignore',
-        suppress_warnings=True,
-        stepwise=True
-    )
-    order = auto_model.order
-    seasonal_order = auto_model.seasonal_order
-
-    model = SARIMAX(df_monthly['Soil_Temperature'],
-                    order=order,
-                    seasonal_order=seasonal_order,
-                    exog=df_monthly[exog_vars],
-                    enforce_stationarity=False,
-                    enforce_invertibility=False)
-    model_results = model.fit(disp=False)
-    print("Main SARIMAX model built and fitted successfully.")
-
-    print("Building and fitting models for exogenous variables...")
-    for var in exog_vars:
-        # We'll use a simple auto_arima model for each exogenous variable to capture its own seasonal pattern.
-        exog_auto_model = auto_arima(
-            df_monthly[var],
-            seasonal=True, m=12,
-            trace=False,
-            error_action='ignore',
-            suppress_warnings=True,
-            stepwise=True
-        )
-        exog_model = SARIMAX(df_monthly[var],
-                             order=exog_auto_model.order,
-                             seasonal_order=exog_auto_model.seasonal_order,
-                             enforce_stationarity=False,
-                             enforce_invertibility=False)
-        exog_models[var] = exog_model.fit(disp=False)
-    
-    print("All exogenous models built and fitted successfully.")
-
-
-# --- Forecast Exogenous Variables ---
-def forecast_exogenous_variables(periods):
+# Fitting and forecasting run on one background thread so the window stays
+# responsive; a single worker also keeps the service calls in order
+worker = ThreadPoolExecutor(max_workers=1)
+
+
+def poll(future, on_done):
+    """Checks the future from the Tk event loop and calls on_done(result) once it has finished."""
+    if not future.done():
+        root.after(100, poll, future, on_done)
+        return
+    try:
+        result = future.result()
+    except Exception as e:
+        status.config(text="Error", fg='red')
+        messagebox.showerror("Error", f"Something went wrong:\n{str(e)}")
+        return
+    on_done(result)
+
+
+def models_ready(model):
+    status.config(text=f"Models ready: {model.site} ({', '.join(model.exog_vars) or 'no exogenous variables'})", fg='green')
+
+
+# --- Forecast & Plot ---
+def run_forecast(site, exog_vars, end_date, simulate=False):
     """
-    Forecasts each exogenous variable independently using the pre-fitted models.
+    Runs on the worker: fitted (or cached) models for the site and the forecast up to end_date.
+    With simulate, the intervals come from Monte Carlo paths that include the exogenous forecast uncertainty.
     """
-    exog_forecast_df = pd.DataFrame(index=pd.date_range(
-        start=df_monthly.index[-1] + pd.DateOffset(months=1),
-        periods=periods, freq='MS'
-    ), columns=exog_vars)
-
-    print(f"Forecasting {periods} periods for exogenous variables...")
-    for var in exog_vars:
-        exog_forecast = exog_models[var].get_forecast(steps=periods)
-        exog_forecast_df[var] = exog_forecast.predicted_mean.values
-    
-    print("Exogenous variables forecasted successfully.")
-    return exog_forecast_df
-
-# Run the initial model build and fit
-build_and_fit_models()
+    if site not in service.sites and site.lower().endswith('.csv'):
+        # A daily input CSV typed in the Site box is registered as a site under its parsed name;
+        # typing the same file again reuses that site and its cached models
+        site, file_path = parse_site(site)
+        if service.sites.get(site) != file_path:
+            service.add_site(site, file_path)
+
+    model = service.get_model(site, exog_vars=exog_vars)
+    last_date = model.data.index[-1]
+    if end_date <= last_date:
+        raise ValueError("Target date must be in the future.")
+
+    months_diff = (end_date.year - last_date.year) * 12 + (end_date.month - last_date.month)
+
+    if simulate:
+        return model, model.simulate(months_diff)[['Forecast', 'Lower CI', 'Upper CI']]
+
+    # Forecast the exogenous variables with their own models, then the SARIMAX with those forecasts
+    return model, model.forecast(months_diff)
+
+
+def show_forecast(result, month, year):
+    model, forecast_df = result
+    df_monthly = model.data
+    forecast_index = forecast_df.index
+    forecast_mean = forecast_df['Forecast']
+    forecast_ci = forecast_df[['Lower CI', 'Upper CI']]
+
+    # Save to Excel
+    output_file = f"soil_temperature_forecast_{model.site}_until_{month}_{year}.xlsx"
+    forecast_df.to_excel(output_file)
+
+    # Plot observed + forecast
+    ax_history.clear()
+    ax_history.plot(df_monthly.index, df_monthly['Soil_Temperature'], label='Observed')
+    ax_history.plot(forecast_mean.index, forecast_mean, label='Forecast', color='red')
+    ax_history.fill_between(forecast_ci.index, forecast_ci.iloc[:, 0], forecast_ci.iloc[:, 1], color='pink', alpha=0.3)
+    ax_history.set_title(f"{model.site} Soil Temperature Forecast until {month}/{year} (SARIMAX with Exogenous Variables: {', '.join(model.exog_vars) or 'none'})")
+    ax_history.set_xlabel("Date")
+    ax_history.set_ylabel("Soil Temperature (°C)")
+    ax_history.legend()
+
+    # Plot forecast only with value labels
+    ax_forecast.clear()
+    ax_forecast.plot(forecast_mean.index, forecast_mean, label='Forecast', color='blue', marker='o')
+    ax_forecast.fill_between(forecast_ci.index, forecast_ci.iloc[:, 0], forecast_ci.iloc[:, 1], color='lightblue', alpha=0.3)
+
+    for date, temp in forecast_mean.items():
+        ax_forecast.text(date, temp + 0.2, f"{temp:.1f}°C", ha='center', va='bottom', fontsize=9)
+
+    ax_forecast.set_title(f"Forecast Only: Soil Temperature from {forecast_index[0].strftime('%b %Y')} to {forecast_index[-1].strftime('%b %Y')}")
+    ax_forecast.set_xlabel("Month")
+    ax_forecast.set_ylabel("Soil Temperature (°C)")
+    ax_forecast.set_xticks(forecast_mean.index)
+    ax_forecast.set_xticklabels([d.strftime('%b\n%Y') for d in forecast_mean.index], rotation=45)
+    ax_forecast.grid(True, linestyle='--', alpha=0.5)
+    ax_forecast.legend()
+    canvas.draw_idle()
+
+    status.config(text=f"Forecast saved to: {output_file}", fg='green')
+
 
-# --- Forecast & Plot ---
 def forecast_to_date():
     try:
+        site = entry_site.get().strip()
+        exog_vars = [var.strip() for var in entry_exog.get().split(',') if var.strip()]
         month = int(entry_month.get())
         year = int(entry_year.get())
         if not (1 <= month <= 12):
             raise ValueError("Month must be between 1 and 12.")
-
-        last_date = df_monthly.index[-1]
-        end_date = datetime(year, month, 1)
-        if end_date <= last_date:
-            messagebox.showerror("Error", "Target date must be in the future.")
-            return
-
-        months_diff = (end_date.year - last_date.year) * 12 + (end_date.month - last_date.month)
-
-        # Use the pre-fitted models to forecast the exogenous variables
-        exog_forecast = forecast_exogenous_variables(months_diff)
-        forecast_index = exog_forecast.index
-
-        # Now run the SARIMAX forecast with the forecasted exogenous variables
-        forecast = model_results.get_forecast(steps=months_diff, exog=exog_forecast)
-        forecast_mean = forecast.predicted_mean
-        forecast_ci = forecast.conf_int()
-        forecast_mean.index = forecast_index
-        forecast_ci.index = forecast_index
-
-        forecast_df = pd.DataFrame({
-            'Forecast': forecast_mean,
-            'Lower CI': forecast_ci.iloc[:, 0],
-            'Upper CI': forecast_ci.iloc[:, 1]
-        })
-        forecast_df.index.name = 'Date'
-
-        # Save to Excel
-        output_file = f"soil_temperature_forecast_until_{month}_{year}.xlsx"
-        forecast_df.to_excel(output_file)
-
-        messagebox.showinfo("Success", f"Forecast saved to:\n{output_file}")
-
-        # Plot observed + forecast
-        plt.figure(figsize=(14, 6))
-        plt.plot(df_monthly.index, df_monthly['Soil_Temperature'], label='Observed')
-        plt.plot(forecast_mean.index, forecast_mean, label='Forecast', color='red')
-        plt.fill_between(forecast_ci.index, forecast_ci.iloc[:, 0], forecast_ci.iloc[:, 1], color='pink', alpha=0.3)
-        plt.title(f"Soil Temperature Forecast until {month}/{year} (SARIMAX with Exogenous Variables)")
-        plt.xlabel("Date")
-        plt.ylabel("Soil Temperature (°C)")
-        plt.legend()
-        plt.tight_layout()
-        plt.show()
-
-        # Plot forecast only with value labels
-        plt.figure(figsize=(14, 6))
-        plt.plot(forecast_mean.index, forecast_mean, label='Forecast', color='blue', marker='o')
-        plt.fill_between(forecast_ci.index, forecast_ci.iloc[:, 0], forecast_ci.iloc[:, 1], color='lightblue', alpha=0.3)
-
-        for date, temp in forecast_mean.items():
-            plt.text(date, temp + 0.2, f"{temp:.1f}°C", ha='center', va='bottom', fontsize=9)
-
-        plt.title(f"Forecast Only: Soil Temperature from {forecast_index[0].strftime('%b %Y')} to {forecast_index[-1].strftime('%b %Y')}")
-        plt.xlabel("Month")
-        plt.ylabel("Soil Temperature (°C)")
-        plt.xticks(forecast_mean.index, [d.strftime('%b\n%Y') for d in forecast_mean.index], rotation=45)
-        plt.grid(True, linestyle='--', alpha=0.5)
-        plt.legend()
-        plt.tight_layout()
-        plt.show()
-
     except Exception as e:
         messagebox.showerror("Error", f"Something went wrong:\n{str(e)}")
+        return
+
+    # Queued behind any fit still running; the window stays responsive meanwhile
+    status.config(text=f"Forecasting {site} until {month}/{year}...", fg='blue')
+    future = worker.submit(run_forecast, site, exog_vars, datetime(year, month, 1), simulate_var.get())
+    poll(future, lambda result: show_forecast(result, month, year))
+
+
+def on_close():
+    worker.shutdown(wait=False, cancel_futures=True)
+    root.destroy()
+
+
+if __name__ == '__main__':
+    # --- Tkinter GUI ---
+    root = Tk()
+    root.title("Soil Temperature Forecast with Exogenous Variables")
+    root.protocol("WM_DELETE_WINDOW", on_close)
+
+    Label(root, text="Site:").grid(row=0, column=0, padx=10, pady=5)
+    entry_site = Entry(root)
+    entry_site.insert(0, 'Katherine')
+    entry_site.grid(row=0, column=1, padx=10, pady=5)
+
+    Label(root, text="Exogenous Variables:").grid(row=1, column=0, padx=10, pady=5)
+    entry_exog = Entry(root)
+    entry_exog.insert(0, ', '.join(exog_vars))
+    entry_exog.grid(row=1, column=1, padx=10, pady=5)
+
+    Label(root, text="Forecast up to Month:").grid(row=2, column=0, padx=10, pady=5)
+    entry_month = Entry(root)
+    entry_month.grid(row=2, column=1, padx=10, pady=5)
+
+    Label(root, text="Forecast up to Year:").grid(row=3, column=0, padx=10, pady=5)
+    entry_year = Entry(root)
+    entry_year.grid(row=3, column=1, padx=10, pady=5)
+
+    simulate_var = BooleanVar(value=False)
+    Checkbutton(root, text="Include exogenous uncertainty (Monte Carlo)", variable=simulate_var).grid(row=4, column=0, columnspan=2, pady=5)
 
-# --- Tkinter GUI ---
-root = Tk()
-root.title("Soil Temperature Forecast with Exogenous Variables")
+    Button(root, text="Run Forecast, Save Excel & Plot", command=forecast_to_date, bg='green', fg='white').grid(row=5, column=0, columnspan=2, pady=10)
 
-Label(root, text="Forecast up to Month:").grid(row=0, column=0, padx=10, pady=5)
-entry_month = Entry(root)
-entry_month.grid(row=0, column=1, padx=10, pady=5)
+    status = Label(root, text="Fitting models in the background...", fg='blue')
+    status.grid(row=6, column=0, columnspan=2, pady=5)
 
-Label(root, text="Forecast up to Year:").grid(row=1, column=0, padx=10, pady=5)
-entry_year = Entry(root)
-entry_year.grid(row=1, column=1, padx=10, pady=5)
+    # Plots are drawn into this canvas and updated in place on each forecast
+    figure = Figure(figsize=(12, 8), tight_layout=True)
+    ax_history, ax_forecast = figure.subplots(2, 1)
+    canvas = FigureCanvasTkAgg(figure, master=root)
+    canvas.get_tk_widget().grid(row=7, column=0, columnspan=2, padx=10, pady=5)
+    toolbar = NavigationToolbar2Tk(canvas, root, pack_toolbar=False)
+    toolbar.grid(row=8, column=0, columnspan=2)
 
-Button(root, text="Run Forecast, Save Excel & Plot", command=forecast_to_date, bg='green', fg='white').grid(row=2, column=0, columnspan=2, pady=10)
+    # Fit the default site's models on the worker while the window opens
+    # (worker processes re-import this module, so start-up stays behind the main guard)
+    poll(worker.submit(service.get_model, 'Katherine', exog_vars=exog_vars), models_ready)
 
-root.mainloop()
\ No newline at end of file
+    root.mainloop()
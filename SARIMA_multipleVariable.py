@@ -1,27 +1,42 @@
 import pandas as pd
 import matplotlib.pyplot as plt
-from statsmodels.tsa.statespace.sarimax import SARIMAX
 from statsmodels.tsa.stattools import adfuller
 from statsmodels.graphics.tsaplots import plot_acf, plot_pacf
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 from pmdarima import auto_arima
 import numpy as np
 
-# Load data
-df_day = pd.read_csv("Katherine_InputData_Time_Series.csv")
-df_day.columns = df_day.columns.str.strip()
-df_day['Date'] = pd.to_datetime(df_day['Date'], dayfirst=True, errors='coerce')
-df_day = df_day.dropna(subset=['Date'])
+from exog_selection import CANDIDATE_EXOG_VARS, select_exog_vars
+from fourier_terms import DAILY_MODES, fourier_terms
+from monthly_data import load_frames, monthly_means
+from sarima_fit import refit_sarimax
+from sarima_search import best_candidate, search_orders
 
-def run_sarima_forecast(df_input, mode='monthly', seasonal_period=12, exog_vars=None):
+# Load data: typed daily frame and monthly means, from the preprocessing cache after the first run
+df_day, df_month = load_frames("Katherine_InputData_Time_Series.csv")
+
+def run_sarima_forecast(df_input, mode='monthly', seasonal_period=12, exog_vars=None,
+                        order_search='stepwise', n_jobs=None, search_timeout=None, fourier_harmonics=2,
+                        exog_selection=None, df_monthly=None):
     """
     Run SARIMA forecasting on soil temperature data with optional exogenous variables.
 
     Parameters:
         df_input: pandas DataFrame with at least 'Date' and 'Soil_Temperature'
-        mode: 'monthly', 'wet_season', or 'daily_wet_season'
-        seasonal_period: seasonal period (12 for monthly, 3 for wet season, etc.)
+        mode: 'monthly', 'wet_season', 'daily' or 'daily_wet_season'
+        seasonal_period: seasonal period (12 for monthly, 3 for wet season; the
+                         daily modes use Fourier terms instead)
         exog_vars: list of column names to use as exogenous regressors
+        order_search: 'stepwise' (auto_arima), 'grid' (exhaustive search across a process pool)
+                      or 'screened' (grid ranked by a cheap regression, top 10 fitted)
+        n_jobs: worker processes for the grid search (default: all cores)
+        search_timeout: time budget in seconds for the grid search
+        fourier_harmonics: Fourier pairs for the annual cycle in the daily modes
+                           (1 = annual, 2 = annual + semi-annual)
+        exog_selection: None (use exog_vars as given), or 'exhaustive', 'forward' or
+                        'backward' to pick the subset of exog_vars (default: all weather
+                        columns) with the lowest out-of-sample error (monthly mode only)
+        df_monthly: monthly means of df_input if already computed (e.g. by load_frames)
     """
 
     df = df_input.copy()
@@ -30,34 +45,55 @@ def run_sarima_forecast(df_input, mode='monthly', seasonal_period=12, exog_vars=
     df['Month'] = df['Date'].dt.month
 
     # Aggregate monthly averages
-    df_monthly = df.groupby(['Year', 'Month']).mean(numeric_only=True).reset_index()
+    df_monthly = monthly_means(df) if df_monthly is None else df_monthly.copy()
     df_monthly = df_monthly.dropna(subset=['Soil_Temperature'])
-    df_monthly['Date'] = pd.to_datetime(df_monthly[['Year', 'Month']].assign(DAY=1))
-    df_monthly = df_monthly.sort_values('Date').set_index('Date')
 
     if mode == 'wet_season':
         df_monthly['Month'] = df_monthly.index.month
         df_model = df_monthly[df_monthly['Month'].isin([12, 1, 2])]
         seasonal_period = 3
+    elif mode == 'daily':
+        df_model = df.set_index('Date')
     elif mode == 'daily_wet_season':
         df_model = df[df['Month'].isin([12, 1, 2])].copy()
         df_model = df_model.set_index('Date')
-        seasonal_period = 365
     else:
         df_model = df_monthly.copy()
 
     if exog_vars is None:
         exog_vars = []
 
+    if exog_selection is not None:
+        if mode != 'monthly':
+            raise ValueError("Regressor selection is only available in monthly mode.")
+        # Subsets are scored on a hold-out at the end of the training period, so the test period stays unseen
+        selection_table = select_exog_vars(df_monthly.iloc[:int(len(df_monthly) * 0.6)],
+                                           exog_vars or CANDIDATE_EXOG_VARS, method=exog_selection,
+                                           m=seasonal_period, n_jobs=n_jobs)
+        print(selection_table.drop(columns='error').to_string())
+        exog_vars = list(selection_table.iloc[0]['exog_vars'])
+        print(f"Selected exogenous variables: {', '.join(exog_vars) or 'none'}")
+
     # Select Soil_Temperature and exogenous variables, drop rows with missing values
     columns_needed = ['Soil_Temperature'] + exog_vars
     df_model = df_model[columns_needed].dropna()
 
+    # A 365-day seasonal state space is far too large to fit; the daily modes
+    # carry the annual cycle in a few Fourier regressors next to a low-order,
+    # undifferenced (d=0) ARIMA with an intercept
+    fourier_cols = []
+    if mode in DAILY_MODES:
+        fourier = fourier_terms(df_model.index, harmonics=fourier_harmonics)
+        df_model = df_model.join(fourier)
+        fourier_cols = list(fourier.columns)
+        seasonal_period = 1
+    model_exog_vars = exog_vars + fourier_cols
+
     print(f"\n--- Mode: {mode.upper()} | Data Points: {len(df_model)} ---")
 
     # Plot soil temperature
     plt.figure(figsize=(10, 4))
-    plt.plot(df_model.index, df_model['Soil_Temperature'], marker='o')
+    plt.plot(df_model.index, df_model['Soil_Temperature'], marker='o' if mode not in DAILY_MODES else None)
     plt.title(f"Soil Temperature - {mode}")
     plt.grid(True)
     plt.tight_layout()
@@ -80,45 +116,76 @@ def run_sarima_forecast(df_input, mode='monthly', seasonal_period=12, exog_vars=
     train_endog = train['Soil_Temperature']
     test_endog = test['Soil_Temperature']
 
-    if len(exog_vars) > 0:
-        train_exog = train[exog_vars]
-        test_exog = test[exog_vars]
+    if len(model_exog_vars) > 0:
+        train_exog = train[model_exog_vars]
+        test_exog = test[model_exog_vars]
     else:
         train_exog = None
         test_exog = None
     
+    # Dates with gaps (e.g. wet seasons only) have no frequency statsmodels can
+    # forecast from; such series are modelled on positions and dated afterwards
+    if df_model.index.inferred_freq is None:
+        train_endog = train_endog.reset_index(drop=True)
+        if train_exog is not None:
+            train_exog = train_exog.reset_index(drop=True)
+            test_exog = test_exog.set_axis(pd.RangeIndex(len(train), len(df_model)))
+
     print("Train index:", train.index.min(), "→", train.index.max())
     print("Test index :", test.index.min(), "→", test.index.max())   
 
 
     # Auto ARIMA to find best SARIMA model with exogenous regressors
-    auto_model = auto_arima(
-        train_endog,
-        exogenous=train_exog,
-        seasonal=True,
-        m=seasonal_period,
-        start_p=0, start_q=0, max_p=3, max_q=3,
-        start_P=0, start_Q=0, max_P=2, max_Q=2,
-        d=None, D=None,
-        trace=True,
-        error_action='ignore',
-        suppress_warnings=True,
-        stepwise=True
-    )
-    print(auto_model.summary())
-
-    order = auto_model.order
-    seasonal_order = auto_model.seasonal_order
-
-    # Fit SARIMAX with exogenous variables
-    model = SARIMAX(train_endog, order=order, seasonal_order=seasonal_order, exog=train_exog)
-    results = model.fit()
+    if order_search in ('grid', 'screened'):
+        # Exhaustive (p,d,q)(P,D,Q,m) grid fitted across a process pool; 'screened'
+        # ranks the grid by Hannan-Rissanen regressions and fits only the top 10
+        search_table = search_orders(
+            train_endog,
+            exog=train_exog,
+            m=seasonal_period,
+            d=0 if fourier_cols else None,
+            with_intercept=True if fourier_cols else 'auto',
+            max_p=3, max_q=3, max_P=2, max_Q=2,
+            trace=True,
+            n_jobs=n_jobs,
+            timeout=search_timeout,
+            prescreen_top_k=10 if order_search == 'screened' else None
+        )
+        print(search_table[['order', 'seasonal_order', 'aic', 'bic', 'screen_ic', 'fit_time', 'status']].to_string())
+        best = best_candidate(search_table)
+        order = best['order']
+        seasonal_order = best['seasonal_order']
+        source = best['params']
+    else:
+        auto_model = auto_arima(
+            train_endog,
+            X=train_exog,
+            seasonal=seasonal_period > 1,
+            m=seasonal_period,
+            start_p=0, start_q=0, max_p=3, max_q=3,
+            start_P=0, start_Q=0, max_P=2, max_Q=2,
+            d=0 if fourier_cols else None, D=None,
+            with_intercept=True if fourier_cols else 'auto',
+            trace=True,
+            error_action='ignore',
+            suppress_warnings=True,
+            stepwise=True
+        )
+        print(auto_model.summary())
+        order = auto_model.order
+        seasonal_order = auto_model.seasonal_order
+        source = auto_model
+
+    # Final SARIMAX with exogenous variables, reusing the estimates from the order search
+    results = refit_sarimax(train_endog, order, seasonal_order, exog=train_exog, source=source)
     print(results.summary())
 
     # Forecast with exogenous variables
     forecast = results.get_forecast(steps=len(test), exog=test_exog)
     forecast_mean = forecast.predicted_mean
     forecast_ci = forecast.conf_int()
+    forecast_mean.index = test.index
+    forecast_ci.index = test.index
     
     print("Actual (test_endog):")
     print(test_endog.head())
@@ -151,5 +218,15 @@ def run_sarima_forecast(df_input, mode='monthly', seasonal_period=12, exog_vars=
 # Example exogenous variables available in your dataset:
 exog_vars = ['T.Max', 'Radn','RHminT']
 
-# Run forecasting in monthly mode with multiple exogenous variables
-run_sarima_forecast(df_day, mode='monthly', seasonal_period=12, exog_vars=exog_vars)
+# The guard keeps worker processes of the grid search from re-running the forecast
+if __name__ == '__main__':
+    # Run forecasting in monthly mode with multiple exogenous variables
+    run_sarima_forecast(df_day, mode='monthly', seasonal_period=12, exog_vars=exog_vars, df_monthly=df_month)
+    # Exhaustive order search across all cores instead of stepwise auto_arima
+    #run_sarima_forecast(df_day, mode='monthly', seasonal_period=12, exog_vars=exog_vars, order_search='grid', df_monthly=df_month)
+    # Same grid, pre-screened so only the 10 most promising orders get an exact-likelihood fit
+    #run_sarima_forecast(df_day, mode='monthly', seasonal_period=12, exog_vars=exog_vars, order_search='screened', df_monthly=df_month)
+    # Daily model with annual + semi-annual Fourier terms instead of a 365-day seasonal period
+    #run_sarima_forecast(df_day, mode='daily', exog_vars=exog_vars, fourier_harmonics=2, df_monthly=df_month)
+    # Pick the regressors first: forward selection over all weather columns, scored out of sample
+    #run_sarima_forecast(df_day, mode='monthly', seasonal_period=12, exog_vars=CANDIDATE_EXOG_VARS, exog_selection='forward', df_monthly=df_month)
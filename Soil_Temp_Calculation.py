@@ -1,10 +1,15 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import pandas as pd
-import numpy as np
-from datetime import datetime
 import os
 
+from soil_temp_model import (
+    compute_soil_temperature_column,
+    parse_value_list,
+    save_sweep,
+    soil_temperature_sweep,
+)
+
 # Function to compute soil temperature for each row
 def compute_soil_temperature():
     try:
@@ -32,50 +37,10 @@ def compute_soil_temperature():
                 messagebox.showerror("Format Error", f"Missing column: {col}. Please check your CSV file header.")
                 return
 
-        # Convert soil depth from cm to meters
-        z = z_cm / 100
-        p = 86400  # Period = 1 day in seconds
-
-        # Use the year from the first row's date as the start date
-        # Note: After skiprows=[1], the first row of actual data is now df.iloc[0]
-        first_date = str(df.iloc[0]["Date"])
-        year = int(first_date[:4]) # Assuming date format YYYYMMDD, so first 4 chars are year
-        start_date = datetime(year, 1, 1)
-
-        # Function to calculate soil temperature for one row
-        def calc_temp(row):
-            try:
-                # Convert date to datetime object
-                # Assuming 'Date' column is in YYYYMMDD integer format, e.g., 20240101
-                date_obj = datetime.strptime(str(int(row["Date"])), "%Y%m%d")
-                t_days = (date_obj - start_date).days # Days since start of the year
-                t_sec = t_days * 86400 # Convert days to seconds
-
-                # Get Tmax and Tmin
-                Tmax = float(row["T.Max"])
-                Tmin = float(row["T.Min"])
-                Tm = (Tmax + Tmin) / 2 # Mean daily temperature
-                Aa = (Tmax - Tmin) / 2 # Amplitude of daily temperature variation
-
-                # Compute soil temperature using the formula
-                # Decay factor: exp(-z * sqrt(pi / (alpha * P)))
-                decay = np.exp(-z * np.sqrt(np.pi / (alpha * p)))
-                # Phase shift: (2 * pi * t_sec / P) - z * sqrt(pi / (alpha * P))
-                phase_shift = (2 * np.pi * t_sec / p) - z * np.sqrt(np.pi / (alpha * p))
-                
-                T = Tm + Aa * decay * np.sin(phase_shift)
-                return round(T, 2)
-            except ValueError:
-                # Handle cases where T.Max, T.Min, or Date cannot be converted to float/int
-                # print(f"Skipping row due to invalid data in T.Max/T.Min/Date: {row.to_dict()}") # Optional: for debugging
-                return np.nan # Return NaN (Not a Number) for rows with errors
-            except Exception as e:
-                # Catch any other unexpected errors during calculation for a row
-                # print(f"An unexpected error occurred in calc_temp: {e} for row: {row.to_dict()}") # Optional: for debugging
-                return np.nan
-
-        # Apply the function to every row to compute Soil_Temperature
-        df["Soil_Temperature"] = df.apply(calc_temp, axis=1)
+        # Compute Soil_Temperature for the whole column at once.
+        # Time is counted from 1 January of the first row's year (Date is YYYYMMDD);
+        # rows with an invalid Date, T.Max or T.Min get NaN (Not a Number).
+        df["Soil_Temperature"] = compute_soil_temperature_column(df, z_cm, alpha)
 
         # --- New feature: Save file dialog ---
         # Suggest a default filename based on the input file's name
@@ -107,12 +72,55 @@ def compute_soil_temperature():
     except Exception as e:
         messagebox.showerror("Error", f"An unexpected error occurred: {e}")
 
+# Function to compute soil temperature for every depth × alpha combination
+def run_depth_alpha_sweep():
+    try:
+        file_path = file_path_var.get()
+        # Lists ("10, 20, 40") or ranges ("start:stop:count") of values
+        depths_cm = parse_value_list(entry_sweep_depths.get())
+        alphas = parse_value_list(entry_sweep_alphas.get())
+
+        if not file_path or not os.path.exists(file_path):
+            messagebox.showerror("Input Error", "Please select an existing input CSV file.")
+            return
+
+        df = pd.read_csv(file_path, skiprows=[1])
+        for col in ["Date", "T.Max", "T.Min"]:
+            if col not in df.columns:
+                messagebox.showerror("Format Error", f"Missing column: {col}. Please check your CSV file header.")
+                return
+
+        # One (time × depth × alpha) array instead of one run per combination
+        temps, dates = soil_temperature_sweep(df, depths_cm, alphas)
+
+        suggested_filename = os.path.splitext(os.path.basename(file_path))[0] + "_soil_temp_sweep.npz"
+        output_path = filedialog.asksaveasfilename(
+            defaultextension=".npz",
+            filetypes=[("Labelled array file", "*.npz"), ("Tidy CSV table", "*.csv")],
+            initialfile=suggested_filename,
+            title="Save Soil Temperature Sweep"
+        )
+        if not output_path:
+            messagebox.showinfo("Cancelled", "File save operation was cancelled by the user.")
+            return
+
+        save_sweep(output_path, temps, dates, depths_cm, alphas)
+        messagebox.showinfo(
+            "Success",
+            f"{len(depths_cm)} depths × {len(alphas)} alphas over {len(df)} rows saved to:\n{output_path}"
+        )
+
+    except ValueError:
+        messagebox.showerror("Invalid Input", "Sweep values must be numbers separated by commas, or ranges written as start:stop:count.")
+    except Exception as e:
+        messagebox.showerror("Error", f"An unexpected error occurred: {e}")
+
 # Create main Tkinter window
 root = tk.Tk()
 root.title("Soil Temperature Calculator") # Set window title
 
 # Set initial window size
-root.geometry("650x320") # Width x Height in pixels
+root.geometry("650x460") # Width x Height in pixels
 
 # Configure grid to allow widgets to expand and maintain proportions
 # Column 0: for labels (e.g., "Select Input CSV file:") - fixed width
@@ -123,7 +131,7 @@ root.grid_columnconfigure(1, weight=3)
 root.grid_columnconfigure(2, weight=0)
 
 # Configure rows to allow vertical expansion, distributing space evenly
-for i in range(4): # For rows 0, 1, 2, 3 (containing main elements)
+for i in range(7): # For rows 0-6 (containing main elements)
     root.grid_rowconfigure(i, weight=1)
 
 
@@ -169,5 +177,26 @@ tk.Button(
     height=2 # Height of the button in text units
 ).grid(row=3, column=0, columnspan=3, pady=15, sticky="nsew") # columnspan makes it span all columns, sticky makes it fill
 
+# === Depth × Alpha sweep UI ===
+tk.Label(root, text="Sweep Depths (cm):").grid(row=4, column=0, padx=10, pady=5, sticky="e")
+entry_sweep_depths = tk.Entry(root)
+entry_sweep_depths.insert(0, "5:100:20") # 20 depths from 5 to 100 cm
+entry_sweep_depths.grid(row=4, column=1, padx=10, pady=5, sticky="ew")
+
+tk.Label(root, text="Sweep Alphas (m²/s):").grid(row=5, column=0, padx=10, pady=5, sticky="e")
+entry_sweep_alphas = tk.Entry(root)
+entry_sweep_alphas.insert(0, "1e-7:1e-6:10") # 10 alphas from 1×10^-7 to 1×10^-6
+entry_sweep_alphas.grid(row=5, column=1, padx=10, pady=5, sticky="ew")
+
+tk.Button(
+    root,
+    text="Run Depth × Alpha Sweep & Save",
+    command=run_depth_alpha_sweep,
+    bg="#2196F3", # Background color (blue)
+    fg="white",
+    font=("Helvetica", 10, "bold"),
+    height=2
+).grid(row=6, column=0, columnspan=3, pady=15, sticky="nsew")
+
 # Start the Tkinter event loop
 root.mainloop()
\ No newline at end of file
@@ -0,0 +1,249 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+from forecast_service import (DEFAULT_TARGET, EXOG_SEARCH_SETTINGS, MAIN_SEARCH_SETTINGS, SARIMAX_KWARGS,
+                              ForecastModel, fit_sarimax, parse_site)
+from model_store import load_or_fit, model_key
+from monthly_data import load_daily, monthly_means
+
+FORECAST_COLUMNS = ['Site', 'Date', 'Horizon', 'Forecast', 'Lower CI', 'Upper CI', 'Target', 'Exogenous',
+                    'Order', 'Seasonal Order', 'AIC', 'Observations', 'Last Observed']
+SUMMARY_COLUMNS = ['Site', 'status', 'error', 'seconds', 'Order', 'Seasonal Order', 'AIC']
+
+
+class TaskTimeout(Exception):
+    pass
+
+
+def _alarm(signum, frame):
+    raise TaskTimeout()
+
+
+# Flags of the tasks a run_isolated pool has started, set once per worker by _init_worker
+_started = None
+
+
+def _init_worker(started):
+    global _started
+    _started = started
+
+
+def _call(index, function, args):
+    _started[index] = 1
+    return function(*args)
+
+
+def run_isolated(function, tasks, n_jobs, report, crashed):
+    """
+    Call function(*args) for each args tuple of `tasks` across `n_jobs`
+    worker processes and pass every result to report(result).
+
+    A worker that dies (e.g. out of memory) breaks the whole pool. The
+    tasks that had not started yet go to a fresh pool; the ones that were
+    running are retried one at a time in a pool of their own, so a task
+    that crashes again is the one to blame and goes to
+    crashed(args, error) without taking the others down.
+    """
+    queued, suspects = list(range(len(tasks))), []
+    while queued or suspects:
+        alone = not queued
+        batch, queued = ([suspects.pop(0)], queued) if alone else (queued, [])
+        started = multiprocessing.RawArray('b', len(tasks))
+        done, error = set(), None
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(batch)), initializer=_init_worker,
+                                 initargs=(started,)) as executor:
+            futures = {executor.submit(_call, i, function, tasks[i]): i for i in batch}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except BrokenProcessPool as e:
+                    error = e
+                    continue
+                done.add(futures[future])
+                report(result)
+        unfinished = [i for i in batch if i not in done]
+        if alone and unfinished:
+            crashed(tasks[unfinished[0]], error)
+        elif unfinished:
+            suspects.extend(i for i in unfinished if started[i])
+            queued = [i for i in unfinished if not started[i]]
+
+
+def forecast_site(site, df_day, periods=12, target=DEFAULT_TARGET, exog_vars=(), main_search_settings=None,
+                  exog_search_settings=None, sarimax_kwargs=None, store_dir=None):
+    """
+    Monthly aggregation, order selection, fit and forecast for one site.
+
+    Returns the site's rows of the consolidated forecast table. With a
+    `store_dir` fitted models are reused from the model store when the
+    data and settings have not changed.
+    """
+    exog_vars = list(exog_vars)
+    main_search_settings = MAIN_SEARCH_SETTINGS if main_search_settings is None else main_search_settings
+    exog_search_settings = EXOG_SEARCH_SETTINGS if exog_search_settings is None else exog_search_settings
+    sarimax_kwargs = SARIMAX_KWARGS if sarimax_kwargs is None else sarimax_kwargs
+
+    data = monthly_means(df_day)
+    missing = [col for col in [target] + exog_vars if col not in data.columns]
+    if missing:
+        raise ValueError(f"no column(s): {', '.join(missing)}")
+    data = data.dropna(subset=[target] + exog_vars)[[target] + exog_vars]
+    if data.empty:
+        raise ValueError(f"no months with {', '.join([target] + exog_vars)} observed")
+
+    def fit(name, regressors, search_settings):
+        endog, exog = data[name], data[regressors] if regressors else None
+        if store_dir is None:
+            return fit_sarimax(endog, exog, search_settings, sarimax_kwargs)
+        # Same keys as the forecast service, so batch runs and the GUIs share stored models
+        key = model_key(data[[name] + regressors], name, regressors,
+                        settings=dict(search_settings, mode='monthly', **sarimax_kwargs))
+        return load_or_fit(key, lambda: fit_sarimax(endog, exog, search_settings, sarimax_kwargs), store_dir)
+
+    results = fit(target, exog_vars, main_search_settings)
+    exog_models = {var: fit(var, [], exog_search_settings) for var in exog_vars}
+    model = ForecastModel(site, target, exog_vars, 'monthly', data, results, exog_models)
+
+    table = model.forecast(periods).reset_index()
+    table.insert(0, 'Site', site)
+    table.insert(2, 'Horizon', range(1, periods + 1))
+    table['Target'] = target
+    table['Exogenous'] = ', '.join(exog_vars)
+    table['Order'] = str(results.model.order)
+    table['Seasonal Order'] = str(results.model.seasonal_order)
+    table['AIC'] = results.aic
+    table['Observations'] = len(data)
+    table['Last Observed'] = data.index[-1]
+    return table[FORECAST_COLUMNS]
+
+
+def _run_task(site, source, options, timeout):
+    """
+    Worker entry point: one site, with its failures and time limit kept
+    to itself. Returns (summary row, forecast rows or None).
+    """
+    start = time.perf_counter()
+    summary = {'Site': site, 'status': 'ok', 'error': None}
+    table = None
+    # The time limit uses SIGALRM, which is only available on Unix
+    use_alarm = bool(timeout) and hasattr(signal, 'SIGALRM')
+    try:
+        # Armed inside the try, so the finally always disarms it
+        if use_alarm:
+            signal.signal(signal.SIGALRM, _alarm)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        df_day = load_daily(source) if isinstance(source, str) else source
+        table = forecast_site(site, df_day, **options)
+        summary.update({col: table[col].iloc[0] for col in ['Order', 'Seasonal Order', 'AIC']})
+    except TaskTimeout:
+        summary.update(status='timeout', error=f"exceeded {timeout} s")
+    except Exception as e:
+        summary.update(status='failed', error=str(e))
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+    summary['seconds'] = time.perf_counter() - start
+    return summary, table
+
+
+def collect_sites(paths):
+    """
+    (site, source) pairs from site files. A file with a Site column is a
+    multi-site store and is split into one daily frame per site; other
+    files are one site each, named like the GUIs name them (Name=path
+    also accepted).
+    """
+    tasks = []
+    for path in paths:
+        name, file_path = parse_site(path)
+        with open(file_path) as f:
+            header = [col.strip() for col in f.readline().split(',')]
+        if 'Site' in header:
+            df = load_daily(file_path)
+            tasks.extend((str(site), group.drop(columns='Site')) for site, group in df.groupby('Site', sort=True))
+        else:
+            tasks.append((name, file_path))
+    return tasks
+
+
+def batch_forecast(sites, periods=12, target=DEFAULT_TARGET, exog_vars=(), n_jobs=None, timeout=None,
+                   store_dir=None, main_search_settings=None, exog_search_settings=None, sarimax_kwargs=None):
+    """
+    Forecast many sites across a process pool.
+
+    Parameters:
+        sites: (site, source) pairs; source is a daily CSV path or a daily DataFrame
+        periods: months to forecast
+        target, exog_vars: column to forecast and its exogenous regressors
+        n_jobs: worker processes (default: all cores, 1 = run in this process)
+        timeout: per-site time limit in seconds (Unix only)
+        store_dir: reuse/save fitted models in this model store (None = always fit)
+
+    Returns:
+        (forecasts, summary): the consolidated forecast table for all
+        successful sites, and one status row per site (ok, failed or
+        timeout, with the error and run time).
+    """
+    options = dict(periods=periods, target=target, exog_vars=list(exog_vars), store_dir=store_dir,
+                   main_search_settings=main_search_settings, exog_search_settings=exog_search_settings,
+                   sarimax_kwargs=sarimax_kwargs)
+    n_jobs = min(n_jobs or os.cpu_count() or 1, max(len(sites), 1))
+    summaries, tables = [], []
+
+    def report(summary, table):
+        summaries.append(summary)
+        if table is not None:
+            tables.append(table)
+        print(f"  {summary['Site']}: {summary['status']} ({summary['seconds']:.1f} s)"
+              + (f" - {summary['error']}" if summary['error'] else ""))
+
+    if n_jobs == 1:
+        for site, source in sites:
+            report(*_run_task(site, source, options, timeout))
+    else:
+        # A worker that dies (e.g. out of memory) fails only the site it was running
+        run_isolated(_run_task, [(site, source, options, timeout) for site, source in sites], n_jobs,
+                     lambda result: report(*result),
+                     lambda args, e: report({'Site': args[0], 'status': 'failed', 'error': f"worker crashed: {e}",
+                                             'seconds': float('nan')}, None))
+
+    forecasts = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=FORECAST_COLUMNS)
+    summary = pd.DataFrame(summaries).reindex(columns=SUMMARY_COLUMNS).sort_values('Site').reset_index(drop=True)
+    return forecasts.sort_values(['Site', 'Date']).reset_index(drop=True), summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Monthly soil temperature forecasts for many sites.')
+    parser.add_argument('files', nargs='+',
+                        help='Daily site CSVs (glob patterns and Name=path allowed), or a multi-site CSV with a Site column')
+    parser.add_argument('--periods', type=int, default=12, help='Months to forecast')
+    parser.add_argument('--target', default=DEFAULT_TARGET, help='Column to forecast')
+    parser.add_argument('--exog', nargs='*', default=[], help='Exogenous variables')
+    parser.add_argument('--jobs', type=int, help='Worker processes (default: all cores)')
+    parser.add_argument('--timeout', type=float, help='Per-site time limit in seconds')
+    parser.add_argument('--store', help='Model store directory for reusing fitted models')
+    parser.add_argument('-o', '--output', default='batch_forecast.csv', help='Consolidated forecast table (CSV)')
+    args = parser.parse_args()
+
+    paths = [path for pattern in args.files for path in (sorted(glob.glob(pattern)) or [pattern])]
+    sites = collect_sites(paths)
+    print(f"Forecasting {len(sites)} site(s)...")
+    start = time.perf_counter()
+    forecasts, summary = batch_forecast(sites, args.periods, args.target, args.exog, args.jobs, args.timeout,
+                                        args.store)
+
+    forecasts.to_csv(args.output, index=False)
+    summary_file = os.path.splitext(args.output)[0] + '_summary.csv'
+    summary.to_csv(summary_file, index=False)
+    print(summary['status'].value_counts().to_string())
+    print(f"Done in {time.perf_counter() - start:.1f} s")
+    print(f"Forecasts saved to: {args.output}")
+    print(f"Site summary saved to: {summary_file}")
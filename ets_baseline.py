@@ -0,0 +1,258 @@
+import argparse
+import glob
+import time
+import warnings
+from itertools import product
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from batch_forecast import FORECAST_COLUMNS, collect_sites
+from forecast_service import DEFAULT_TARGET
+from monthly_data import load_monthly, monthly_means
+
+SEASON = 12
+
+# Coarse grid shared by all series, then refined per series around each one's best point
+ALPHA_GRID = np.linspace(0.05, 0.95, 10)
+BETA_GRID = np.array([0.0, 0.005, 0.02, 0.05, 0.1])
+GAMMA_GRID = np.array([0.01, 0.05, 0.1, 0.2, 0.35, 0.5])
+
+SUMMARY_COLUMNS = ['Site', 'status', 'error', 'Order', 'alpha', 'beta', 'gamma', 'AIC', 'RMSE', 'Observations']
+
+
+def align_series(series, m=SEASON):
+    """
+    Stack monthly series into a (series x time) array. Each series keeps
+    its own monthly grid (gaps become NaN) and is right-aligned, so all
+    rows end at the last column; `starts` is the column of each row's
+    first observation. Right-aligning keeps every row's months in phase
+    with the column number modulo m.
+    """
+    grids = []
+    for s in series:
+        s = s.dropna()
+        grids.append(s.reindex(pd.date_range(s.index[0], s.index[-1], freq='MS')).to_numpy(dtype=float)
+                     if len(s) else np.array([]))
+    T = max((len(g) for g in grids), default=0)
+    T += (-T) % m
+    Y = np.full((len(grids), T), np.nan)
+    for i, g in enumerate(grids):
+        if len(g):
+            Y[i, T - len(g):] = g
+    starts = T - np.array([len(g) for g in grids])
+    return Y, starts
+
+
+def _initial_states(Y, starts, m, trend):
+    """
+    Classical start values from each row's first two seasons: level from
+    the first season's mean (moved back to just before the first month),
+    slope from the change between the two seasonal means, seasonal terms
+    from the detrended seasonal means. Seasonal terms are stored by
+    column phase (column mod m).
+    """
+    rows = np.arange(len(Y))[:, None]
+    cols = np.minimum(starts[:, None] + np.arange(2 * m), Y.shape[1] - 1)
+    first = Y[rows, cols].reshape(len(Y), 2, m)
+    with warnings.catch_warnings():
+        # Rows whose first seasons are missing whole months give empty means
+        warnings.simplefilter('ignore', RuntimeWarning)
+        means = np.nanmean(first, axis=2)
+        slope = (means[:, 1] - means[:, 0]) / m if trend else np.zeros(len(Y))
+        slope = np.nan_to_num(slope)
+        detrended = first - (means[:, :1, None] + slope[:, None, None] * (np.arange(2 * m).reshape(2, m) - (m - 1) / 2))
+        season = np.nan_to_num(np.nanmean(detrended, axis=1))
+    season -= season.mean(axis=1, keepdims=True)
+    level = np.nan_to_num(means[:, 0]) - slope * (m + 1) / 2
+    # Phase p of a row's first season sits in column phase (start + p) mod m
+    phases = (starts[:, None] + np.arange(m)) % m
+    by_phase = np.empty_like(season)
+    by_phase[rows, phases] = season
+    return level, slope, by_phase
+
+
+def _filter(Y, starts, params, level, slope, season, m):
+    """
+    Additive Holt-Winters recursions (error-correction form) for every row
+    and every parameter set at once:
+        e_t = y_t - (l + b + s_{t-m})
+        l_t = l + b + alpha e_t,   b_t = b + beta e_t,   s_t = s_{t-m} + gamma e_t
+    params is (rows or 1, K, 3); missing months leave e_t = 0. Returns
+    the sum of squared one-step errors per (row, K) and the final states.
+    """
+    S, K = len(Y), params.shape[1]
+    alpha, beta, gamma = (np.broadcast_to(params[..., i], (S, K)) for i in range(3))
+    first = starts.min()
+    # Before a row's first month there are no errors, so the level only moves by the slope;
+    # starting it that many slopes back puts it at its start value on the row's first month
+    l = np.repeat((level - (starts - first) * slope)[:, None], K, axis=1)
+    b = np.repeat(slope[:, None], K, axis=1)
+    s = np.repeat(season.T[:, :, None], K, axis=2)
+    sse = np.zeros((S, K))
+    for t in range(first, Y.shape[1]):
+        s_prev = s[t % m]
+        e = Y[:, t, None] - (l + b + s_prev)
+        np.nan_to_num(e, copy=False)
+        l += b + alpha * e
+        b += beta * e
+        s_prev += gamma * e
+        sse += e * e
+    return sse, l, b, s.transpose(1, 2, 0)
+
+
+def fit_ets(Y, starts, m=SEASON, trend=True, refine=3, chunk_size=500):
+    """
+    Fit additive Holt-Winters to every row of Y (see align_series).
+
+    The smoothing parameters are chosen by least squares of the one-step
+    errors: a coarse grid evaluated for all rows in one pass, then
+    `refine` rounds of a 3 x 3 x 3 grid around each row's best point with
+    the step halved each round, again for all rows at once. Rows are
+    processed `chunk_size` at a time to bound memory.
+
+    Returns a dict of arrays over rows: alpha, beta, gamma, level, slope,
+    season (by column phase), sse, nobs, sigma2, aic.
+    """
+    betas = BETA_GRID if trend else np.array([0.0])
+    coarse = np.array(list(product(ALPHA_GRID, betas, GAMMA_GRID)))[None]
+    steps = np.array([ALPHA_GRID[1] - ALPHA_GRID[0], 0.01 if trend else 0.0, 0.05])
+    offsets = np.array(list(product((-1, 0, 1), repeat=3)), dtype=float)
+    upper = np.array([1.0, 1.0, 1.0])
+
+    fit = {key: [] for key in ('alpha', 'beta', 'gamma', 'level', 'slope', 'season', 'sse')}
+    for lo in range(0, len(Y), chunk_size):
+        Yc, sc = Y[lo:lo + chunk_size], starts[lo:lo + chunk_size]
+        init = _initial_states(Yc, sc, m, trend)
+        rows = np.arange(len(Yc))
+        sse, *_ = _filter(Yc, sc, coarse, *init, m)
+        best = coarse[0][np.argmin(sse, axis=1)]
+        best_sse = sse.min(axis=1)
+        step = steps.copy()
+        for _ in range(refine):
+            step = step / 2
+            grid = np.clip(best[:, None, :] + offsets[None] * step, 0.0, upper)
+            sse, *_ = _filter(Yc, sc, grid, *init, m)
+            i = np.argmin(sse, axis=1)
+            improved = sse[rows, i] < best_sse
+            best[improved] = grid[rows, i][improved]
+            best_sse = np.where(improved, sse[rows, i], best_sse)
+        sse, l, b, s = _filter(Yc, sc, best[:, None, :], *init, m)
+        for key, value in zip(('alpha', 'beta', 'gamma'), best.T):
+            fit[key].append(value)
+        fit['level'].append(l[:, 0])
+        fit['slope'].append(b[:, 0])
+        fit['season'].append(s[:, 0])
+        fit['sse'].append(sse[:, 0])
+
+    fit = {key: np.concatenate(value) for key, value in fit.items()}
+    fit['nobs'] = np.sum(~np.isnan(Y), axis=1)
+    fit['sigma2'] = fit['sse'] / np.maximum(fit['nobs'], 1)
+    k = 2 + trend + 1
+    fit['aic'] = fit['nobs'] * (np.log(2 * np.pi * fit['sigma2']) + 1) + 2 * k
+    fit['m'], fit['T'] = m, Y.shape[1]
+    return fit
+
+
+def ets_forecast(fit, periods, alpha=0.05):
+    """
+    Point forecasts and analytic prediction intervals, (rows x periods)
+    arrays. The h-step variance of additive Holt-Winters is
+    sigma2 * (1 + sum_{j<h} c_j^2), c_j = alpha + beta j + gamma [j mod m == 0].
+    """
+    m, T = fit['m'], fit['T']
+    h = np.arange(1, periods + 1)
+    phases = (T - 1 + h) % m
+    mean = fit['level'][:, None] + h * fit['slope'][:, None] + fit['season'][:, phases]
+    j = np.arange(1, periods)
+    c = fit['alpha'][:, None] + fit['beta'][:, None] * j + fit['gamma'][:, None] * (j % m == 0)
+    var = fit['sigma2'][:, None] * (1 + np.concatenate([np.zeros((len(c), 1)), np.cumsum(c ** 2, axis=1)], axis=1))
+    half = norm.ppf(1 - alpha / 2) * np.sqrt(var)
+    return mean, mean - half, mean + half
+
+
+def batch_ets(sites, periods=12, target=DEFAULT_TARGET, m=SEASON, trend=True, alpha=0.05, min_seasons=3):
+    """
+    Holt-Winters baseline for many sites at once, in the batch_forecast
+    table format so it can be set side by side with the SARIMA forecasts.
+
+    Parameters:
+        sites: {site: monthly frame or Series of the target}
+        periods: months to forecast
+        min_seasons: sites with fewer seasons of data are reported as failed
+
+    Returns:
+        (forecasts, summary) like batch_forecast; the summary also has
+        the smoothing parameters and the in-sample one-step RMSE.
+    """
+    names, series, summaries = [], [], []
+    for site, data in sites.items():
+        s = data[target] if isinstance(data, pd.DataFrame) else data
+        s = s.dropna()
+        if len(s) < min_seasons * m:
+            summaries.append({'Site': site, 'status': 'failed', 'error': f"fewer than {min_seasons * m} months"})
+            continue
+        names.append(site)
+        series.append(s)
+
+    tables = []
+    if names:
+        Y, starts = align_series(series, m)
+        fit = fit_ets(Y, starts, m, trend)
+        mean, lower, upper = ets_forecast(fit, periods, alpha)
+        order = 'ETS(A,A,A)' if trend else 'ETS(A,N,A)'
+        for i, (site, s) in enumerate(zip(names, series)):
+            dates = pd.date_range(s.index[-1] + pd.DateOffset(months=1), periods=periods, freq='MS')
+            tables.append(pd.DataFrame({
+                'Site': site, 'Date': dates, 'Horizon': np.arange(1, periods + 1), 'Forecast': mean[i],
+                'Lower CI': lower[i], 'Upper CI': upper[i], 'Target': target, 'Exogenous': '', 'Order': order,
+                'Seasonal Order': f'm={m}', 'AIC': fit['aic'][i], 'Observations': fit['nobs'][i],
+                'Last Observed': s.index[-1]}))
+            summaries.append({'Site': site, 'status': 'ok', 'error': None, 'Order': order, 'alpha': fit['alpha'][i],
+                              'beta': fit['beta'][i], 'gamma': fit['gamma'][i], 'AIC': fit['aic'][i],
+                              'RMSE': np.sqrt(fit['sigma2'][i]), 'Observations': fit['nobs'][i]})
+
+    forecasts = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=FORECAST_COLUMNS)
+    summary = pd.DataFrame(summaries).reindex(columns=SUMMARY_COLUMNS).sort_values('Site').reset_index(drop=True)
+    return forecasts[FORECAST_COLUMNS].sort_values(['Site', 'Date']).reset_index(drop=True), summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Additive Holt-Winters baseline forecasts for many sites at once.')
+    parser.add_argument('files', nargs='+',
+                        help='Daily site CSVs (glob patterns and Name=path allowed), or a multi-site CSV with a Site column')
+    parser.add_argument('--periods', type=int, default=12, help='Months to forecast')
+    parser.add_argument('--target', default=DEFAULT_TARGET, help='Column to forecast')
+    parser.add_argument('--no-trend', action='store_true', help='Seasonal level model without a slope')
+    parser.add_argument('--holdout', type=int,
+                        help='Also fit without the last N months and score the forecasts of those months')
+    parser.add_argument('-o', '--output', default='ets_forecast.csv', help='Forecast table (CSV)')
+    args = parser.parse_args()
+
+    paths = [path for pattern in args.files for path in (sorted(glob.glob(pattern)) or [pattern])]
+    sites = {site: load_monthly(source) if isinstance(source, str) else monthly_means(source)
+             for site, source in collect_sites(paths)}
+
+    start = time.perf_counter()
+    forecasts, summary = batch_ets(sites, args.periods, args.target, trend=not args.no_trend)
+    print(f"Fitted {int((summary['status'] == 'ok').sum())} site(s) in {time.perf_counter() - start:.2f} s")
+
+    if args.holdout:
+        n = args.holdout
+        held, _ = batch_ets({site: data.dropna(subset=[args.target]).iloc[:-n] for site, data in sites.items()},
+                            n, args.target, trend=not args.no_trend)
+        actual = pd.concat([data[args.target].dropna().iloc[-n:].rename('Actual').to_frame().assign(Site=site)
+                            for site, data in sites.items()]).rename_axis('Date').reset_index()
+        scored = held.merge(actual, on=['Site', 'Date'])
+        errors = (scored['Forecast'] - scored['Actual']).groupby(scored['Site'])
+        summary = summary.merge(pd.DataFrame({'Holdout MAE': errors.apply(lambda e: e.abs().mean()),
+                                              'Holdout RMSE': errors.apply(lambda e: np.sqrt((e ** 2).mean()))}),
+                                left_on='Site', right_index=True, how='left')
+
+    forecasts.to_csv(args.output, index=False)
+    summary_file = args.output.rsplit('.', 1)[0] + '_summary.csv'
+    summary.to_csv(summary_file, index=False)
+    print(summary.round(3).to_string())
+    print(f"Forecasts saved to: {args.output}")
+    print(f"Site summary saved to: {summary_file}")
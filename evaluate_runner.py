@@ -0,0 +1,163 @@
+import argparse
+import contextlib
+import glob
+import os
+import re
+import signal
+import time
+from itertools import product
+
+import matplotlib
+
+# Headless: figures are written to files, never shown (set before pyplot is imported)
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import pandas as pd
+
+from Evaluate_SARIMA import MODES, run_sarima_forecast
+from batch_forecast import TaskTimeout, _alarm, collect_sites, run_isolated
+from experiment_store import DEFAULT_DB, ExperimentStore
+from monthly_data import load_frames, monthly_means
+
+DEFAULT_OUTPUT_DIR = 'evaluation'
+
+METRIC_COLUMNS = ['Site', 'mode', 'exog_vars', 'status', 'error', 'seconds', 'observations', 'order',
+                  'seasonal_order', 'aic', 'adf_pvalue', 'MAE', 'MSE', 'RMSE', 'R2', 'backtest_MAE', 'backtest_RMSE',
+                  'figure_dir']
+
+
+def _slug(text):
+    return re.sub(r'[^A-Za-z0-9.]+', '_', text).strip('_')
+
+
+def evaluation_tasks(sites, modes=MODES, exog_sets=((),), output_dir=DEFAULT_OUTPUT_DIR):
+    """
+    One task per site x mode x exogenous set, each with its own figure
+    directory <output_dir>/<site>/<mode>/<exog vars or 'none'>.
+    """
+    tasks = []
+    for (site, source), mode, exog_vars in product(sites, modes, exog_sets):
+        exog_vars = list(exog_vars)
+        tasks.append({'Site': site, 'source': source, 'mode': mode, 'exog_vars': exog_vars,
+                      'figure_dir': os.path.join(output_dir, _slug(site), mode,
+                                                 _slug('-'.join(exog_vars)) or 'none')})
+    return tasks
+
+
+def _run_evaluation(task, options, timeout, store_path=None):
+    """
+    Worker entry point: one evaluation, its console output written to
+    log.txt next to its figures. Failures and the time limit are kept to
+    the task, as in batch_forecast. With a `store_path` the trials and the
+    run are recorded in that experiment database. Returns a metrics row.
+    """
+    start = time.perf_counter()
+    row = {key: task[key] for key in ('Site', 'mode', 'figure_dir')}
+    row.update(exog_vars=', '.join(task['exog_vars']), status='ok', error=None)
+    os.makedirs(task['figure_dir'], exist_ok=True)
+    use_alarm = bool(timeout) and hasattr(signal, 'SIGALRM')
+    try:
+        if use_alarm:
+            signal.signal(signal.SIGALRM, _alarm)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        with open(os.path.join(task['figure_dir'], 'log.txt'), 'w', encoding='utf-8') as log, \
+                contextlib.redirect_stdout(log), contextlib.redirect_stderr(log), \
+                (ExperimentStore(store_path) if store_path else contextlib.nullcontext()) as store:
+            source = task['source']
+            df_day, df_month = load_frames(source) if isinstance(source, str) else (source, monthly_means(source))
+            row.update(run_sarima_forecast(df_day, mode=task['mode'], exog_vars=task['exog_vars'],
+                                           df_monthly=df_month, figure_dir=task['figure_dir'], store=store,
+                                           site=task['Site'], **options))
+    except TaskTimeout:
+        row.update(status='timeout', error=f"exceeded {timeout} s")
+    except Exception as e:
+        row.update(status='failed', error=f"{type(e).__name__}: {e}")
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+        plt.close('all')
+    row['seconds'] = time.perf_counter() - start
+    return row
+
+
+def run_evaluations(sites, modes=MODES, exog_sets=((),), output_dir=DEFAULT_OUTPUT_DIR, n_jobs=None, timeout=None,
+                    store_path=None, **options):
+    """
+    Evaluate_SARIMA's evaluation for every site x mode x exogenous set,
+    across a process pool and without any windows.
+
+    Parameters:
+        sites: (site, source) pairs as from batch_forecast.collect_sites
+        modes: run_sarima_forecast modes
+        exog_sets: lists of exogenous variables ([] = soil temperature only)
+        output_dir: figures and logs go to a directory per task below this
+        n_jobs: worker processes (default: all cores, 1 = run in this process)
+        timeout: per-task time limit in seconds (Unix only)
+        store_path: experiment database recording every trial and run (None = not recorded)
+        options: passed to run_sarima_forecast (order_search, backtest_origins, ...)
+
+    Returns:
+        One row per task with its status, run time and metrics.
+    """
+    tasks = evaluation_tasks(sites, modes, exog_sets, output_dir)
+    n_jobs = min(n_jobs or os.cpu_count() or 1, max(len(tasks), 1))
+    # The workers are the parallelism; a grid search inside one fits in that worker's process
+    options.setdefault('n_jobs', 1)
+    rows = []
+
+    def report(row):
+        rows.append(row)
+        print(f"  {row['Site']} | {row['mode']} | {row['exog_vars'] or 'none'}: {row['status']} "
+              f"({row['seconds']:.1f} s)" + (f" - {row['error']}" if row['error'] else ""))
+
+    if n_jobs == 1:
+        for task in tasks:
+            report(_run_evaluation(task, options, timeout, store_path))
+    else:
+        # A worker that dies (e.g. out of memory) fails only the evaluation it was running
+        def crashed(args, e):
+            task = args[0]
+            report({'Site': task['Site'], 'mode': task['mode'], 'exog_vars': ', '.join(task['exog_vars']),
+                    'figure_dir': task['figure_dir'], 'status': 'failed',
+                    'error': f"worker crashed: {e}", 'seconds': float('nan')})
+
+        run_isolated(_run_evaluation, [(task, options, timeout, store_path) for task in tasks], n_jobs, report,
+                     crashed)
+
+    table = pd.DataFrame(rows).reindex(columns=METRIC_COLUMNS)
+    return table.sort_values(['Site', 'mode', 'exog_vars']).reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Unattended SARIMA evaluation of many modes, sites and exogenous sets.')
+    parser.add_argument('files', nargs='*', default=['Katherine_InputData_Time_Series.csv'],
+                        help='Daily site CSVs (glob patterns and Name=path allowed), or a multi-site CSV with a Site column')
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=MODES, help='Evaluation modes')
+    parser.add_argument('--exog-sets', nargs='+', default=[''],
+                        help='Comma-separated exogenous variable sets, e.g. "" "T.Max,Radn,RHminT"')
+    parser.add_argument('--order-search', default='stepwise', choices=['stepwise', 'grid', 'screened'],
+                        help='Order search of each evaluation')
+    parser.add_argument('--backtest-origins', type=int, help='Walk-forward backtest origins (default: no backtest)')
+    parser.add_argument('--backtest-horizon', type=int, default=24, help='Walk-forward backtest horizon')
+    parser.add_argument('--jobs', type=int, help='Worker processes (default: all cores)')
+    parser.add_argument('--timeout', type=float, help='Per-task time limit in seconds')
+    parser.add_argument('--store', default=DEFAULT_DB, help="Experiment database for trials and runs ('' = none)")
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR, help='Directory for figures, logs and metrics')
+    args = parser.parse_args()
+
+    paths = [path for pattern in args.files for path in (sorted(glob.glob(pattern)) or [pattern])]
+    sites = collect_sites(paths)
+    exog_sets = [[var.strip() for var in exog_set.split(',') if var.strip()] for exog_set in args.exog_sets]
+    print(f"Evaluating {len(sites)} site(s) x {len(args.modes)} mode(s) x {len(exog_sets)} exogenous set(s)...")
+    start = time.perf_counter()
+    table = run_evaluations(sites, args.modes, exog_sets, args.output_dir, args.jobs, args.timeout,
+                            args.store or None, order_search=args.order_search, backtest_origins=args.backtest_origins,
+                            backtest_horizon=args.backtest_horizon)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    output = os.path.join(args.output_dir, 'evaluation_metrics.csv')
+    table.to_csv(output, index=False)
+    print(table.drop(columns=['error', 'figure_dir']).round(3).to_string())
+    print(f"Done in {time.perf_counter() - start:.1f} s")
+    print(f"Metrics saved to: {output}")
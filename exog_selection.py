@@ -0,0 +1,221 @@
+import argparse
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from sarima_search import _difference, estimate_differencing
+
+DEFAULT_TARGET = 'Soil_Temperature'
+
+# Weather columns of the site CSVs that can serve as regressors
+CANDIDATE_EXOG_VARS = ['T.Max', 'T.Min', 'Rain', 'Evap', 'Radn', 'VP', 'RHmaxT', 'RHminT']
+
+# auto_arima settings for each subset; the differencing is fixed once for all subsets
+SELECTION_SEARCH_SETTINGS = dict(
+    seasonal=True,
+    start_p=0, start_q=0, max_p=3, max_q=3,
+    start_P=0, start_Q=0, max_P=2, max_Q=2,
+    stepwise=True
+)
+
+METHODS = ('exhaustive', 'forward', 'backward')
+TABLE_COLUMNS = ['exog_vars', 'n_vars', 'order', 'seasonal_order', 'aic', 'MAE', 'RMSE', 'R2', 'fit_time', 'status',
+                 'error']
+
+# Prepared data used by the fits in a worker process, set once by _init_worker
+_worker_data = {}
+
+
+def _init_worker(prepared):
+    _worker_data.update(prepared)
+
+
+def prepare_data(data, candidates=CANDIDATE_EXOG_VARS, target=DEFAULT_TARGET, m=12, train_fraction=0.75,
+                 d=None, D=None):
+    """
+    Everything the subset fits share, computed once: the monthly frame
+    aligned on the target and all candidate columns, the train/hold-out
+    split, the differencing orders (estimated on the training target with
+    all candidates, like auto_arima does) and the differenced target and
+    candidate columns.
+
+    All subsets are fitted and scored on the same months, so their errors
+    are comparable; months where any candidate is missing are dropped.
+    """
+    candidates = list(candidates)
+    missing = [col for col in [target] + candidates if col not in data.columns]
+    if missing:
+        raise ValueError(f"no column(s): {', '.join(missing)}")
+    frame = data[[target] + candidates].dropna()
+    y = frame[target].to_numpy(dtype=float)
+    X = frame[candidates].to_numpy(dtype=float)
+    n_train = int(len(frame) * train_fraction)
+
+    if d is None or D is None:
+        est_d, est_D = estimate_differencing(y[:n_train], X[:n_train] if candidates else None, m)
+        d = est_d if d is None else d
+        D = est_D if D is None else D
+    return {'columns': candidates, 'index': frame.index, 'y': y, 'n_train': n_train, 'd': d, 'D': D, 'm': m,
+            'w': _difference(y, d, D, m), 'X': _difference(X, d, D, m)}
+
+
+def _undifference(w_forecast, history, d, D, m):
+    """Levels from forecasts of the (1 - B)^d (1 - B^m)^D differenced series, continuing `history`."""
+    poly = np.array([1.0])
+    for _ in range(d):
+        poly = np.convolve(poly, [1.0, -1.0])
+    for _ in range(D):
+        poly = np.convolve(poly, np.r_[1.0, np.zeros(m - 1), -1.0])
+    lags = np.flatnonzero(poly[1:]) + 1
+    y = np.concatenate([np.asarray(history, dtype=float), np.empty(len(w_forecast))])
+    for i, w in enumerate(w_forecast, start=len(history)):
+        y[i] = w - poly[lags] @ y[i - lags]
+    return y[len(history):]
+
+
+def _evaluate_subset(subset, search_settings, prepared=None):
+    """Order search, fit and hold-out scores for one subset of regressors (one row of the table)."""
+    from pmdarima import auto_arima
+
+    prepared = prepared or _worker_data
+    row = {'exog_vars': subset, 'n_vars': len(subset), 'order': None, 'seasonal_order': None, 'aic': np.nan,
+           'MAE': np.nan, 'RMSE': np.nan, 'R2': np.nan, 'status': 'ok', 'error': None}
+    start = time.perf_counter()
+    try:
+        cols = [prepared['columns'].index(var) for var in subset]
+        y, n_train, w = prepared['y'], prepared['n_train'], prepared['w']
+        n_fit = n_train - (len(y) - len(w))
+        X_train = prepared['X'][:n_fit, cols] if cols else None
+        X_test = prepared['X'][n_fit:, cols] if cols else None
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            auto_model = auto_arima(w[:n_fit], X=X_train, m=prepared['m'], d=0, D=0, trace=False,
+                                    error_action='ignore', suppress_warnings=True, **search_settings)
+            w_forecast = auto_model.predict(n_periods=len(w) - n_fit, X=X_test)
+        forecast = _undifference(np.asarray(w_forecast), y[:n_train], prepared['d'], prepared['D'], prepared['m'])
+        errors = forecast - y[n_train:]
+        row.update(order=auto_model.order, seasonal_order=auto_model.seasonal_order, aic=auto_model.aic(),
+                   MAE=np.abs(errors).mean(), RMSE=np.sqrt((errors ** 2).mean()),
+                   R2=1 - (errors ** 2).sum() / ((y[n_train:] - y[n_train:].mean()) ** 2).sum())
+    except Exception as e:
+        row.update(status='failed', error=str(e))
+    row['fit_time'] = time.perf_counter() - start
+    return row
+
+
+def select_exog_vars(data, candidates=CANDIDATE_EXOG_VARS, target=DEFAULT_TARGET, method='forward', m=12,
+                     train_fraction=0.75, max_vars=None, search_settings=None, n_jobs=None, trace=True):
+    """
+    Rank subsets of candidate exogenous variables by out-of-sample error.
+
+    Each subset gets its own auto_arima order search and is scored on the
+    last (1 - train_fraction) of the months with the observed regressors,
+    like the scripts' test evaluation. The aligned frame and the
+    differencing are prepared once (see prepare_data) and handed to each
+    worker process once, not per subset.
+
+    Parameters:
+        data: monthly frame with the target and candidate columns
+        candidates: exogenous variables to choose from
+        method: 'exhaustive' (every subset up to max_vars), 'forward'
+                (add the variable that lowers RMSE most until none does) or
+                'backward' (start from all, drop variables likewise)
+        max_vars: largest subset size for 'exhaustive'/'forward' (None = all)
+        search_settings: auto_arima settings (default SELECTION_SEARCH_SETTINGS)
+        n_jobs: worker processes (default: all cores, 1 = fit in this process)
+        trace: print each subset as it is scored
+
+    Returns:
+        DataFrame with one row per evaluated subset (exog_vars, n_vars,
+        order, seasonal_order, aic, MAE, RMSE, R2, fit_time, status,
+        error), lowest RMSE first.
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {', '.join(METHODS)}")
+    candidates = list(candidates)
+    max_vars = len(candidates) if max_vars is None else max_vars
+    search_settings = dict(SELECTION_SEARCH_SETTINGS if search_settings is None else search_settings)
+    search_settings.pop('m', None)
+    prepared = prepare_data(data, candidates, target, m, train_fraction)
+    if trace:
+        print(f"Scoring regressor subsets on {len(prepared['y']) - prepared['n_train']} hold-out months "
+              f"(d={prepared['d']}, D={prepared['D']})")
+
+    rows = {}
+    n_jobs = n_jobs or os.cpu_count() or 1
+    executor = None if n_jobs == 1 else ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                                                            initargs=(prepared,))
+
+    def ordered(subset):
+        return tuple(var for var in candidates if var in subset)
+
+    def evaluate(subsets):
+        """Scores for a batch of subsets (in candidate order), fitting only those not seen before."""
+        todo = list(dict.fromkeys(subset for subset in subsets if subset not in rows))
+        if executor is None:
+            results = (_evaluate_subset(subset, search_settings, prepared) for subset in todo)
+        else:
+            results = executor.map(_evaluate_subset, todo, [search_settings] * len(todo))
+        for row in results:
+            rows[row['exog_vars']] = row
+            if trace:
+                print(f"  {', '.join(row['exog_vars']) or '(none)'}: RMSE={row['RMSE']:.3f}, "
+                      f"Time={row['fit_time']:.1f} sec [{row['status']}]")
+        return {subset: rows[subset]['RMSE'] for subset in subsets}
+
+    def score(subset):
+        return np.inf if np.isnan(scores[subset]) else scores[subset]
+
+    try:
+        if method == 'exhaustive':
+            evaluate([subset for k in range(max_vars + 1) for subset in combinations(candidates, k)])
+        else:
+            current = () if method == 'forward' else tuple(candidates)
+            scores = evaluate([current])
+            while True:
+                if method == 'forward':
+                    steps = [ordered(current + (var,)) for var in candidates if var not in current] if len(current) < max_vars else []
+                else:
+                    steps = [ordered(set(current) - {drop}) for drop in current]
+                if not steps:
+                    break
+                scores.update(evaluate(steps))
+                best = min(steps, key=score)
+                if score(best) >= score(current):
+                    break
+                current = best
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    table = pd.DataFrame(list(rows.values())).reindex(columns=TABLE_COLUMNS)
+    return table.sort_values('RMSE', na_position='last', kind='stable').reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    from monthly_data import load_monthly
+
+    parser = argparse.ArgumentParser(description='Rank exogenous variable subsets by out-of-sample error.')
+    parser.add_argument('file', nargs='?', default='Katherine_InputData_Time_Series.csv', help='Daily site CSV')
+    parser.add_argument('--target', default=DEFAULT_TARGET, help='Column to forecast')
+    parser.add_argument('--candidates', nargs='+', default=CANDIDATE_EXOG_VARS, help='Candidate exogenous variables')
+    parser.add_argument('--method', choices=METHODS, default='forward', help='Subset search')
+    parser.add_argument('--max-vars', type=int, help='Largest subset size')
+    parser.add_argument('--train-fraction', type=float, default=0.75, help='Share of months used for fitting')
+    parser.add_argument('--jobs', type=int, help='Worker processes (default: all cores)')
+    parser.add_argument('-o', '--output', help='Save the ranked table to this CSV')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    table = select_exog_vars(load_monthly(args.file), args.candidates, args.target, args.method,
+                             train_fraction=args.train_fraction, max_vars=args.max_vars, n_jobs=args.jobs)
+    print(table.drop(columns='error').to_string())
+    print(f"Done in {time.perf_counter() - start:.1f} s")
+    if args.output:
+        table.to_csv(args.output, index=False)
+        print(f"Ranking saved to: {args.output}")
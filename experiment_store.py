@@ -0,0 +1,241 @@
+import argparse
+import ast
+import hashlib
+import json
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+import statsmodels
+
+from model_store import data_fingerprint
+
+DEFAULT_DB = 'experiments.sqlite'
+
+# Metrics where a higher value is better; the others are errors or criteria
+HIGHER_IS_BETTER = {'R2'}
+
+TRIAL_COLUMNS = ['fingerprint', 'site', 'mode', 'source', 'order', 'seasonal_order', 'trend', 'aic', 'aicc', 'bic',
+                 'fit_time', 'status', 'error', 'params', 'created_at']
+RUN_COLUMNS = ['site', 'mode', 'exog_vars', 'fingerprint', 'order_search', 'order', 'seasonal_order', 'aic',
+               'observations', 'adf_pvalue', 'MAE', 'MSE', 'RMSE', 'R2', 'backtest_MAE', 'backtest_RMSE', 'seconds',
+               'settings', 'created_at']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trials (
+    id INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL, site TEXT, mode TEXT, source TEXT,
+    "order" TEXT NOT NULL, seasonal_order TEXT NOT NULL, trend TEXT NOT NULL,
+    aic REAL, aicc REAL, bic REAL, fit_time REAL, status TEXT, error TEXT, params TEXT, created_at TEXT,
+    UNIQUE (fingerprint, "order", seasonal_order, trend)
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    site TEXT, mode TEXT, exog_vars TEXT, fingerprint TEXT, order_search TEXT, "order" TEXT, seasonal_order TEXT,
+    aic REAL, observations INTEGER, adf_pvalue REAL, MAE REAL, MSE REAL, RMSE REAL, R2 REAL,
+    backtest_MAE REAL, backtest_RMSE REAL, seconds REAL, settings TEXT, created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_site_mode ON runs (site, mode);
+"""
+
+
+def trial_fingerprint(endog, exog=None, settings=None):
+    """
+    Key of the data a candidate is fitted on: endog and exog values (and
+    index), the fit settings and the statsmodels version. Candidates with
+    the same key and orders give the same fit.
+    """
+    frames = [endog if isinstance(endog, (pd.Series, pd.DataFrame)) else pd.Series(np.asarray(endog, dtype=float))]
+    if exog is not None:
+        frames.append(exog if isinstance(exog, (pd.Series, pd.DataFrame)) else pd.DataFrame(np.asarray(exog, dtype=float)))
+    payload = {
+        'data': [data_fingerprint(frame) for frame in frames],
+        'settings': settings or {},
+        'statsmodels': statsmodels.__version__,
+    }
+    text = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+
+def _orders(order):
+    return str(tuple(int(x) for x in order))
+
+
+def _number(value):
+    return None if value is None or pd.isna(value) else float(value)
+
+
+def _now():
+    return time.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def auto_arima_trial(model):
+    """Trial row of a pmdarima ARIMA (e.g. one of auto_arima's return_valid_fits); its fit time is not known."""
+    results = model.arima_res_
+    return {'order': model.order, 'seasonal_order': model.seasonal_order,
+            'trend': 'c' if model.with_intercept else None, 'aic': model.aic(), 'aicc': model.aicc(),
+            'bic': model.bic(), 'fit_time': np.nan, 'status': 'ok', 'error': None,
+            'params': pd.Series(np.asarray(results.params), index=results.model.param_names)}
+
+
+class ExperimentStore:
+    """
+    SQLite record of order-search trials and evaluation runs.
+
+    trials: one row per fitted (data fingerprint, order, seasonal order,
+            trend), with the information criteria, fit time, status and
+            estimated parameters, so identical fits are looked up instead
+            of repeated
+    runs:   one row per evaluation (site, mode, exogenous set, selected
+            orders, test and backtest metrics, run time, settings)
+
+    Several processes may write to the same file; SQLite serializes the
+    writes.
+    """
+
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def lookup_trials(self, fingerprint, trend=None):
+        """
+        Recorded trials of a fingerprint as search_orders rows, keyed by
+        (order, seasonal_order).
+        """
+        cursor = self.conn.execute(
+            'SELECT "order", seasonal_order, aic, aicc, bic, fit_time, status, error, params FROM trials '
+            'WHERE fingerprint = ? AND trend = ?', (fingerprint, trend or ''))
+        found = {}
+        for order, seasonal_order, aic, aicc, bic, fit_time, status, error, params in cursor:
+            key = (ast.literal_eval(order), ast.literal_eval(seasonal_order))
+            found[key] = {'order': key[0], 'seasonal_order': key[1], 'trend': trend,
+                          'aic': np.nan if aic is None else aic, 'aicc': np.nan if aicc is None else aicc,
+                          'bic': np.nan if bic is None else bic, 'fit_time': fit_time, 'status': status,
+                          'error': error, 'params': pd.Series(json.loads(params)) if params else None}
+        return found
+
+    def record_trials(self, fingerprint, rows, site=None, mode=None, source='grid'):
+        """
+        Save fitted candidates (search_orders rows or dicts with the same
+        keys). Rows that were not fitted (pruned, screened, timeout) are
+        skipped; a new fit of the same candidate replaces the old one.
+        """
+        records = [(fingerprint, site, mode, source, _orders(row['order']), _orders(row['seasonal_order']),
+                    row.get('trend') or '', _number(row.get('aic')), _number(row.get('aicc')),
+                    _number(row.get('bic')), _number(row.get('fit_time')), row['status'], row.get('error'),
+                    None if row.get('params') is None else json.dumps({k: float(v) for k, v in row['params'].items()}),
+                    _now())
+                   for row in rows if row['status'] in ('ok', 'failed')]
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO trials (fingerprint, site, mode, source, "order", seasonal_order, trend, aic, '
+                'aicc, bic, fit_time, status, error, params, created_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', records)
+        return len(records)
+
+    def record_run(self, evaluation, site=None, fingerprint=None, order_search=None, seconds=None, settings=None):
+        """Save one evaluation: the metrics dict returned by run_sarima_forecast plus its context."""
+        record = {'site': site, 'mode': evaluation.get('mode'), 'exog_vars': evaluation.get('exog_vars', ''),
+                  'fingerprint': fingerprint, 'order_search': order_search,
+                  'order': _orders(evaluation['order']) if evaluation.get('order') is not None else None,
+                  'seasonal_order': (_orders(evaluation['seasonal_order'])
+                                     if evaluation.get('seasonal_order') is not None else None),
+                  'observations': evaluation.get('observations'), 'seconds': _number(seconds),
+                  'settings': json.dumps(settings or {}, sort_keys=True, default=str), 'created_at': _now()}
+        for key in ['aic', 'adf_pvalue', 'MAE', 'MSE', 'RMSE', 'R2', 'backtest_MAE', 'backtest_RMSE']:
+            record[key] = _number(evaluation.get(key))
+        columns = ', '.join(f'"{col}"' for col in record)
+        with self.conn:
+            cursor = self.conn.execute(f'INSERT INTO runs ({columns}) VALUES ({", ".join("?" * len(record))})',
+                                       list(record.values()))
+        return cursor.lastrowid
+
+    def _query(self, table, columns, **filters):
+        filters = {key: value for key, value in filters.items() if value is not None}
+        where = ' AND '.join(f'"{key}" = ?' for key in filters)
+        sql = 'SELECT ' + ', '.join(f'"{col}"' for col in columns) + f' FROM {table}'
+        return pd.read_sql_query(sql + (f' WHERE {where}' if where else '') + ' ORDER BY id', self.conn,
+                                 params=list(filters.values()))
+
+    def trials(self, fingerprint=None, site=None, mode=None):
+        """Recorded trials, optionally of one fingerprint, site or mode."""
+        return self._query('trials', TRIAL_COLUMNS, fingerprint=fingerprint, site=site, mode=mode)
+
+    def runs(self, site=None, mode=None):
+        """Recorded evaluation runs, optionally of one site or mode."""
+        return self._query('runs', RUN_COLUMNS, site=site, mode=mode)
+
+    def best_runs(self, metric='RMSE', mode=None):
+        """Each site's best run by `metric` (per mode unless one mode is given)."""
+        runs = self.runs(mode=mode).dropna(subset=[metric])
+        if runs.empty:
+            return runs
+        ascending = metric not in HIGHER_IS_BETTER
+        runs = runs.sort_values(metric, ascending=ascending, kind='stable')
+        return runs.groupby(['site', 'mode'], sort=True).head(1).sort_values(['site', 'mode']).reset_index(drop=True)
+
+    def leaderboard(self, metric='RMSE', by=('mode', 'exog_vars', 'order_search'), mode=None):
+        """
+        Configurations ranked by `metric` across sites. Each site counts
+        once per configuration (its latest run); the table has the number
+        of sites and the mean, median and worst metric.
+        """
+        by = list(by)
+        runs = self.runs(mode=mode).dropna(subset=[metric])
+        if runs.empty:
+            return pd.DataFrame(columns=by + ['sites', 'mean', 'median', 'worst'])
+        latest = runs.groupby(by + ['site'], dropna=False).tail(1)
+        ascending = metric not in HIGHER_IS_BETTER
+        table = latest.groupby(by, dropna=False)[metric].agg(
+            sites='count', mean='mean', median='median', worst='max' if ascending else 'min').reset_index()
+        return table.sort_values('mean', ascending=ascending, kind='stable').reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Query recorded order-search trials and evaluation runs.')
+    parser.add_argument('--db', default=DEFAULT_DB, help='Experiment database')
+    parser.add_argument('-o', '--output', help='Save the table to this CSV')
+    commands = parser.add_subparsers(dest='command', required=True)
+    leaderboard_parser = commands.add_parser('leaderboard', help='Configurations ranked across sites')
+    leaderboard_parser.add_argument('--metric', default='RMSE', help='Metric to rank by')
+    leaderboard_parser.add_argument('--by', nargs='+', default=['mode', 'exog_vars', 'order_search'],
+                                    help='Run columns that make a configuration')
+    leaderboard_parser.add_argument('--mode', help='Only this mode')
+    best_parser = commands.add_parser('best', help="Each site's best run")
+    best_parser.add_argument('--metric', default='RMSE', help='Metric to rank by')
+    best_parser.add_argument('--mode', help='Only this mode')
+    runs_parser = commands.add_parser('runs', help='Evaluation runs')
+    runs_parser.add_argument('--site', help='Only this site')
+    runs_parser.add_argument('--mode', help='Only this mode')
+    trials_parser = commands.add_parser('trials', help='Order-search trials')
+    trials_parser.add_argument('--site', help='Only this site')
+    trials_parser.add_argument('--mode', help='Only this mode')
+    trials_parser.add_argument('--fingerprint', help='Only this data fingerprint')
+    args = parser.parse_args()
+
+    with ExperimentStore(args.db) as store:
+        if args.command == 'leaderboard':
+            table = store.leaderboard(args.metric, args.by, args.mode)
+        elif args.command == 'best':
+            table = store.best_runs(args.metric, args.mode)
+        elif args.command == 'runs':
+            table = store.runs(args.site, args.mode)
+        else:
+            table = store.trials(args.fingerprint, args.site, args.mode).drop(columns='params')
+
+    print(table.round(3).to_string() if len(table) else 'No records.')
+    if args.output:
+        table.to_csv(args.output, index=False)
+        print(f"Saved to: {args.output}")
@@ -0,0 +1,284 @@
+import argparse
+import multiprocessing
+import os
+import pickle
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from model_store import DEFAULT_STORE_DIR, load_model, model_key, save_model
+from monthly_data import load_monthly, monthly_means
+from sarima_simulation import DEFAULT_PATHS, simulate_forecast
+
+DEFAULT_SITES = {'Katherine': 'Katherine_InputData_Time_Series.csv'}
+DEFAULT_TARGET = 'Soil_Temperature'
+MODES = ('monthly',)
+
+# The final models relax the stationarity/invertibility constraints; the order
+# search uses the same settings so its fitted estimates can be reused as they are
+SARIMAX_KWARGS = {'enforce_stationarity': False, 'enforce_invertibility': False}
+
+# auto_arima search settings for the target and exogenous models
+MAIN_SEARCH_SETTINGS = dict(
+    seasonal=True, m=12,
+    start_p=0, start_q=0, max_p=3, max_q=3,
+    start_P=0, start_Q=0, max_P=2, max_Q=2,
+    d=None, D=None,
+    stepwise=True
+)
+EXOG_SEARCH_SETTINGS = dict(seasonal=True, m=12, stepwise=True)
+
+# Months of forecast computed up front for each model
+DEFAULT_MAX_HORIZON = 60
+
+
+def fit_sarimax(endog, exog=None, search_settings=None, sarimax_kwargs=None):
+    """auto_arima order search followed by the final SARIMAX reusing its estimates."""
+    # Imported here so the GUIs can open their window before pmdarima and the
+    # statsmodels state space code have loaded
+    from pmdarima import auto_arima
+    from sarima_fit import refit_sarimax
+
+    sarimax_kwargs = dict(sarimax_kwargs or {})
+    auto_model = auto_arima(
+        endog,
+        X=exog,
+        trace=False,
+        error_action='ignore',
+        suppress_warnings=True,
+        sarimax_kwargs=sarimax_kwargs,
+        **(search_settings or {})
+    )
+    return refit_sarimax(endog, auto_model.order, auto_model.seasonal_order,
+                         exog=exog, source=auto_model, **sarimax_kwargs)
+
+
+class ForecastModel:
+    """
+    Fitted target model plus one model per exogenous variable, for one cache key.
+
+    Forecasts are computed once up to the longest horizon asked for so far
+    (at least `max_horizon` months) and sliced for each request; a longer
+    request recomputes them to twice the previous length.
+    """
+
+    def __init__(self, site, target, exog_vars, mode, data, results, exog_models, max_horizon=DEFAULT_MAX_HORIZON):
+        self.site = site
+        self.target = target
+        self.exog_vars = list(exog_vars)
+        self.mode = mode
+        self.data = data
+        self.results = results
+        self.exog_models = exog_models
+        self.max_horizon = max_horizon
+        self._forecast = None
+
+    def forecast_exogenous_variables(self, periods):
+        """
+        Forecasts each exogenous variable independently using its fitted model.
+        (Results may be fitted on dated series or, after model_update, on plain arrays.)
+        """
+        index = pd.date_range(start=self.data.index[-1] + pd.DateOffset(months=1), periods=periods, freq='MS')
+        exog_forecast_df = pd.DataFrame(index=index, columns=self.exog_vars, dtype=float)
+        for var in self.exog_vars:
+            exog_forecast_df[var] = np.asarray(self.exog_models[var].get_forecast(steps=periods).predicted_mean)
+        return exog_forecast_df
+
+    def forecast(self, periods):
+        """DataFrame of Forecast, Lower CI and Upper CI for the next `periods` months."""
+        if self._forecast is None or len(self._forecast) < periods:
+            cached = 0 if self._forecast is None else len(self._forecast)
+            self._forecast = self._compute_forecast(max(periods, self.max_horizon, 2 * cached))
+        return self._forecast.iloc[:periods].copy()
+
+    def _compute_forecast(self, periods):
+        index = pd.date_range(start=self.data.index[-1] + pd.DateOffset(months=1), periods=periods, freq='MS')
+        exog = self.forecast_exogenous_variables(periods) if self.exog_vars else None
+        forecast = self.results.get_forecast(steps=periods, exog=exog)
+        forecast_ci = np.asarray(forecast.conf_int())
+        forecast_df = pd.DataFrame({
+            'Forecast': np.asarray(forecast.predicted_mean),
+            'Lower CI': forecast_ci[:, 0],
+            'Upper CI': forecast_ci[:, 1]
+        }, index=index)
+        forecast_df.index.name = 'Date'
+        return forecast_df
+
+    def simulate(self, periods, n_paths=DEFAULT_PATHS, seed=None):
+        """
+        Monte Carlo forecast whose intervals also cover the uncertainty of
+        the exogenous forecasts; same columns as forecast(). Not cached.
+        """
+        return simulate_forecast(self, periods, n_paths, seed=seed)[0]
+
+
+class ForecastService:
+    """
+    Holds fitted forecasting models for many sites, targets, exogenous sets
+    and modes in a bounded LRU cache, so switching between them does not
+    wait for a refit.
+
+    Entries are keyed by (site, target, exogenous set, mode). The least
+    recently used entries are evicted once more than `max_models` are held,
+    or once their total pickled size exceeds `max_bytes` (None = no memory
+    bound). Misses go to the persistent model store before fitting; the
+    target and exogenous models still to be fitted are fitted together
+    across `n_jobs` worker processes (1 = fit in this process). Each new
+    entry precomputes its forecasts to `max_horizon` months.
+    """
+
+    def __init__(self, sites=None, max_models=8, max_bytes=None, store_dir=DEFAULT_STORE_DIR,
+                 main_search_settings=None, exog_search_settings=None, sarimax_kwargs=None, n_jobs=None,
+                 max_horizon=DEFAULT_MAX_HORIZON):
+        self.sites = dict(DEFAULT_SITES if sites is None else sites)
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.store_dir = store_dir
+        self.main_search_settings = dict(main_search_settings or MAIN_SEARCH_SETTINGS)
+        self.exog_search_settings = dict(exog_search_settings or EXOG_SEARCH_SETTINGS)
+        self.sarimax_kwargs = dict(SARIMAX_KWARGS if sarimax_kwargs is None else sarimax_kwargs)
+        self.n_jobs = n_jobs
+        self.max_horizon = max_horizon
+        self._data = {}
+        self._models = OrderedDict()
+        self._sizes = {}
+        self.hits = 0
+        self.misses = 0
+
+    def add_site(self, site, file_path):
+        """Register (or re-point) a site's daily input CSV."""
+        self.sites[site] = file_path
+        self._data.pop(site, None)
+        for key in [k for k in self._models if k[0] == site]:
+            self._evict(key)
+
+    def monthly_data(self, site):
+        """Monthly frame of a registered site (read once)."""
+        if site not in self.sites:
+            raise ValueError(f"Unknown site '{site}'. Known sites: {', '.join(self.sites)}")
+        if site not in self._data:
+            self._data[site] = load_monthly(self.sites[site])
+        return self._data[site]
+
+    @staticmethod
+    def cache_key(site, target=DEFAULT_TARGET, exog_vars=(), mode='monthly'):
+        return (site, target, tuple(exog_vars), mode)
+
+    def get_model(self, site, target=DEFAULT_TARGET, exog_vars=(), mode='monthly'):
+        """ForecastModel for the key, from the cache, the model store or a fresh fit."""
+        key = self.cache_key(site, target, exog_vars, mode)
+        if key in self._models:
+            self.hits += 1
+            self._models.move_to_end(key)
+            return self._models[key]
+
+        self.misses += 1
+        model = self._build(*key)
+        model.forecast(self.max_horizon)
+        self._models[key] = model
+        self._sizes[key] = len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)) if self.max_bytes else 0
+        self._shrink()
+        return model
+
+    def forecast(self, site, periods, target=DEFAULT_TARGET, exog_vars=(), mode='monthly'):
+        return self.get_model(site, target, exog_vars, mode).forecast(periods)
+
+    def cache_info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'models': len(self._models),
+                'bytes': sum(self._sizes.values()), 'keys': list(self._models)}
+
+    def clear(self):
+        self._models.clear()
+        self._sizes.clear()
+
+    def _evict(self, key):
+        self._models.pop(key, None)
+        self._sizes.pop(key, None)
+
+    def _shrink(self):
+        # Always keep the entry just added, even if it alone exceeds max_bytes
+        while len(self._models) > 1 and (
+                len(self._models) > self.max_models
+                or (self.max_bytes is not None and sum(self._sizes.values()) > self.max_bytes)):
+            self._evict(next(iter(self._models)))
+
+    def _build(self, site, target, exog_vars, mode):
+        if mode not in MODES:
+            raise ValueError(f"Unsupported mode '{mode}'. Choose from: {', '.join(MODES)}")
+        exog_vars = list(exog_vars)
+        data = self.monthly_data(site)
+        missing = [col for col in [target] + exog_vars if col not in data.columns]
+        if missing:
+            raise ValueError(f"Site '{site}' has no column(s): {', '.join(missing)}")
+        data = data.dropna(subset=[target] + exog_vars)[[target] + exog_vars]
+
+        # One job per model: the target model and a simple seasonal model per
+        # exogenous variable to capture its own pattern
+        jobs = {target: (model_key(data, target, exog_vars,
+                                   settings=dict(self.main_search_settings, mode=mode, **self.sarimax_kwargs)),
+                         (data[target], data[exog_vars] if exog_vars else None,
+                          self.main_search_settings, self.sarimax_kwargs))}
+        for var in exog_vars:
+            jobs[var] = (model_key(data[var], var, settings=dict(self.exog_search_settings, mode=mode,
+                                                                  **self.sarimax_kwargs)),
+                         (data[var], None, self.exog_search_settings, self.sarimax_kwargs))
+
+        fitted = {}
+        for name, (key, _) in jobs.items():
+            results = load_model(key, self.store_dir)
+            if results is not None:
+                fitted[name] = results
+        to_fit = [name for name in jobs if name not in fitted]
+
+        if to_fit:
+            print(f"Building and fitting {len(to_fit)} model(s) for {site} ({', '.join(to_fit)})... "
+                  f"This may take a moment.")
+            n_jobs = min(self.n_jobs or os.cpu_count() or 1, len(to_fit))
+            if n_jobs == 1:
+                for name in to_fit:
+                    fitted[name] = fit_sarimax(*jobs[name][1])
+                    save_model(jobs[name][0], fitted[name], self.store_dir)
+                    print(f"  {name} model fitted.")
+            else:
+                # The fits are independent: wait for the slowest one, not the sum. The GUIs call
+                # this from a worker thread next to the Tk mainloop, and forking a multi-threaded
+                # process can deadlock, so the workers are spawned fresh
+                spawn = multiprocessing.get_context('spawn')
+                with ProcessPoolExecutor(max_workers=n_jobs, mp_context=spawn) as executor:
+                    futures = {executor.submit(fit_sarimax, *jobs[name][1]): name for name in to_fit}
+                    for future in as_completed(futures):
+                        name = futures[future]
+                        fitted[name] = future.result()
+                        save_model(jobs[name][0], fitted[name], self.store_dir)
+                        print(f"  {name} model fitted.")
+        print("Models built and fitted successfully.")
+
+        exog_models = {var: fitted[var] for var in exog_vars}
+        return ForecastModel(site, target, exog_vars, mode, data, fitted[target], exog_models, self.max_horizon)
+
+
+def parse_site(text):
+    """'Name=path.csv' (or just a path, named after the file) for --site."""
+    name, sep, path = text.partition('=')
+    if not sep:
+        path = name
+        name = os.path.basename(path).split('_')[0]
+    return name, path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Forecast monthly soil temperature for one or more sites.')
+    parser.add_argument('--site', action='append', type=parse_site,
+                        help="Site as Name=daily_input.csv (repeatable; default Katherine)")
+    parser.add_argument('--target', default=DEFAULT_TARGET, help='Column to forecast')
+    parser.add_argument('--exog', nargs='*', default=[], help='Exogenous variables')
+    parser.add_argument('--periods', type=int, default=12, help='Months to forecast')
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help='Model store directory')
+    args = parser.parse_args()
+
+    service = ForecastService(dict(args.site) if args.site else None, store_dir=args.store)
+    for site in service.sites:
+        print(f"\n{site}")
+        print(service.forecast(site, args.periods, args.target, args.exog).round(2).to_string())
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+# Modes modelled on daily data, with the annual cycle carried by Fourier regressors
+DAILY_MODES = ('daily', 'daily_wet_season')
+YEAR_DAYS = 365.25
+
+
+def fourier_terms(index, period=YEAR_DAYS, harmonics=2):
+    """
+    Sine/cosine regressors for a seasonal cycle of `period` days.
+
+    Harmonic k has period `period / k`, so with the default yearly period
+    harmonics=1 gives the annual cycle and harmonics=2 adds the
+    semi-annual one. The terms are computed from the calendar dates rather
+    than the row number, so series with gaps (e.g. wet seasons only) and
+    future dates stay in phase.
+
+    Returns a DataFrame on `index` with columns sin1, cos1, sin2, cos2, ...
+    """
+    index = pd.DatetimeIndex(index)
+    days = (index - pd.Timestamp('1970-01-01')) / pd.Timedelta(days=1)
+    angle = 2 * np.pi * np.outer(np.asarray(days, dtype=float), np.arange(1, harmonics + 1)) / period
+    columns = {}
+    for k in range(harmonics):
+        columns[f'sin{k + 1}'] = np.sin(angle[:, k])
+        columns[f'cos{k + 1}'] = np.cos(angle[:, k])
+    return pd.DataFrame(columns, index=index)
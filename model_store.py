@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+
+import pandas as pd
+import statsmodels
+
+DEFAULT_STORE_DIR = 'model_store'
+
+
+def data_fingerprint(data):
+    """Content hash of a DataFrame/Series: values, index and column names."""
+    frame = data.to_frame() if isinstance(data, pd.Series) else data
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(c) for c in frame.columns]).encode())
+    digest.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def model_key(data, target, exog_vars=(), settings=None):
+    """
+    Store key for a fitted model: input data hash, target column,
+    exogenous set and search/fit settings (plus the statsmodels version,
+    since pickled results are not portable across versions).
+    """
+    payload = {
+        'data': data_fingerprint(data),
+        'target': target,
+        'exog_vars': list(exog_vars),
+        'settings': settings or {},
+        'statsmodels': statsmodels.__version__,
+    }
+    text = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+
+def _path(key, store_dir):
+    return os.path.join(store_dir, f'{key}.pkl')
+
+
+def load_model(key, store_dir=DEFAULT_STORE_DIR):
+    """Fitted results stored under `key`, or None if missing or unreadable."""
+    path = _path(key, store_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)['results']
+    except Exception as e:
+        print(f"Ignoring unreadable model store entry {path}: {e}")
+        return None
+
+
+def load_metadata(key, store_dir=DEFAULT_STORE_DIR):
+    """Metadata saved alongside the model under `key` (empty dict if none)."""
+    path = os.path.join(store_dir, f'{key}.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_model(key, results, store_dir=DEFAULT_STORE_DIR, metadata=None):
+    """
+    Serialize fitted results under `key`. Files are written to a temporary
+    name first and renamed into place, so readers never see partial files.
+    A small JSON file with the metadata is written next to the pickle.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    metadata = dict(metadata or {}, key=key, saved_at=time.strftime('%Y-%m-%d %H:%M:%S'))
+    for path, payload, mode in [
+        (_path(key, store_dir), pickle.dumps({'results': results, 'metadata': metadata},
+                                             protocol=pickle.HIGHEST_PROTOCOL), 'wb'),
+        (os.path.join(store_dir, f'{key}.json'), json.dumps(metadata, indent=2, default=str), 'w'),
+    ]:
+        fd, tmp_path = tempfile.mkstemp(dir=store_dir, suffix='.tmp')
+        with os.fdopen(fd, mode) as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+
+def load_or_fit(key, fit, store_dir=DEFAULT_STORE_DIR, metadata=None):
+    """
+    Return the stored model for `key`; on a miss call `fit()` and store
+    its result first.
+    """
+    results = load_model(key, store_dir)
+    if results is not None:
+        print(f"Loaded fitted model {key} from {store_dir}.")
+        return results
+    results = fit()
+    save_model(key, results, store_dir, metadata)
+    return results
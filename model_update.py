@@ -0,0 +1,192 @@
+import argparse
+import glob
+import hashlib
+import json
+import time
+
+import numpy as np
+import pandas as pd
+import statsmodels
+from statsmodels.tsa.statespace import kalman_filter
+
+from batch_forecast import collect_sites
+from forecast_service import DEFAULT_TARGET, EXOG_SEARCH_SETTINGS, MAIN_SEARCH_SETTINGS, SARIMAX_KWARGS, fit_sarimax
+from model_store import DEFAULT_STORE_DIR, load_model, model_key, save_model
+from monthly_data import load_monthly, monthly_means
+
+# Months between scheduled re-selections (None = only when monitoring asks for one)
+RESELECT_EVERY = 12
+# Re-select when the recent one-step RMSE exceeds this multiple of the RMSE at selection (None = never)
+ERROR_RATIO = 1.5
+# Months of one-step errors the monitoring looks at
+MONITOR_WINDOW = 6
+
+# Updated results keep what forecasting, simulation and monitoring use (the final
+# state and its covariance, one-step errors); the full filtered, smoothed, gain and
+# covariance arrays would make every stored model several MB
+UPDATE_MEMORY = (kalman_filter.MEMORY_NO_FILTERED | kalman_filter.MEMORY_NO_SMOOTHING | kalman_filter.MEMORY_NO_GAIN
+                 | kalman_filter.MEMORY_NO_STD_FORECAST | kalman_filter.MEMORY_NO_PREDICTED_COV)
+
+SUMMARY_COLUMNS = ['Site', 'status', 'reason', 'new_months', 'months_since_selection', 'recent_rmse', 'baseline_rmse',
+                   'seconds']
+
+
+def lineage_key(site, target, exog_vars=(), settings=None):
+    """
+    Store key for a site's model lineage. Unlike model_key it does not
+    depend on the data, so each month's update finds the previous state.
+    """
+    payload = {
+        'lineage': site,
+        'target': target,
+        'exog_vars': list(exog_vars),
+        'settings': settings or {},
+        'statsmodels': statsmodels.__version__,
+    }
+    text = json.dumps(payload, sort_keys=True, default=str)
+    return 'lineage-' + hashlib.sha256(text.encode()).hexdigest()[:32]
+
+
+def one_step_rmse(results, last=None):
+    """RMSE of the one-step-ahead prediction errors (after the diffuse burn-in), optionally of the last N only."""
+    errors = np.asarray(results.forecasts_error)[0, results.loglikelihood_burn:]
+    if last:
+        errors = errors[-last:]
+    errors = errors[np.isfinite(errors)]
+    return float(np.sqrt(np.mean(errors ** 2))) if len(errors) else np.nan
+
+
+def refilter(results, endog, exog=None):
+    """
+    Same model and parameters over a longer endog/exog: one Kalman filter
+    pass, no estimation. Parameter standard errors are not recomputed.
+    The data are passed as arrays; building a date index costs more than
+    the filter itself, and forecasts are dated by the callers.
+    """
+    model = results.model.clone(np.asarray(endog, dtype=float), exog=None if exog is None else np.asarray(exog, dtype=float))
+    return model.filter(results.params, cov_type='none', conserve_memory=UPDATE_MEMORY)
+
+
+def update_site(site, data, target=DEFAULT_TARGET, exog_vars=(), store_dir=DEFAULT_STORE_DIR,
+                main_search_settings=None, exog_search_settings=None, sarimax_kwargs=None,
+                reselect_every=RESELECT_EVERY, error_ratio=ERROR_RATIO, monitor_window=MONITOR_WINDOW, force=False):
+    """
+    Bring a site's stored models up to date with its monthly data.
+
+    The site's last state (fitted target and exogenous models plus the
+    data they were fitted on) is loaded from the model store. The months
+    added since are appended with the parameters kept (a Kalman filter
+    pass, no estimation), the exogenous models getting their new observed
+    values as well. The last stored month is usually still partial, so a
+    change to it is taken as its final value and filtered in again. A full
+    auto_arima re-selection on all data only runs when:
+        - there is no stored state, or months before the last stored one
+          have changed
+        - `reselect_every` months have been added since the last selection
+        - the RMSE of the one-step errors over the last `monitor_window`
+          months since the selection exceeds `error_ratio` times the RMSE
+          at selection
+        - `force` is set
+
+    The updated models are also saved under the forecast service's keys,
+    so the GUIs, the service and batch runs with this store use them
+    without fitting.
+
+    Returns a summary dict (status 'selected', 'updated', 'reselected' or
+    'unchanged', the reason for a re-selection, months added, monitoring
+    RMSEs and run time).
+    """
+    start = time.perf_counter()
+    exog_vars = list(exog_vars)
+    main_search_settings = MAIN_SEARCH_SETTINGS if main_search_settings is None else main_search_settings
+    exog_search_settings = EXOG_SEARCH_SETTINGS if exog_search_settings is None else exog_search_settings
+    sarimax_kwargs = SARIMAX_KWARGS if sarimax_kwargs is None else sarimax_kwargs
+    main_settings = dict(main_search_settings, mode='monthly', **sarimax_kwargs)
+    exog_settings = dict(exog_search_settings, mode='monthly', **sarimax_kwargs)
+
+    missing = [col for col in [target] + exog_vars if col not in data.columns]
+    if missing:
+        raise ValueError(f"Site '{site}' has no column(s): {', '.join(missing)}")
+    data = data.dropna(subset=[target] + exog_vars)[[target] + exog_vars]
+
+    key = lineage_key(site, target, exog_vars, main_settings)
+    state = load_model(key, store_dir)
+    summary = {'Site': site, 'reason': None, 'new_months': len(data), 'recent_rmse': np.nan}
+    if force:
+        summary['reason'] = 'forced'
+    elif state is None:
+        summary['reason'] = 'no stored model'
+    elif len(data) < len(state['data']) or not data.iloc[:len(state['data']) - 1].equals(state['data'].iloc[:-1]):
+        summary['reason'] = 'earlier months changed'
+    else:
+        new = data.iloc[len(state['data']):]
+        revised = not data.iloc[len(state['data']) - 1:len(state['data'])].equals(state['data'].iloc[-1:])
+        summary['new_months'] = len(new)
+        if new.empty and not revised:
+            summary.update(status='unchanged', months_since_selection=state['months_since_selection'],
+                           baseline_rmse=state['baseline_rmse'], seconds=time.perf_counter() - start)
+            return summary
+
+        # Same parameters, state filtered over the new months
+        results = refilter(state['results'], data[target], data[exog_vars] if exog_vars else None)
+        exog_models = {var: refilter(state['exog_models'][var], data[var]) for var in exog_vars}
+        since = state['months_since_selection'] + len(new)
+        recent = one_step_rmse(results, min(since, monitor_window))
+        summary.update(recent_rmse=recent, months_since_selection=since, baseline_rmse=state['baseline_rmse'])
+        if reselect_every and since >= reselect_every:
+            summary['reason'] = f"schedule ({since} months since selection)"
+        elif error_ratio and recent > error_ratio * state['baseline_rmse']:
+            summary['reason'] = f"one-step RMSE {recent:.3f} > {error_ratio} x {state['baseline_rmse']:.3f}"
+
+    if summary['reason'] is None:
+        summary['status'] = 'updated'
+    else:
+        summary['status'] = 'selected' if state is None else 'reselected'
+        results = fit_sarimax(data[target], data[exog_vars] if exog_vars else None, main_search_settings,
+                              sarimax_kwargs)
+        exog_models = {var: fit_sarimax(data[var], None, exog_search_settings, sarimax_kwargs) for var in exog_vars}
+        summary.update(months_since_selection=0, baseline_rmse=one_step_rmse(results))
+
+    state = {'data': data, 'results': results, 'exog_models': exog_models,
+             'months_since_selection': summary['months_since_selection'], 'baseline_rmse': summary['baseline_rmse']}
+    save_model(key, state, store_dir, metadata=dict(
+        {k: v for k, v in summary.items() if k != 'seconds'}, target=target, exog_vars=exog_vars,
+        last_observed=data.index[-1], order=results.model.order, seasonal_order=results.model.seasonal_order))
+    # Same keys as the forecast service, so it loads these instead of fitting
+    save_model(model_key(data, target, exog_vars, settings=main_settings), results, store_dir)
+    for var in exog_vars:
+        save_model(model_key(data[var], var, settings=exog_settings), exog_models[var], store_dir)
+
+    summary['seconds'] = time.perf_counter() - start
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Update stored site models with newly arrived months.')
+    parser.add_argument('files', nargs='+',
+                        help='Daily site CSVs (glob patterns and Name=path allowed), or a multi-site CSV with a Site column')
+    parser.add_argument('--target', default=DEFAULT_TARGET, help='Column to forecast')
+    parser.add_argument('--exog', nargs='*', default=[], help='Exogenous variables')
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help='Model store directory')
+    parser.add_argument('--reselect-every', type=int, default=RESELECT_EVERY,
+                        help='Months between scheduled re-selections (0 = never)')
+    parser.add_argument('--error-ratio', type=float, default=ERROR_RATIO,
+                        help='Re-select when the recent one-step RMSE exceeds this multiple of the RMSE at selection (0 = never)')
+    parser.add_argument('--monitor-window', type=int, default=MONITOR_WINDOW, help='Months of one-step errors monitored')
+    parser.add_argument('--force', action='store_true', help='Re-select every site')
+    parser.add_argument('-o', '--output', help='Save the update summary to this CSV')
+    args = parser.parse_args()
+
+    paths = [path for pattern in args.files for path in (sorted(glob.glob(pattern)) or [pattern])]
+    summaries = []
+    for site, source in collect_sites(paths):
+        data = load_monthly(source) if isinstance(source, str) else monthly_means(source)
+        summary = update_site(site, data, args.target, args.exog, args.store, reselect_every=args.reselect_every,
+                              error_ratio=args.error_ratio, monitor_window=args.monitor_window, force=args.force)
+        summaries.append(summary)
+        print(f"  {site}: {summary['status']} ({summary['seconds'] * 1000:.0f} ms)"
+              + (f" - {summary['reason']}" if summary['reason'] else ""))
+
+    if args.output:
+        pd.DataFrame(summaries).reindex(columns=SUMMARY_COLUMNS).to_csv(args.output, index=False)
+        print(f"Update summary saved to: {args.output}")
@@ -0,0 +1,120 @@
+import argparse
+import contextlib
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+
+import pandas as pd
+
+DEFAULT_DATA_FILE = 'Katherine_InputData_Time_Series.csv'
+DEFAULT_CACHE_DIR = 'data_cache'
+
+
+def file_fingerprint(file_path):
+    """SHA-1 of the file contents; hashing is much cheaper than parsing the CSV."""
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def daily_frame(df_day):
+    """Typed daily frame: column names stripped, day-first Date parsed (rows without one dropped), Year and Month added."""
+    df_day = df_day.copy()
+    df_day.columns = df_day.columns.str.strip()
+    df_day['Date'] = pd.to_datetime(df_day['Date'], dayfirst=True, errors='coerce')
+    df_day = df_day.dropna(subset=['Date']).reset_index(drop=True)
+    df_day['Year'] = df_day['Date'].dt.year
+    df_day['Month'] = df_day['Date'].dt.month
+    return df_day
+
+
+def monthly_means(df_day):
+    """Daily site data (with a day-first Date column) averaged to a monthly frame indexed by month start."""
+    df_day = daily_frame(df_day)
+    df_monthly = df_day.groupby(['Year', 'Month']).mean(numeric_only=True).reset_index()
+    df_monthly['Date'] = pd.to_datetime(df_monthly[['Year', 'Month']].assign(DAY=1))
+    df_monthly = df_monthly.sort_values('Date')
+    df_monthly.set_index('Date', inplace=True)
+    return df_monthly
+
+
+def _cache_path(file_path, fingerprint, cache_dir):
+    """
+    Cache file of a source CSV: its name for readability, a hash of its
+    absolute path (same-named CSVs in other directories get their own
+    files) and the content fingerprint.
+    """
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    source = hashlib.sha1(os.path.abspath(file_path).encode()).hexdigest()[:8]
+    return os.path.join(cache_dir, f'{name}.{source}.{fingerprint[:16]}.pkl')
+
+
+def load_frames(file_path=DEFAULT_DATA_FILE, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Typed daily frame and monthly means of a daily site CSV.
+
+    Both frames are pickled to `cache_dir` under the file's content
+    fingerprint, so later calls (and later runs of any script) load them
+    without parsing or aggregating the CSV again. Editing the CSV changes
+    the fingerprint, and the stale cache file of that CSV (and only that
+    CSV, by absolute path) is replaced.
+    cache_dir=None always reads the CSV.
+
+    Returns copies, so callers may modify them.
+    """
+    if cache_dir is None:
+        df_day = daily_frame(pd.read_csv(file_path))
+        return df_day, monthly_means(df_day)
+
+    fingerprint = file_fingerprint(file_path)
+    path = _cache_path(file_path, fingerprint, cache_dir)
+    try:
+        with open(path, 'rb') as f:
+            payload = pickle.load(f)
+        return payload['daily'], payload['monthly']
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        pass
+
+    df_day = daily_frame(pd.read_csv(file_path))
+    df_monthly = monthly_means(df_day)
+    os.makedirs(cache_dir, exist_ok=True)
+    prefix = os.path.basename(_cache_path(file_path, '', cache_dir))[:-len('.pkl')]
+    for name in os.listdir(cache_dir):
+        stale = os.path.join(cache_dir, name)
+        if name.startswith(prefix) and name.endswith('.pkl') and stale != path:
+            # Workers sharing the cache may remove the same stale file
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(stale)
+    # Written to a temporary name first so concurrent readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        pickle.dump({'source': os.path.abspath(file_path), 'fingerprint': fingerprint,
+                     'daily': df_day, 'monthly': df_monthly}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return df_day.copy(), df_monthly.copy()
+
+
+def load_daily(file_path=DEFAULT_DATA_FILE, cache_dir=DEFAULT_CACHE_DIR):
+    return load_frames(file_path, cache_dir)[0]
+
+
+def load_monthly(file_path=DEFAULT_DATA_FILE, cache_dir=DEFAULT_CACHE_DIR):
+    """Daily site CSV averaged to a monthly frame indexed by month start."""
+    return load_frames(file_path, cache_dir)[1]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the cached daily and monthly frames of site CSVs.')
+    parser.add_argument('files', nargs='*', default=[DEFAULT_DATA_FILE], help='Daily site CSVs')
+    parser.add_argument('--cache', default=DEFAULT_CACHE_DIR, help='Cache directory')
+    args = parser.parse_args()
+
+    for file_path in args.files:
+        start = time.perf_counter()
+        df_day, df_monthly = load_frames(file_path, args.cache)
+        print(f"{file_path}: {len(df_day)} days, {len(df_monthly)} months "
+              f"({time.perf_counter() - start:.3f} s)")
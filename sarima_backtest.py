@@ -0,0 +1,146 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def _as_2d(exog, nobs):
+    return None if exog is None else np.asarray(exog, dtype=float).reshape(nobs, -1)
+
+
+def horizon_metrics(forecasts, actuals):
+    """MAE, RMSE and R² per horizon from (n_origins, horizon) arrays, ignoring NaN."""
+    errors = forecasts - actuals
+    valid = ~np.isnan(errors)
+    n = valid.sum(axis=0)
+    sq = np.where(valid, errors ** 2, 0.0)
+    actual_mean = np.nansum(np.where(valid, actuals, 0.0), axis=0) / np.maximum(n, 1)
+    ss_tot = np.where(valid, (actuals - actual_mean) ** 2, 0.0).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        metrics = pd.DataFrame({
+            'MAE': np.where(valid, np.abs(errors), 0.0).sum(axis=0) / n,
+            'RMSE': np.sqrt(sq.sum(axis=0) / n),
+            'R2': 1 - sq.sum(axis=0) / ss_tot,
+            'n': n,
+        }, index=pd.RangeIndex(1, forecasts.shape[1] + 1, name='horizon'))
+    return metrics
+
+
+def walk_forward_backtest(results, endog, exog=None, horizon=24, n_origins=None, step=1, refit_every=None):
+    """
+    Rolling-origin backtest of a fitted SARIMAX model.
+
+    `results` is fitted on the first observations of `endog` (e.g. the
+    training split); the first forecast origin is the end of that sample.
+    At each origin the model forecasts `horizon` steps ahead, then its
+    state is advanced over the next `step` observations with
+    results.extend, i.e. a Kalman filter update over the new data only,
+    instead of re-running order selection and MLE. With `refit_every` the
+    parameters are re-estimated (same order, warm-started from the current
+    estimates) once that many observations have been added since the last
+    estimation.
+
+    Forecasts with exogenous regressors use the observed future exog, so
+    the scores show the model's skill given known regressors.
+
+    Parameters:
+        results: fitted statsmodels SARIMAX results
+        endog, exog: full series (training sample followed by the test period)
+        horizon: maximum forecast horizon
+        n_origins: number of forecast origins (default: as many as fit in
+                   the test period with the full horizon observed)
+        step: observations between consecutive origins
+        refit_every: re-estimate after this many new observations (None = never)
+
+    Returns:
+        (metrics, forecasts): MAE, RMSE, R² and n per horizon, and a long
+        table with one row per origin and horizon.
+    """
+    index = endog.index if isinstance(endog, (pd.Series, pd.DataFrame)) else None
+    y = np.asarray(endog, dtype=float).reshape(-1)
+    X = _as_2d(exog, len(y))
+    n_train = results.model.nobs
+    if n_origins is None:
+        n_origins = max((len(y) - n_train - horizon) // step + 1, 1)
+    origins = n_train + step * np.arange(n_origins)
+    if origins[-1] > len(y):
+        raise ValueError(f"{n_origins} origins with step {step} need {origins[-1]} observations, got {len(y)}.")
+
+    # Same model and parameters on plain arrays: one filter pass, then cheap extends
+    model = results.model.clone(y[:n_train], exog=None if X is None else X[:n_train])
+    params = np.asarray(results.params)
+    res = model.filter(params)
+    last_fit = n_train
+
+    forecasts = np.full((n_origins, horizon), np.nan)
+    actuals = np.full((n_origins, horizon), np.nan)
+    n_refits = 0
+    start_time = time.perf_counter()
+    for i, origin in enumerate(origins):
+        if i > 0:
+            prev = origins[i - 1]
+            if refit_every and origin - last_fit >= refit_every:
+                model = results.model.clone(y[:origin], exog=None if X is None else X[:origin])
+                res = model.fit(start_params=params, disp=False)
+                params = np.asarray(res.params)
+                last_fit = origin
+                n_refits += 1
+            else:
+                res = res.extend(y[prev:origin], exog=None if X is None else X[prev:origin])
+
+        # Only as many steps as there are future exog rows for
+        h = horizon if X is None else min(horizon, len(y) - origin)
+        if h == 0:
+            continue
+        forecasts[i, :h] = res.forecast(h, exog=None if X is None else X[origin:origin + h])
+        observed = y[origin:origin + horizon]
+        actuals[i, :len(observed)] = observed
+    elapsed = time.perf_counter() - start_time
+
+    metrics = horizon_metrics(forecasts, actuals)
+    metrics.attrs.update(n_origins=n_origins, n_refits=n_refits, seconds=elapsed)
+
+    horizons = np.tile(np.arange(1, horizon + 1), n_origins)
+    target_pos = np.repeat(origins, horizon) + horizons - 1
+    forecast_table = pd.DataFrame({
+        'origin': np.repeat(origins - 1, horizon) if index is None else index[np.repeat(origins - 1, horizon)],
+        'horizon': horizons,
+        'target': target_pos if index is None else [index[p] if p < len(index) else pd.NaT for p in target_pos],
+        'forecast': forecasts.ravel(),
+        'actual': actuals.ravel(),
+    })
+    return metrics, forecast_table
+
+
+if __name__ == '__main__':
+    from monthly_data import load_monthly
+    from sarima_fit import refit_sarimax
+
+    parser = argparse.ArgumentParser(description='Walk-forward backtest of a monthly SARIMA model.')
+    parser.add_argument('file', nargs='?', default='Katherine_InputData_Time_Series.csv', help='Daily input CSV')
+    parser.add_argument('--target', default='Soil_Temperature', help='Column to forecast')
+    parser.add_argument('--order', type=int, nargs=3, default=[1, 0, 1], metavar=('p', 'd', 'q'))
+    parser.add_argument('--seasonal-order', type=int, nargs=4, default=[1, 1, 1, 12], metavar=('P', 'D', 'Q', 'm'))
+    parser.add_argument('--train', type=float, default=0.8, help='Fraction of the series used for the initial fit')
+    parser.add_argument('--origins', type=int, default=30, help='Number of forecast origins')
+    parser.add_argument('--horizon', type=int, default=24, help='Maximum forecast horizon (months)')
+    parser.add_argument('--step', type=int, default=1, help='Months between origins')
+    parser.add_argument('--refit-every', type=int, help='Re-estimate the parameters every N months')
+    parser.add_argument('-o', '--output', help='CSV for the per-horizon metrics')
+    args = parser.parse_args()
+
+    series = load_monthly(args.file)[args.target].dropna()
+    split_index = int(len(series) * args.train)
+    start_time = time.perf_counter()
+    results = refit_sarimax(series.iloc[:split_index], tuple(args.order), tuple(args.seasonal_order))
+    fit_seconds = time.perf_counter() - start_time
+
+    metrics, _ = walk_forward_backtest(results, series, horizon=args.horizon, n_origins=args.origins,
+                                       step=args.step, refit_every=args.refit_every)
+    print(metrics.round(3).to_string())
+    print(f"Initial fit: {fit_seconds:.2f} s; {metrics.attrs['n_origins']} origins with "
+          f"{metrics.attrs['n_refits']} re-estimation(s): {metrics.attrs['seconds']:.2f} s")
+    if args.output:
+        metrics.to_csv(args.output)
+        print(f"Metrics saved to: {args.output}")
@@ -0,0 +1,272 @@
+import argparse
+import multiprocessing
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+from forecast_service import DEFAULT_TARGET, EXOG_SEARCH_SETTINGS, MAIN_SEARCH_SETTINGS, SARIMAX_KWARGS
+from sarima_backtest import walk_forward_backtest
+from sarima_fit import refit_sarimax
+
+DEFAULT_K = 5
+WEIGHTINGS = ('aic', 'backtest')
+# Months at the end of the series that the backtest weights are scored on, and the horizon scored
+DEFAULT_HOLDOUT = 36
+DEFAULT_HORIZON = 12
+
+TABLE_COLUMNS = ['order', 'seasonal_order', 'trend', 'aic', 'backtest_rmse', 'weight', 'fit_time', 'status', 'error']
+
+# Series used by the component fits in a worker process, set once by _init_worker
+_worker_data = {}
+
+
+def _init_worker(endog, exog):
+    _worker_data['endog'] = endog
+    _worker_data['exog'] = exog
+
+
+def candidate_models(endog, exog=None, k=DEFAULT_K, search_settings=None, sarimax_kwargs=None):
+    """
+    The k best distinct models of one auto_arima search, by AIC. The
+    stepwise search fits the neighbours of its best order anyway; they
+    are kept instead of only the winner.
+    """
+    from pmdarima import auto_arima
+
+    fits = auto_arima(
+        endog,
+        X=exog,
+        trace=False,
+        error_action='ignore',
+        suppress_warnings=True,
+        return_valid_fits=True,
+        sarimax_kwargs=dict(SARIMAX_KWARGS if sarimax_kwargs is None else sarimax_kwargs),
+        **(MAIN_SEARCH_SETTINGS if search_settings is None else search_settings)
+    )
+    fits = list(fits) if isinstance(fits, (list, tuple)) else [fits]
+    candidates, seen = [], set()
+    for fit in sorted(fits, key=lambda fit: fit.aic()):
+        key = (fit.order, fit.seasonal_order, fit.with_intercept)
+        if np.isfinite(fit.aic()) and key not in seen:
+            seen.add(key)
+            candidates.append(fit)
+    return candidates[:k]
+
+
+def _fit_component(auto_model, sarimax_kwargs, holdout, horizon, endog=None, exog=None):
+    """
+    Final model of one candidate and, with a holdout, its out-of-sample
+    error: the same order re-estimated without the last `holdout` months
+    (warm-started) and rolled through them with walk_forward_backtest.
+    Returns (table row, results or None).
+    """
+    if endog is None:
+        endog, exog = _worker_data['endog'], _worker_data['exog']
+    row = {'order': auto_model.order, 'seasonal_order': auto_model.seasonal_order,
+           'trend': 'c' if auto_model.with_intercept else None, 'aic': np.nan, 'backtest_rmse': np.nan,
+           'status': 'ok', 'error': None}
+    results = None
+    start = time.perf_counter()
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            results = refit_sarimax(endog, auto_model.order, auto_model.seasonal_order, exog=exog,
+                                    source=auto_model, **sarimax_kwargs)
+            row['aic'] = results.aic
+            if holdout:
+                y = np.asarray(endog, dtype=float)
+                X = None if exog is None else np.asarray(exog, dtype=float).reshape(len(y), -1)
+                n_train = len(y) - holdout
+                train = results.model.clone(y[:n_train], exog=None if X is None else X[:n_train]).fit(
+                    start_params=results.params, disp=False)
+                _, forecasts = walk_forward_backtest(train, y, X, horizon=min(horizon, holdout))
+                errors = (forecasts['forecast'] - forecasts['actual']).dropna()
+                row['backtest_rmse'] = float(np.sqrt(np.mean(errors ** 2)))
+    except Exception as e:
+        row.update(status='failed', error=str(e))
+    row['fit_time'] = time.perf_counter() - start
+    return row, results
+
+
+def ensemble_weights(table, weighting='aic'):
+    """
+    Akaike weights exp(-dAIC / 2), or inverse backtest MSE weights
+    1 / RMSE^2; normalized to sum to one, failed components get zero.
+
+    Akaike weights put (nearly) all weight on the best model once the
+    AIC gaps reach ten or so; on Katherine the gaps are 70 and more and
+    the weights are (1, 0, 0, 0, 0). Backtest weights stay spread out.
+    """
+    if weighting == 'aic':
+        aic = table['aic'].to_numpy(dtype=float)
+        raw = np.exp(-(aic - np.nanmin(aic)) / 2)
+    elif weighting == 'backtest':
+        raw = 1 / table['backtest_rmse'].to_numpy(dtype=float) ** 2
+    else:
+        raise ValueError(f"Unknown weighting '{weighting}'. Choose from: {', '.join(WEIGHTINGS)}")
+    raw = np.where((table['status'] == 'ok').to_numpy() & np.isfinite(raw), raw, 0.0)
+    if raw.sum() == 0:
+        raise ValueError('No ensemble component could be fitted.')
+    return raw / raw.sum()
+
+
+def mixture_quantiles(means, stds, weights, probs, iterations=60):
+    """
+    Quantiles of a mixture of normals per horizon by bisection on the
+    mixture CDF, all horizons at once. means/stds are (components,
+    horizon); returns (len(probs), horizon).
+    """
+    weights = np.asarray(weights)[:, None]
+    out = []
+    for p in probs:
+        lo = (means - 10 * stds).min(axis=0)
+        hi = (means + 10 * stds).max(axis=0)
+        for _ in range(iterations):
+            mid = (lo + hi) / 2
+            below = (weights * norm.cdf((mid - means) / stds)).sum(axis=0) < p
+            lo = np.where(below, mid, lo)
+            hi = np.where(below, hi, mid)
+        out.append((lo + hi) / 2)
+    return np.array(out)
+
+
+class SarimaEnsemble:
+    """
+    Weighted combination of SARIMAX models of the same series.
+
+    The point forecast is the weighted mean of the component forecasts.
+    The intervals are quantiles of the mixture of the components' normal
+    forecast distributions, so they widen where the components disagree.
+    `best` is the lowest-AIC fitted model, kept whatever its weight.
+    """
+
+    def __init__(self, components, weights, table, last_date=None, best=None):
+        self.components = components
+        self.weights = np.asarray(weights)
+        self.table = table
+        self.last_date = last_date
+        self.best = best
+
+    def component_forecasts(self, periods, exog=None):
+        """(means, stds) arrays of shape (components, periods)."""
+        means, stds = [], []
+        for results in self.components:
+            forecast = results.get_forecast(steps=periods, exog=None if exog is None else np.asarray(exog, dtype=float))
+            means.append(np.asarray(forecast.predicted_mean))
+            stds.append(np.sqrt(np.asarray(forecast.var_pred_mean)))
+        return np.array(means), np.array(stds)
+
+    def forecast(self, periods, exog=None, alpha=0.05):
+        """DataFrame of Forecast, Lower CI and Upper CI like ForecastModel.forecast, plus Std of the mixture."""
+        means, stds = self.component_forecasts(periods, exog)
+        w = self.weights[:, None]
+        mean = (w * means).sum(axis=0)
+        lower, upper = mixture_quantiles(means, stds, self.weights, [alpha / 2, 1 - alpha / 2])
+        index = (pd.date_range(start=self.last_date + pd.DateOffset(months=1), periods=periods, freq='MS')
+                 if self.last_date is not None else pd.RangeIndex(1, periods + 1))
+        table = pd.DataFrame({'Forecast': mean, 'Lower CI': lower, 'Upper CI': upper,
+                              'Std': np.sqrt((w * (stds ** 2 + (means - mean) ** 2)).sum(axis=0))}, index=index)
+        table.index.name = 'Date'
+        return table
+
+
+def fit_ensemble(endog, exog=None, k=DEFAULT_K, weighting='backtest', holdout=DEFAULT_HOLDOUT, horizon=DEFAULT_HORIZON,
+                 n_jobs=None, search_settings=None, sarimax_kwargs=None):
+    """
+    Top-k SARIMA ensemble.
+
+    One auto_arima search ranks the candidates (candidate_models); the k
+    components are then fitted across a process pool, each with its
+    holdout backtest when weighting='backtest', so with k cores the wall
+    time is about one search plus one component fit.
+
+    Parameters:
+        endog, exog: series to model and optional exogenous regressors
+        k: number of components
+        weighting: 'backtest' (inverse backtest MSE) or 'aic' (Akaike weights,
+                   usually all on the best model, see ensemble_weights)
+        holdout, horizon: months scored by the backtest and its horizon
+        n_jobs: worker processes (default: all cores, 1 = fit in this process)
+
+    Returns:
+        SarimaEnsemble; its table lists the components with their AIC,
+        backtest RMSE, weight and fit time, and its `best` is the model of
+        the table's lowest-AIC fitted row.
+    """
+    sarimax_kwargs = dict(SARIMAX_KWARGS if sarimax_kwargs is None else sarimax_kwargs)
+    candidates = candidate_models(endog, exog, k, search_settings, sarimax_kwargs)
+    holdout = holdout if weighting == 'backtest' else None
+
+    n_jobs = min(n_jobs or os.cpu_count() or 1, len(candidates))
+    if n_jobs == 1:
+        fitted = [_fit_component(model, sarimax_kwargs, holdout, horizon, endog, exog) for model in candidates]
+    else:
+        # Spawned, not forked: this can run on a GUI worker thread (see forecast_service)
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(endog, exog),
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [executor.submit(_fit_component, model, sarimax_kwargs, holdout, horizon) for model in candidates]
+            fitted = [future.result() for future in futures]
+
+    table = pd.DataFrame([row for row, _ in fitted]).reindex(columns=TABLE_COLUMNS)
+    table['weight'] = ensemble_weights(table, weighting)
+    keep = table['weight'] > 0
+    components = [results for (_, results), ok in zip(fitted, keep) if ok]
+    best = fitted[table.loc[table['status'] == 'ok', 'aic'].idxmin()][1]
+    last_date = endog.index[-1] if isinstance(getattr(endog, 'index', None), pd.DatetimeIndex) else None
+    return SarimaEnsemble(components, table.loc[keep, 'weight'].to_numpy(), table, last_date, best)
+
+
+if __name__ == '__main__':
+    from forecast_service import fit_sarimax, parse_site
+    from model_store import DEFAULT_STORE_DIR, load_or_fit, model_key
+    from monthly_data import load_monthly
+
+    parser = argparse.ArgumentParser(description='Monthly forecast from a weighted ensemble of the top-k SARIMA models.')
+    parser.add_argument('--site', default='Katherine=Katherine_InputData_Time_Series.csv',
+                        help='Site as Name=daily_input.csv')
+    parser.add_argument('--target', default=DEFAULT_TARGET, help='Column to forecast')
+    parser.add_argument('--exog', nargs='*', default=[], help='Exogenous variables')
+    parser.add_argument('--periods', type=int, default=12, help='Months to forecast')
+    parser.add_argument('-k', type=int, default=DEFAULT_K, help='Number of ensemble components')
+    parser.add_argument('--weighting', default='backtest', choices=WEIGHTINGS, help='Component weights')
+    parser.add_argument('--holdout', type=int, default=DEFAULT_HOLDOUT, help='Months scored for backtest weights')
+    parser.add_argument('--jobs', type=int, help='Worker processes (default: all cores)')
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help='Model store for the exogenous models')
+    parser.add_argument('-o', '--output', help='Save the forecast table to this CSV')
+    args = parser.parse_args()
+
+    site, file_path = parse_site(args.site)
+    data = load_monthly(file_path).dropna(subset=[args.target] + args.exog)[[args.target] + args.exog]
+
+    start = time.perf_counter()
+    ensemble = fit_ensemble(data[args.target], data[args.exog] if args.exog else None, args.k, args.weighting,
+                            args.holdout, n_jobs=args.jobs)
+    print(f"Ensemble of {len(ensemble.components)} model(s) fitted in {time.perf_counter() - start:.1f} s")
+    print(ensemble.table.round(3).to_string())
+
+    # Future exogenous values from the same seasonal models the forecast service uses (and stores)
+    exog_future = None
+    if args.exog:
+        settings = dict(EXOG_SEARCH_SETTINGS, mode='monthly', **SARIMAX_KWARGS)
+        exog_future = np.column_stack([
+            np.asarray(load_or_fit(model_key(data[var], var, settings=settings),
+                                   lambda var=var: fit_sarimax(data[var], None, EXOG_SEARCH_SETTINGS, SARIMAX_KWARGS),
+                                   args.store).forecast(args.periods))
+            for var in args.exog])
+
+    table = ensemble.forecast(args.periods, exog_future)
+    # The best single model by AIC next to the ensemble
+    best_forecast = ensemble.best.get_forecast(steps=args.periods, exog=exog_future)
+    table['Best Model Forecast'] = np.asarray(best_forecast.predicted_mean)
+    best_ci = np.asarray(best_forecast.conf_int())
+    table['Best Model Lower CI'], table['Best Model Upper CI'] = best_ci[:, 0], best_ci[:, 1]
+    print(f"\n{site}")
+    print(table.round(2).to_string())
+    if args.output:
+        table.to_csv(args.output)
+        print(f"Forecast saved to: {args.output}")
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+# SARIMAX settings that change the likelihood, with their SARIMAX defaults
+SPEC_DEFAULTS = {'trend': None, 'enforce_stationarity': True, 'enforce_invertibility': True}
+
+
+def _source_params(source):
+    """
+    Named parameters of an already fitted model plus the settings it was
+    fitted with. `source` may be a pmdarima ARIMA (its statsmodels results
+    live in arima_res_), a statsmodels results object, or a Series of
+    parameters such as the 'params' column of a search_orders table
+    (fitted with SARIMAX defaults and an 'intercept' when trend='c').
+    """
+    results = getattr(source, 'arima_res_', source)
+    if isinstance(results, pd.Series):
+        spec = dict(SPEC_DEFAULTS, trend='c' if 'intercept' in results.index else None)
+        return results, spec, None
+    model = results.model
+    params = pd.Series(np.asarray(results.params), index=model.param_names)
+    spec = {key: getattr(model, key) for key in SPEC_DEFAULTS}
+    return params, spec, model.exog_names
+
+
+def warm_start_params(model, source):
+    """
+    Starting parameters for `model` taken from a fitted `source` model,
+    matched by name. Exogenous coefficients are matched by position when
+    the source used generic names (e.g. x1, x2). Parameters the source does
+    not have fall back to the model's own start_params.
+
+    Returns (start_params, complete) where complete is True when every
+    parameter of `model` was found in the source and vice versa.
+    """
+    params, _, source_exog = _source_params(source)
+    if model.k_exog and source_exog and len(source_exog) == model.k_exog:
+        params = params.rename(dict(zip(source_exog, model.exog_names)))
+
+    names = model.param_names
+    complete = set(names) == set(params.index)
+    if complete:
+        return params.reindex(names).to_numpy(dtype=float), True
+
+    start = np.array(model.start_params, dtype=float)
+    for i, name in enumerate(names):
+        if name in params.index:
+            start[i] = params[name]
+    return start, False
+
+
+def refit_sarimax(endog, order, seasonal_order, exog=None, source=None, **sarimax_kwargs):
+    """
+    Build the final SARIMAX model for a selected order and reuse the fitted
+    state of the model that selected it instead of re-running the MLE.
+
+    `source` is the auto_arima model, or the best search_orders row's
+    params, fitted on the same endog/exog. Settings not given in
+    sarimax_kwargs (trend, enforce_stationarity, enforce_invertibility)
+    follow the source, so the final model is the selected one and its
+    estimates are reused with a single Kalman filter pass. If the caller
+    asks for different settings the fit is warm-started from the source
+    parameters instead.
+
+    Without a source this is a plain SARIMAX(...).fit().
+    """
+    if source is None:
+        model = SARIMAX(endog, exog=exog, order=order, seasonal_order=seasonal_order, **sarimax_kwargs)
+        return model.fit(disp=False)
+
+    _, spec, _ = _source_params(source)
+    for key, value in spec.items():
+        sarimax_kwargs.setdefault(key, value)
+    model = SARIMAX(endog, exog=exog, order=order, seasonal_order=seasonal_order, **sarimax_kwargs)
+
+    start, complete = warm_start_params(model, source)
+    if complete and all(sarimax_kwargs[key] == value for key, value in spec.items()):
+        # Same likelihood and same optimum: one Kalman filter pass is enough
+        return model.filter(start, cov_type='opg')
+    return model.fit(start_params=start, disp=False)
@@ -0,0 +1,310 @@
+import multiprocessing
+import os
+import time
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import product
+
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+TABLE_COLUMNS = ['order', 'seasonal_order', 'trend', 'aic', 'aicc', 'bic', 'screen_ic', 'fit_time', 'status', 'error',
+                 'params']
+
+# Series used by the fits in a worker process, set once by _init_worker
+_worker_data = {}
+
+
+def _init_worker(endog, exog):
+    _worker_data['endog'] = endog
+    _worker_data['exog'] = exog
+
+
+def estimate_differencing(endog, exog=None, m=12, max_d=2, max_D=1):
+    """
+    Choose d and D the way auto_arima does: OCSB test for the seasonal
+    difference, then KPSS on the seasonally differenced series. With
+    exogenous regressors the tests run on the regression residuals.
+    """
+    from pmdarima.arima import ndiffs, nsdiffs
+
+    y = np.asarray(endog, dtype=float)
+    if exog is not None:
+        X = np.column_stack([np.ones(len(y)), np.asarray(exog, dtype=float)])
+        y = y - X @ np.linalg.lstsq(X, y, rcond=None)[0]
+
+    D = nsdiffs(y, m=m, max_D=max_D, test='ocsb') if m > 1 else 0
+    for _ in range(D):
+        y = y[m:] - y[:-m]
+    d = ndiffs(y, max_d=max_d, test='kpss')
+    return int(d), int(D)
+
+
+def candidate_orders(nobs, d, D, m=12, max_p=3, max_q=3, max_P=2, max_Q=2, max_order=5, k_exog=0, trend=None):
+    """
+    Enumerate the (p,d,q)(P,D,Q,m) grid. Candidates that cannot be
+    estimated from `nobs` observations, or exceed `max_order` (p+q+P+Q),
+    are flagged 'pruned' so they are reported without being fitted.
+    """
+    if m <= 1:
+        max_P = max_Q = D = 0
+    nobs_eff = nobs - d - D * m
+    candidates = []
+    for p, q, P, Q in product(range(max_p + 1), range(max_q + 1), range(max_P + 1), range(max_Q + 1)):
+        k_params = p + q + P + Q + k_exog + (trend is not None) + 1
+        feasible = (
+            (max_order is None or p + q + P + Q <= max_order)
+            and max(p + P * m, q + Q * m) < nobs_eff
+            and k_params < nobs_eff
+        )
+        candidates.append(((p, d, q), (P, D, Q, m if m > 1 else 0), feasible))
+    return candidates
+
+
+def _difference(x, d, D, m):
+    for _ in range(D):
+        x = x[m:] - x[:-m]
+    for _ in range(d):
+        x = x[1:] - x[:-1]
+    return x
+
+
+def _lag_matrix(x, max_lag, start):
+    """Columns x[t - 1], ..., x[t - max_lag] for t = start, ..., len(x) - 1."""
+    return np.column_stack([x[start - lag:len(x) - lag] for lag in range(1, max_lag + 1)])
+
+
+def _sarma_lags(k, K, m):
+    """Lags of the multiplicative (1 + ... B^k)(1 + ... B^(K m)) polynomial."""
+    return sorted({i + j * m for i in range(k + 1) for j in range(K + 1)} - {0})
+
+
+def screen_candidates(endog, candidates, exog=None, trend=None, information_criterion='aic', long_ar=None):
+    """
+    Cheap information criterion for each SARIMA candidate from a
+    Hannan-Rissanen regression instead of an exact-likelihood fit.
+
+    The series (and exog) are differenced by the candidates' common d and D,
+    exog and the intercept are regressed out, and a long autoregression
+    gives estimates of the innovations. Each candidate is then scored by
+    the least-squares fit of the differenced series on its AR lags and on
+    lagged innovations at its MA lags (multiplicative seasonal lags enter
+    as a subset regression). All candidates share one sample and one Gram
+    matrix, so scoring the whole grid costs a few small solves.
+
+    Returns an array of criterion values aligned with `candidates`
+    ((order, seasonal_order) pairs), lower is better; NaN if the series
+    is too short to screen.
+    """
+    (_, d, _), (_, D, _, m) = candidates[0]
+    m = max(m, 1)
+    y = _difference(np.asarray(endog, dtype=float), d, D, m)
+    regressors = [np.ones(len(y))] if trend is not None else []
+    if exog is not None:
+        X = _difference(np.asarray(exog, dtype=float).reshape(len(endog), -1), d, D, m)
+        regressors.extend(X.T)
+    if regressors:
+        R = np.column_stack(regressors)
+        y = y - R @ np.linalg.lstsq(R, y, rcond=None)[0]
+    k_extra = len(regressors) + 1  # regression terms plus the innovation variance
+
+    max_ar = max(p + P * m for (p, _, _), (P, _, _, _) in candidates)
+    max_ma = max(q + Q * m for (_, _, q), (_, _, Q, _) in candidates)
+    if long_ar is None:
+        long_ar = max(max_ar, max_ma) + m
+    start = long_ar + max(max_ar, max_ma)
+    n_eff = len(y) - start
+    if n_eff <= 2 * (max_ar + max_ma) + k_extra:
+        return np.full(len(candidates), np.nan)
+
+    # Innovations from the long autoregression
+    A = _lag_matrix(y, long_ar, long_ar)
+    resid = np.zeros(len(y))
+    resid[long_ar:] = y[long_ar:] - A @ np.linalg.lstsq(A, y[long_ar:], rcond=None)[0]
+
+    target = y[start:]
+    Z = np.empty((n_eff, 0))
+    if max_ar:
+        Z = np.column_stack([Z, _lag_matrix(y, max_ar, start)])
+    if max_ma:
+        Z = np.column_stack([Z, _lag_matrix(resid, max_ma, start)])
+    G, h, q_total = Z.T @ Z, Z.T @ target, target @ target
+    penalty = np.log(n_eff) if information_criterion == 'bic' else 2.0
+
+    scores = np.empty(len(candidates))
+    for i, ((p, _, q), (P, _, Q, _)) in enumerate(candidates):
+        cols = [lag - 1 for lag in _sarma_lags(p, P, m)] + [max_ar + lag - 1 for lag in _sarma_lags(q, Q, m)]
+        sse = q_total
+        if cols:
+            coef = np.linalg.lstsq(G[np.ix_(cols, cols)], h[cols], rcond=None)[0]
+            sse = q_total - h[cols] @ coef
+        k = p + q + P + Q + k_extra
+        scores[i] = n_eff * np.log(max(sse, 1e-300) / n_eff) + penalty * k
+    return scores
+
+
+def _fit_candidate(order, seasonal_order, trend, fit_kwargs, endog=None, exog=None):
+    """Fit one SARIMAX candidate and return its row of the search table."""
+    if endog is None:
+        endog, exog = _worker_data['endog'], _worker_data['exog']
+    row = {'order': order, 'seasonal_order': seasonal_order, 'trend': trend,
+           'aic': np.nan, 'aicc': np.nan, 'bic': np.nan, 'status': 'ok', 'error': None, 'params': None}
+    start = time.perf_counter()
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            model = SARIMAX(endog, exog=exog, order=order, seasonal_order=seasonal_order, trend=trend)
+            results = model.fit(disp=False, **fit_kwargs)
+        row.update(aic=results.aic, aicc=results.aicc, bic=results.bic,
+                   params=pd.Series(np.asarray(results.params), index=model.param_names))
+        if not np.isfinite(results.aic):
+            row['status'] = 'failed'
+    except Exception as e:
+        row.update(status='failed', error=str(e))
+    row['fit_time'] = time.perf_counter() - start
+    return row
+
+
+def search_orders(endog, exog=None, m=12, max_p=3, max_q=3, max_P=2, max_Q=2, d=None, D=None,
+                  max_order=5, with_intercept='auto', information_criterion='aic',
+                  n_jobs=None, timeout=None, fit_kwargs=None, trace=False, prescreen_top_k=None, store=None,
+                  store_labels=None):
+    """
+    Exhaustive SARIMA order search over the full (p,d,q)(P,D,Q,m) grid,
+    fitting the candidates across a process pool.
+
+    Parameters:
+        endog, exog: series to model and optional exogenous regressors
+        m: seasonal period
+        max_p, max_q, max_P, max_Q: upper bounds of the grid
+        d, D: differencing orders (estimated like auto_arima when None)
+        max_order: prune candidates with p+q+P+Q above this (None = no limit)
+        with_intercept: True/False, or 'auto' for an intercept when d+D <= 1
+        information_criterion: 'aic', 'aicc' or 'bic' used to rank the table
+        n_jobs: worker processes (default: all cores, 1 = fit in this process)
+        timeout: overall time budget in seconds; unfinished candidates are
+                 reported as 'timeout'. With a pool the fits still running
+                 at the deadline are stopped; in this process (n_jobs=1)
+                 the deadline is checked between fits
+        fit_kwargs: extra arguments for SARIMAX.fit
+        trace: print each candidate as it completes
+        prescreen_top_k: rank the candidates with screen_candidates first
+                         and fit only the best k by exact likelihood; the
+                         others are reported as 'screened' (None = fit all)
+        store: experiment_store.ExperimentStore; candidates already fitted on
+               the same data and settings are taken from it instead of being
+               refitted, and new fits are recorded in it
+        store_labels: site/mode labels recorded with the new fits
+
+    Returns:
+        DataFrame with one row per candidate (order, seasonal_order, trend,
+        aic, aicc, bic, screen_ic, fit_time, status, error, params), best
+        first.
+    """
+    if d is None or D is None:
+        est_d, est_D = estimate_differencing(endog, exog, m)
+        d = est_d if d is None else d
+        D = est_D if D is None else D
+    if with_intercept == 'auto':
+        with_intercept = (d + D) in (0, 1)
+    trend = 'c' if with_intercept else None
+    fit_kwargs = dict(fit_kwargs or {})
+    k_exog = 0 if exog is None else np.asarray(exog).reshape(len(endog), -1).shape[1]
+
+    rows, feasible = [], []
+    for order, seasonal_order, ok in candidate_orders(len(endog), d, D, m, max_p, max_q, max_P, max_Q,
+                                                      max_order, k_exog, trend):
+        if ok:
+            feasible.append((order, seasonal_order))
+        else:
+            rows.append({'order': order, 'seasonal_order': seasonal_order, 'trend': trend, 'status': 'pruned'})
+
+    screen = {}
+    if prescreen_top_k is not None and len(feasible) > prescreen_top_k:
+        scores = screen_candidates(endog, feasible, exog, trend, information_criterion)
+        screen = dict(zip(feasible, scores))
+        if not np.isnan(scores).all():
+            ranked = [feasible[i] for i in np.argsort(scores, kind='stable')]
+            feasible = ranked[:prescreen_top_k]
+            for order, seasonal_order in ranked[prescreen_top_k:]:
+                rows.append({'order': order, 'seasonal_order': seasonal_order, 'trend': trend,
+                             'status': 'screened'})
+
+    fitted = []
+
+    def report(row, cached=False):
+        rows.append(row)
+        if not cached:
+            fitted.append(row)
+        if trace:
+            print(f" ARIMA{row['order']}{row['seasonal_order']} : AIC={row['aic']:.3f}, "
+                  f"BIC={row['bic']:.3f}, Time={row['fit_time']:.2f} sec [{row['status']}{', cached' if cached else ''}]")
+
+    if store is not None:
+        from experiment_store import trial_fingerprint
+
+        fingerprint = trial_fingerprint(endog, exog, {'fit_kwargs': fit_kwargs})
+        recorded = store.lookup_trials(fingerprint, trend)
+        for candidate in [c for c in feasible if c in recorded]:
+            report(recorded[candidate], cached=True)
+        feasible = [c for c in feasible if c not in recorded]
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    n_jobs = n_jobs or os.cpu_count() or 1
+    unfinished = []
+
+    if n_jobs == 1:
+        for i, (order, seasonal_order) in enumerate(feasible):
+            if deadline is not None and time.monotonic() >= deadline:
+                unfinished = feasible[i:]
+                break
+            report(_fit_candidate(order, seasonal_order, trend, fit_kwargs, endog, exog))
+    else:
+        # Spawned, not forked: the search can run on a GUI worker thread (see forecast_service)
+        executor = ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(endog, exog),
+                                       mp_context=multiprocessing.get_context('spawn'))
+        futures = {}
+        try:
+            futures = {executor.submit(_fit_candidate, order, seasonal_order, trend, fit_kwargs): (order, seasonal_order)
+                       for order, seasonal_order in feasible}
+            pending = set(futures)
+            while pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    report(future.result())
+            unfinished = [futures[f] for f in pending]
+        finally:
+            # Queued fits are cancelled. Fits still running (at the deadline, or when a result
+            # raised or the caller interrupted) are stopped, so no worker keeps fitting after the
+            # search returns. The executor has no public way to stop its workers; its process
+            # table is private, so it is read defensively
+            running = any(not future.done() for future in futures)
+            processes = list((getattr(executor, '_processes', None) or {}).values()) if running else []
+            executor.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
+
+    for order, seasonal_order in unfinished:
+        rows.append({'order': order, 'seasonal_order': seasonal_order, 'trend': trend, 'status': 'timeout'})
+    if store is not None:
+        store.record_trials(fingerprint, fitted, **(store_labels or {}))
+
+    table = pd.DataFrame(rows).reindex(columns=TABLE_COLUMNS)
+    table['screen_ic'] = [screen.get((order, seasonal_order), np.nan)
+                          for order, seasonal_order in zip(table['order'], table['seasonal_order'])]
+    table = table.sort_values(information_criterion, na_position='last', kind='stable').reset_index(drop=True)
+    return table
+
+
+def best_candidate(table):
+    """First successfully fitted row of a search_orders table."""
+    ok = table[table['status'] == 'ok']
+    if ok.empty:
+        raise ValueError('No SARIMA candidate could be fitted.')
+    return ok.iloc[0]
@@ -0,0 +1,157 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_PATHS = 10000
+
+
+def _factor(cov):
+    """Matrix square root L with L @ L.T == cov; falls back to an eigen factor when cov is singular."""
+    cov = np.atleast_2d(cov)
+    try:
+        return np.linalg.cholesky(cov)
+    except np.linalg.LinAlgError:
+        values, vectors = np.linalg.eigh((cov + cov.T) / 2)
+        return vectors * np.sqrt(np.clip(values, 0, None))
+
+
+def _system_matrix(ssm, name):
+    matrix = ssm[name]
+    if matrix.ndim == 3:
+        if matrix.shape[-1] > 1:
+            raise ValueError(f"Simulation needs a time-invariant model; '{name}' varies over time.")
+        matrix = matrix[..., 0]
+    return matrix
+
+
+def simulate_paths(results, periods, n_paths=DEFAULT_PATHS, exog_paths=None, rng=None):
+    """
+    Future sample paths of a fitted SARIMAX model, all paths at once.
+
+    Paths start from the filtered state at the end of the sample: the
+    initial state is drawn from its predictive distribution, then the
+    state equation is run forward with fresh shocks for all paths together
+    (one vectorized step per month, no loop over paths). Trend and
+    intercept terms are taken from the model's own forecast, so each path
+    is that forecast plus simulated state and measurement noise.
+
+    Parameters:
+        results: fitted statsmodels SARIMAX results
+        periods: months to simulate
+        n_paths: number of paths
+        exog_paths: (n_paths, periods, k_exog) array of future exogenous
+                    values, one path per simulated path, for models with
+                    exogenous regressors
+        rng: numpy Generator (or seed)
+
+    Returns:
+        (n_paths, periods) array of simulated values
+    """
+    rng = np.random.default_rng(rng)
+    model = results.model
+    ssm = model.ssm
+    design, transition = _system_matrix(ssm, 'design'), _system_matrix(ssm, 'transition')
+    selection = _system_matrix(ssm, 'selection')
+    state_factor = _factor(_system_matrix(ssm, 'state_cov'))
+    obs_factor = _factor(_system_matrix(ssm, 'obs_cov'))
+
+    # Deterministic part of the forecast: trend/intercepts, with the regression term left out
+    if model.k_exog:
+        if exog_paths is None:
+            raise ValueError("The model has exogenous regressors; exog_paths are needed.")
+        exog_paths = np.asarray(exog_paths, dtype=float).reshape(n_paths, periods, model.k_exog)
+        mean = np.asarray(results.forecast(periods, exog=np.zeros((periods, model.k_exog))))
+        params = pd.Series(np.asarray(results.params), index=model.param_names)
+        beta = params[model.exog_names].to_numpy()
+        mean = mean + exog_paths @ beta
+    else:
+        mean = np.broadcast_to(np.asarray(results.forecast(periods)), (n_paths, periods))
+
+    # Deviations of the state from its forecast, starting from the end-of-sample uncertainty
+    # (filter_results also holds the last covariance when the results were filtered with memory conservation)
+    state = rng.standard_normal((n_paths, design.shape[1])) @ _factor(results.filter_results.predicted_state_cov[:, :, -1]).T
+    state_shocks = rng.standard_normal((periods, n_paths, state_factor.shape[1])) @ state_factor.T @ selection.T
+    obs_shocks = rng.standard_normal((periods, n_paths, obs_factor.shape[1])) @ obs_factor.T
+
+    noise = np.empty((n_paths, periods))
+    for h in range(periods):
+        noise[:, h] = (state @ design.T + obs_shocks[h])[:, 0]
+        state = state @ transition.T + state_shocks[h]
+    return mean + noise
+
+
+def path_quantiles(paths, index, alpha=0.05, quantiles=(0.5,)):
+    """
+    Forecast table from simulated paths: the path mean as Forecast, the
+    empirical alpha/2 and 1 - alpha/2 quantiles as Lower/Upper CI, plus
+    one column per extra quantile (e.g. Q50 for the median).
+    """
+    table = pd.DataFrame({
+        'Forecast': paths.mean(axis=0),
+        'Lower CI': np.quantile(paths, alpha / 2, axis=0),
+        'Upper CI': np.quantile(paths, 1 - alpha / 2, axis=0),
+    }, index=index)
+    for q in quantiles:
+        table[f'Q{q * 100:g}'] = np.quantile(paths, q, axis=0)
+    table.index.name = 'Date'
+    return table
+
+
+def simulate_forecast(model, periods, n_paths=DEFAULT_PATHS, alpha=0.05, quantiles=(0.5,), seed=None):
+    """
+    Monte Carlo forecast of a ForecastModel that carries the exogenous
+    forecast uncertainty into the target's intervals.
+
+    Each exogenous variable's model is simulated first; the target model
+    is then simulated with path i of every exogenous variable feeding path
+    i of the target. The exogenous models are independent of each other,
+    as in the point forecast.
+
+    Returns:
+        (table, paths): forecast table with empirical intervals (see
+        path_quantiles), and a dict with the (n_paths, periods) arrays of
+        the target and each exogenous variable
+    """
+    rng = np.random.default_rng(seed)
+    index = pd.date_range(start=model.data.index[-1] + pd.DateOffset(months=1), periods=periods, freq='MS')
+    paths = {var: simulate_paths(model.exog_models[var], periods, n_paths, rng=rng) for var in model.exog_vars}
+    exog_paths = np.stack([paths[var] for var in model.exog_vars], axis=-1) if model.exog_vars else None
+    paths[model.target] = simulate_paths(model.results, periods, n_paths, exog_paths, rng=rng)
+    return path_quantiles(paths[model.target], index, alpha, quantiles), paths
+
+
+if __name__ == '__main__':
+    from forecast_service import DEFAULT_TARGET, ForecastService, parse_site
+
+    parser = argparse.ArgumentParser(description='Monte Carlo monthly forecast including exogenous forecast uncertainty.')
+    parser.add_argument('--site', default='Katherine', help='Site name or Name=path to a daily CSV')
+    parser.add_argument('--target', default=DEFAULT_TARGET, help='Column to forecast')
+    parser.add_argument('--exog', nargs='*', default=['T.Max', 'Radn', 'RHminT'], help='Exogenous variables')
+    parser.add_argument('--periods', type=int, default=24, help='Months to forecast')
+    parser.add_argument('--paths', type=int, default=DEFAULT_PATHS, help='Number of simulated paths')
+    parser.add_argument('--seed', type=int, help='Random seed')
+    parser.add_argument('--store', help='Model store directory for reusing fitted models')
+    parser.add_argument('-o', '--output', help='Save the forecast table to this CSV')
+    args = parser.parse_args()
+
+    service = ForecastService(**({'store_dir': args.store} if args.store else {}))
+    site = args.site
+    if site not in service.sites:
+        site, file_path = parse_site(site)
+        service.add_site(site, file_path)
+    model = service.get_model(site, args.target, args.exog)
+
+    start = time.perf_counter()
+    table, _ = simulate_forecast(model, args.periods, args.paths, seed=args.seed)
+    print(f"Simulated {args.paths} paths x {args.periods} months in {time.perf_counter() - start:.2f} s")
+
+    # Side by side with the analytic intervals, which treat the exogenous forecasts as known
+    analytic = model.forecast(args.periods)
+    table['Analytic Lower CI'] = analytic['Lower CI']
+    table['Analytic Upper CI'] = analytic['Upper CI']
+    print(table.round(2).to_string())
+    if args.output:
+        table.to_csv(args.output)
+        print(f"Forecast saved to: {args.output}")
@@ -0,0 +1,245 @@
+import argparse
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from soil_temp_model import DAY_SECONDS, parse_yyyymmdd
+
+# Observed soil temperature columns named like the probe logger, e.g. "T1(10)"
+DEPTH_COLUMN = re.compile(r"^T\d*\((\d+(?:\.\d+)?)\)$")
+
+
+def read_observations(file_path, depth_cm=None):
+    """
+    Read observed soil temperatures for one site into a long table with
+    columns t_sec, Depth_cm, T.Max, T.Min and Observed.
+
+    Three layouts are accepted (CSV or Excel):
+      - probe style, one column per depth named like "T1(10)"
+      - tidy, with Depth_cm and Observed columns
+      - the evaluation workbook's "observed temperature" column, with the
+        depth given by `depth_cm`
+    Date may be yyyymmdd or a (day-first) date/time; sub-daily timestamps
+    keep their time of day. A Site column splits the file into several sites.
+    """
+    if file_path.lower().endswith((".xlsx", ".xls")):
+        df = pd.read_excel(file_path)
+    else:
+        df = pd.read_csv(file_path)
+    df.columns = [str(col).strip() for col in df.columns]
+
+    date_col = "Date" if "Date" in df.columns else "Date Time"
+    for col in [date_col, "T.Max", "T.Min"]:
+        if col not in df.columns:
+            raise ValueError(f"{file_path}: missing column {col}")
+
+    depth_cols = {col: float(m.group(1)) for col in df.columns if (m := DEPTH_COLUMN.match(col))}
+    if depth_cols:
+        id_cols = [c for c in df.columns if c not in depth_cols]
+        long = df.melt(id_vars=id_cols, value_vars=list(depth_cols), value_name="Observed")
+        long["Depth_cm"] = long.pop("variable").map(depth_cols)
+    elif {"Depth_cm", "Observed"} <= set(df.columns):
+        long = df
+    elif "observed temperature" in df.columns:
+        if depth_cm is None:
+            raise ValueError(f"{file_path}: give the observation depth with --depth")
+        long = df.rename(columns={"observed temperature": "Observed"})
+        long["Depth_cm"] = depth_cm
+    else:
+        raise ValueError(f"{file_path}: no observed soil temperature columns found")
+
+    if "Site" not in long.columns:
+        long["Site"] = os.path.splitext(os.path.basename(file_path))[0]
+
+    # Time in seconds since 1970-01-01; any midnight origin gives the same phase
+    dates = long[date_col]
+    day_numbers = parse_yyyymmdd(dates)
+    if np.isnan(day_numbers).all():
+        stamps = pd.to_datetime(dates, dayfirst=True, errors="coerce")
+        seconds = (stamps - pd.Timestamp("1970-01-01")).dt.total_seconds().to_numpy()
+    else:
+        seconds = day_numbers * DAY_SECONDS
+
+    out = pd.DataFrame({
+        "Site": long["Site"].astype(str).to_numpy(),
+        "t_sec": seconds,
+        "Depth_cm": pd.to_numeric(long["Depth_cm"], errors="coerce").to_numpy(),
+        "T.Max": pd.to_numeric(long["T.Max"], errors="coerce").to_numpy(),
+        "T.Min": pd.to_numeric(long["T.Min"], errors="coerce").to_numpy(),
+        "Observed": pd.to_numeric(long["Observed"], errors="coerce").to_numpy(),
+    })
+    return out.dropna().reset_index(drop=True)
+
+
+def _depth_statistics(observations, period):
+    """
+    Sufficient statistics of the least-squares problem per (site, depth).
+
+    Writing the model as T - Tm = Aa * (c1 * sin(wt) + c2 * cos(wt)) with
+    c1, c2 fixed for a given depth, the sum of squares only depends on the
+    Gram matrix G = X'X, the cross products h = X'y and q = y'y of
+    X = Aa * [sin(wt), cos(wt)] and y = observed - Tm.
+    """
+    omega_t = 2 * np.pi * observations["t_sec"].to_numpy() / period
+    Tm = (observations["T.Max"] + observations["T.Min"]).to_numpy() / 2
+    Aa = (observations["T.Max"] - observations["T.Min"]).to_numpy() / 2
+    x1, x2 = Aa * np.sin(omega_t), Aa * np.cos(omega_t)
+    y = observations["Observed"].to_numpy() - Tm
+
+    products = pd.DataFrame({
+        "Site": observations["Site"].to_numpy(),
+        "Depth_cm": observations["Depth_cm"].to_numpy(),
+        "g11": x1 * x1, "g12": x1 * x2, "g22": x2 * x2,
+        "h1": x1 * y, "h2": x2 * y, "q": y * y,
+    })
+    stats = products.groupby(["Site", "Depth_cm"], sort=True).sum()
+
+    # Pad to (n_sites, n_depths); padded depths have zero statistics
+    stats["slot"] = stats.groupby(level="Site").cumcount()
+    sites = stats.index.get_level_values("Site").unique()
+    site_idx = sites.get_indexer(stats.index.get_level_values("Site"))
+    shape = (len(sites), stats["slot"].max() + 1)
+
+    def padded(values):
+        out = np.zeros(shape)
+        out[site_idx, stats["slot"].to_numpy()] = values
+        return out
+
+    z = padded(stats.index.get_level_values("Depth_cm").to_numpy() / 100)
+    G = np.stack([
+        np.stack([padded(stats["g11"]), padded(stats["g12"])], axis=-1),
+        np.stack([padded(stats["g12"]), padded(stats["g22"])], axis=-1),
+    ], axis=-2)
+    h = np.stack([padded(stats["h1"]), padded(stats["h2"])], axis=-1)
+    q = padded(stats["q"]).sum(axis=1)
+    return list(sites), z, G, h, q
+
+
+def _profile(log_alpha, z, G, h, q, period):
+    """
+    Sum of squares minimised over damping and phase lag for each log alpha.
+
+    For fixed alpha the model is linear in b = (a cos(phi), a sin(phi)), so
+    the optimum solves the 2x2 normal equations A b = r in closed form.
+    log_alpha has shape (n_sites, k); returns (sse, b) for every entry.
+    """
+    u = z[:, None, :] * np.sqrt(np.pi / (np.exp(log_alpha)[..., None] * period))
+    decay, cos_u, sin_u = np.exp(-u), np.cos(u), np.sin(u)
+    # K maps b to the per-depth coefficients on [Aa sin(wt), Aa cos(wt)]
+    K = decay[..., None, None] * np.stack([
+        np.stack([cos_u, sin_u], axis=-1),
+        np.stack([-sin_u, cos_u], axis=-1),
+    ], axis=-2)
+    GK = np.einsum("sdij,skdjl->skdil", G, K)
+    A = np.einsum("skdji,skdjl->skil", K, GK)
+    r = np.einsum("skdji,sdj->ski", K, h)
+    ridge = 1e-12 * (np.trace(A, axis1=-2, axis2=-1)[..., None, None] + 1e-12) * np.eye(2)
+    b = np.linalg.solve(A + ridge, r[..., None])[..., 0]
+    sse = q[:, None] - np.einsum("ski,ski->sk", r, b)
+    return sse, b
+
+
+def calibrate_sites(observations, period=DAY_SECONDS, alpha_range=(1e-9, 1e-4), grid_size=400, tol=1e-8):
+    """
+    Fit diffusivity (alpha, m²/s), amplitude damping and phase lag of the
+    sinusoidal soil temperature model
+
+        T = Tm + damping * Aa * exp(-z / d) * sin(2 * pi * t / P + phase_lag - z / d)
+
+    to observed soil temperatures at one or more depths.
+
+    The least-squares objective is reduced to per-(site, depth) sufficient
+    statistics, damping and phase lag are solved in closed form for any
+    alpha, and alpha is found by a batched grid scan plus golden-section
+    search. Every step is vectorized across all sites at once.
+
+    Note that with only daily observations at a single depth the three
+    parameters collapse into one amplitude; use several depths or
+    sub-daily observations to identify them separately.
+
+    Parameters:
+        observations: table from read_observations (several sites allowed)
+        alpha_range: search bounds for alpha (m²/s)
+
+    Returns:
+        DataFrame with one row per site: fitted parameters, damping depth,
+        RMSE, MAE, R² and the number of observations.
+    """
+    sites, z, G, h, q = _depth_statistics(observations, period)
+    n_sites = len(sites)
+
+    # Coarse scan over log alpha, then golden section around the best point
+    grid = np.linspace(np.log(alpha_range[0]), np.log(alpha_range[1]), grid_size)
+    sse, _ = _profile(np.broadcast_to(grid, (n_sites, grid_size)), z, G, h, q, period)
+    best = np.argmin(sse, axis=1)
+    lo = grid[np.maximum(best - 1, 0)]
+    hi = grid[np.minimum(best + 1, grid_size - 1)]
+
+    ratio = (np.sqrt(5) - 1) / 2
+    x1, x2 = hi - ratio * (hi - lo), lo + ratio * (hi - lo)
+    f = _profile(np.stack([x1, x2], axis=1), z, G, h, q, period)[0]
+    while np.max(hi - lo) > tol:
+        left = f[:, 0] < f[:, 1]
+        hi = np.where(left, x2, hi)
+        lo = np.where(left, lo, x1)
+        x1, x2 = hi - ratio * (hi - lo), lo + ratio * (hi - lo)
+        f = _profile(np.stack([x1, x2], axis=1), z, G, h, q, period)[0]
+
+    log_alpha = (lo + hi) / 2
+    _, b = _profile(log_alpha[:, None], z, G, h, q, period)
+    b = b[:, 0]
+    alpha = np.exp(log_alpha)
+    params = pd.DataFrame({
+        "Site": sites,
+        "alpha": alpha,
+        "damping": np.hypot(b[:, 0], b[:, 1]),
+        "phase_lag": np.arctan2(b[:, 1], b[:, 0]),
+        "damping_depth_cm": np.sqrt(alpha * period / np.pi) * 100,
+    })
+
+    # Goodness of fit from the predictions at every observation
+    fitted = observations.merge(params, on="Site")
+    predicted = predict(fitted, fitted["alpha"], fitted["damping"], fitted["phase_lag"], period)
+    err = predicted - fitted["Observed"].to_numpy()
+    scores = pd.DataFrame({
+        "Site": fitted["Site"],
+        "sq": err ** 2,
+        "abs": np.abs(err),
+        "obs": fitted["Observed"],
+    }).groupby("Site", sort=True)
+    ss_tot = scores["obs"].var(ddof=0) * scores.size()
+
+    params["RMSE"] = np.sqrt(scores["sq"].mean()).to_numpy()
+    params["MAE"] = scores["abs"].mean().to_numpy()
+    params["R2"] = (1 - scores["sq"].sum() / ss_tot).to_numpy()
+    params["n_obs"] = scores.size().to_numpy()
+    return params
+
+
+def predict(observations, alpha, damping, phase_lag, period=DAY_SECONDS):
+    """Model soil temperature for rows of a read_observations table."""
+    tmax = observations["T.Max"].to_numpy()
+    tmin = observations["T.Min"].to_numpy()
+    u = observations["Depth_cm"].to_numpy() / 100 * np.sqrt(np.pi / (np.asarray(alpha) * period))
+    angle = 2 * np.pi * observations["t_sec"].to_numpy() / period + np.asarray(phase_lag) - u
+    return (tmax + tmin) / 2 + np.asarray(damping) * (tmax - tmin) / 2 * np.exp(-u) * np.sin(angle)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Calibrate the sinusoidal soil temperature model against observations."
+    )
+    parser.add_argument("files", nargs="+", help="Observation files (CSV or Excel), one per site or with a Site column")
+    parser.add_argument("--depth", type=float, help="Depth (cm) for files with an 'observed temperature' column")
+    parser.add_argument("-o", "--output", default="soil_temp_calibration.csv", help="Output CSV")
+    args = parser.parse_args()
+
+    observations = pd.concat([read_observations(f, args.depth) for f in args.files], ignore_index=True)
+    results = calibrate_sites(observations)
+    results.to_csv(args.output, index=False)
+
+    pd.set_option("display.width", 120)
+    print(results.to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+    print(f"Calibration results saved to: {args.output}")
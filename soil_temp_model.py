@@ -0,0 +1,288 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+DAY_SECONDS = 86400  # Period of the sinusoidal model = 1 day in seconds
+
+
+def days_from_civil(year, month, day):
+    """
+    Days since 1970-01-01 for integer year/month/day arrays
+    (proleptic Gregorian calendar, pure integer arithmetic).
+    """
+    year = np.asarray(year, dtype=np.int64)
+    month = np.asarray(month, dtype=np.int64)
+    day = np.asarray(day, dtype=np.int64)
+
+    y = year - (month <= 2)
+    era = np.floor_divide(y, 400)
+    yoe = y - era * 400
+    mp = (month + 9) % 12  # March = 0 ... February = 11
+    doy = (153 * mp + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def days_in_month(year, month):
+    """Number of days in each month for integer year/month arrays."""
+    year = np.asarray(year, dtype=np.int64)
+    month = np.asarray(month, dtype=np.int64)
+    leap = ((year % 4 == 0) & (year % 100 != 0)) | (year % 400 == 0)
+    lengths = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+    return lengths[np.clip(month, 1, 12) - 1] + (leap & (month == 2))
+
+
+def parse_yyyymmdd(values):
+    """
+    Convert a column of yyyymmdd dates (ints, floats or digit strings) into
+    days since 1970-01-01. Invalid or missing dates come back as NaN.
+    """
+    values = pd.Series(values)
+    if values.dtype == object or pd.api.types.is_string_dtype(values):
+        # Only whole-number strings are dates, e.g. "20240101" but not "2024-01-01"
+        text = values.astype(str).str.strip()
+        numeric = pd.to_numeric(text.where(text.str.fullmatch(r"[+-]?\d+")), errors="coerce")
+    else:
+        numeric = pd.to_numeric(values, errors="coerce")
+    numeric = np.trunc(numeric.to_numpy(dtype=float))
+
+    valid = np.isfinite(numeric) & (numeric >= 10000101) & (numeric <= 99991231)
+    packed = np.where(valid, numeric, 19700101).astype(np.int64)
+    year, month, day = packed // 10000, packed // 100 % 100, packed % 100
+    valid &= (month >= 1) & (month <= 12) & (day >= 1)
+    valid &= day <= days_in_month(year, month)
+
+    days = days_from_civil(year, month, day).astype(float)
+    days[~valid] = np.nan
+    return days
+
+
+def soil_temperature(t_sec, tmax, tmin, z, alpha, period=DAY_SECONDS):
+    """
+    Sinusoidal soil temperature model
+
+        T = Tm + Aa * exp(-z / d) * sin(2 * pi * t / P - z / d),  d = sqrt(alpha * P / pi)
+
+    where Tm and Aa are the mean and half-range of air temperature.
+    All arguments broadcast, so t_sec, z (m) and alpha (m²/s) can be laid
+    out on separate axes to evaluate many depths and diffusivities at once.
+    NaN in any input propagates to the result.
+    """
+    tmax = np.asarray(tmax, dtype=float)
+    tmin = np.asarray(tmin, dtype=float)
+    z = np.asarray(z, dtype=float)
+    alpha = np.asarray(alpha, dtype=float)
+
+    Tm = (tmax + tmin) / 2  # Mean daily temperature
+    Aa = (tmax - tmin) / 2  # Amplitude of daily temperature variation
+
+    # Constants are evaluated once per depth/alpha, not once per row
+    lag = z * np.sqrt(np.pi / (alpha * period))
+    decay = np.exp(-lag)
+    phase_shift = (2 * np.pi * np.asarray(t_sec, dtype=float) / period) - lag
+    return Tm + Aa * decay * np.sin(phase_shift)
+
+
+def seconds_since_year_start(day_numbers, year):
+    """Seconds from 1 January of `year` for dates given as days since 1970-01-01."""
+    start = days_from_civil(year, 1, 1)
+    return (np.asarray(day_numbers, dtype=float) - start) * DAY_SECONDS
+
+
+def model_inputs(df):
+    """
+    Model time (seconds from 1 January of the first row's year) and
+    T.Max/T.Min arrays for a frame with Date (yyyymmdd), T.Max and T.Min.
+    """
+    year = int(str(df.iloc[0]["Date"])[:4])  # Assuming date format YYYYMMDD
+    t_sec = seconds_since_year_start(parse_yyyymmdd(df["Date"]), year)
+    tmax = pd.to_numeric(df["T.Max"], errors="coerce").to_numpy(dtype=float)
+    tmin = pd.to_numeric(df["T.Min"], errors="coerce").to_numpy(dtype=float)
+    return t_sec, tmax, tmin
+
+
+def compute_soil_temperature_column(df, z_cm, alpha, period=DAY_SECONDS):
+    """
+    Soil temperature (°C, rounded to 2 decimals) for every row of a frame
+    with Date (yyyymmdd), T.Max and T.Min columns. Rows with a bad date or
+    temperature give NaN.
+    """
+    t_sec, tmax, tmin = model_inputs(df)
+    return np.round(soil_temperature(t_sec, tmax, tmin, z_cm / 100, alpha, period), 2)
+
+
+def parse_value_list(text):
+    """
+    Parse a list or range of numbers typed by the user.
+
+    "10, 20, 40"  -> the listed values
+    "5:100:20"    -> 20 evenly spaced values from 5 to 100 (inclusive)
+    "5e-7"        -> a single value
+    """
+    values = []
+    for part in str(text).replace(";", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if ":" in part:
+            start, stop, count = part.split(":")
+            values.extend(np.linspace(float(start), float(stop), int(count)))
+        else:
+            values.append(float(part))
+    if not values:
+        raise ValueError("No values given.")
+    return np.asarray(values, dtype=float)
+
+
+def soil_temperature_sweep(df, depths_cm, alphas, period=DAY_SECONDS, dtype=np.float32, chunk_rows=1024):
+    """
+    Evaluate the soil temperature model for every combination of depth and
+    diffusivity by broadcasting over a (time, depth, alpha) array.
+
+    The array is filled in blocks of `chunk_rows` time steps so the float64
+    temporaries stay small; the result is stored as `dtype` (float32 by
+    default, ~180 MB for 50 years x 50 depths x 50 alphas).
+
+    Returns:
+        temps: array of shape (n_rows, n_depths, n_alphas)
+        dates: yyyymmdd dates of the rows (float, NaN where invalid)
+    """
+    depths_cm = np.atleast_1d(np.asarray(depths_cm, dtype=float))
+    alphas = np.atleast_1d(np.asarray(alphas, dtype=float))
+
+    t_sec, tmax, tmin = model_inputs(df)
+
+    z = (depths_cm / 100)[None, :, None]
+    alpha = alphas[None, None, :]
+    temps = np.empty((len(df), len(depths_cm), len(alphas)), dtype=dtype)
+    for start in range(0, len(df), chunk_rows):
+        rows = slice(start, start + chunk_rows)
+        temps[rows] = soil_temperature(
+            t_sec[rows, None, None], tmax[rows, None, None], tmin[rows, None, None], z, alpha, period
+        )
+
+    dates = pd.to_numeric(df["Date"], errors="coerce").to_numpy(dtype=float)
+    return temps, dates
+
+
+def save_sweep(path, temps, dates, depths_cm, alphas):
+    """
+    Save a sweep from soil_temperature_sweep.
+
+    A .npz path writes a labelled array file (soil_temperature plus its
+    date, depth_cm and alpha coordinates); any other path writes a tidy
+    CSV table with Date, Depth_cm, Alpha and Soil_Temperature columns.
+    """
+    depths_cm = np.asarray(depths_cm, dtype=float)
+    alphas = np.asarray(alphas, dtype=float)
+    if path.lower().endswith(".npz"):
+        np.savez(
+            path,
+            soil_temperature=temps,
+            date=dates,
+            depth_cm=depths_cm,
+            alpha=alphas,
+            dims=np.array(["date", "depth_cm", "alpha"]),
+        )
+        return
+
+    n_rows, n_depths, n_alphas = temps.shape
+    tidy = pd.DataFrame({
+        "Date": np.repeat(dates, n_depths * n_alphas),
+        "Depth_cm": np.tile(np.repeat(depths_cm, n_alphas), n_rows),
+        "Alpha": np.tile(alphas, n_rows * n_depths),
+        "Soil_Temperature": np.round(temps.reshape(-1).astype(float), 2),
+    })
+    tidy["Date"] = tidy["Date"].astype("Int64")
+    tidy.to_csv(path, index=False)
+
+
+def read_weather_csv(file_path):
+    """Read a SILO style CSV (Date as yyyymmdd), dropping the units row if present."""
+    df = pd.read_csv(file_path)
+    df.columns = df.columns.str.strip()
+    if len(df) and str(df["T.Max"].iloc[0]).strip().startswith("("):
+        df = df.iloc[1:].reset_index(drop=True)
+    return df
+
+
+def stream_subdaily_soil_temperature(df, depths_cm, alpha, output_path, step_seconds=3600, chunk_days=366):
+    """
+    Evaluate the soil temperature model every `step_seconds` (hourly by
+    default) at several depths and stream the (time x depth) series to disk.
+
+    Each day's T.Max/T.Min drive all of that day's time steps. Only
+    `chunk_days` days are held in memory at a time, so memory use does not
+    grow with the length of the record.
+
+    A .npy output is a float32 array of shape (n_times, n_depths) written
+    through a memory map; any other path is written as CSV with a Time
+    column and one Soil_Temperature_<depth>cm column per depth.
+
+    Returns the number of time steps written.
+    """
+    depths_cm = np.atleast_1d(np.asarray(depths_cm, dtype=float))
+    if DAY_SECONDS % step_seconds:
+        raise ValueError("step_seconds must divide a day evenly.")
+    steps_per_day = DAY_SECONDS // step_seconds
+    offsets = np.arange(steps_per_day) * float(step_seconds)
+
+    t_day, tmax, tmin = model_inputs(df)
+    day_numbers = parse_yyyymmdd(df["Date"])
+    n_times = len(df) * steps_per_day
+    z = depths_cm[None, :] / 100
+
+    as_npy = output_path.lower().endswith(".npy")
+    if as_npy:
+        out = np.lib.format.open_memmap(output_path, mode="w+", dtype=np.float32, shape=(n_times, len(depths_cm)))
+    else:
+        columns = [f"Soil_Temperature_{d:g}cm" for d in depths_cm]
+        pd.DataFrame(columns=["Time"] + columns).to_csv(output_path, index=False)
+
+    for start in range(0, len(df), chunk_days):
+        days = slice(start, start + chunk_days)
+        t_sec = (t_day[days, None] + offsets[None, :]).reshape(-1)
+        temps = soil_temperature(
+            t_sec[:, None],
+            np.repeat(tmax[days], steps_per_day)[:, None],
+            np.repeat(tmin[days], steps_per_day)[:, None],
+            z,
+            alpha,
+        )
+        if as_npy:
+            out[start * steps_per_day:start * steps_per_day + len(t_sec)] = temps
+        else:
+            stamps = (day_numbers[days, None] * DAY_SECONDS + offsets[None, :]).reshape(-1)
+            chunk = pd.DataFrame(np.round(temps, 2), columns=columns)
+            chunk.insert(0, "Time", pd.to_datetime(stamps, unit="s", errors="coerce"))
+            chunk.to_csv(output_path, mode="a", header=False, index=False, date_format="%Y-%m-%d %H:%M")
+
+    if as_npy:
+        out.flush()
+        del out
+    return n_times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate hourly (or finer) soil temperature series for one or more sites."
+    )
+    parser.add_argument("files", nargs="+", help="Weather CSV files with Date (yyyymmdd), T.Max and T.Min")
+    parser.add_argument("--depths", default="5,10,20,50", help='Depths in cm, e.g. "5,10,20" or "5:100:20"')
+    parser.add_argument("--alpha", type=float, default=5e-7, help="Thermal diffusivity (m²/s)")
+    parser.add_argument("--step", type=int, default=3600, help="Time step in seconds (default: hourly)")
+    parser.add_argument("--format", choices=["csv", "npy"], default="csv", help="Output format")
+    parser.add_argument("-o", "--output-dir", default=".", help="Directory for the output files")
+    args = parser.parse_args()
+
+    depths_cm = parse_value_list(args.depths)
+    os.makedirs(args.output_dir, exist_ok=True)
+    for file_path in args.files:
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        output_path = os.path.join(args.output_dir, f"{name}_soil_temp_{args.step}s.{args.format}")
+        n_times = stream_subdaily_soil_temperature(
+            read_weather_csv(file_path), depths_cm, args.alpha, output_path, step_seconds=args.step
+        )
+        print(f"{n_times} time steps x {len(depths_cm)} depths saved to: {output_path}")
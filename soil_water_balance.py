@@ -0,0 +1,195 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Moisture probe columns (see moisture_probe_plot_script.py) and their depths in cm
+PROBE_COLUMNS = ["A1(10)", "A2(20)", "A3(40)", "A4(60)", "A5(90)"]
+PROBE_DEPTHS_CM = [10, 20, 40, 60, 90]
+
+# Layer boundaries (cm) centred on the probe depths, one layer per probe
+LAYER_BOUNDS_CM = [0, 15, 30, 50, 75, 105]
+
+
+def layer_thickness_mm(bounds_cm=LAYER_BOUNDS_CM):
+    """Thickness of each soil layer in mm from its boundaries in cm."""
+    return np.diff(np.asarray(bounds_cm, dtype=float)) * 10
+
+
+def run_bucket_model(
+    rain,
+    evap,
+    capacity=150.0,
+    drainage=0.1,
+    crop_coefficient=0.8,
+    initial_fraction=0.5,
+    bounds_cm=LAYER_BOUNDS_CM,
+    record="layers",
+    dtype=np.float32,
+):
+    """
+    Daily multi-layer soil water balance (cascading bucket model).
+
+    Each day rain enters the top layer; water above a layer's capacity
+    overflows to the layer below and a fraction `drainage` of what is stored
+    percolates downwards. Whatever leaves the bottom layer is deep drainage.
+    Evapotranspiration demand is `crop_coefficient * evap`, split between
+    layers by thickness and scaled by each layer's relative wetness.
+
+    Every input broadcasts over a trailing "configuration" axis, so many
+    stations (columns of rain/evap) or parameter sets (arrays of capacity,
+    drainage, crop_coefficient) are run in one pass over the days.
+
+    Parameters:
+        rain, evap: daily totals in mm, shape (n_days,) or (n_days, n_config)
+        capacity: profile water holding capacity in mm, split across layers
+                  in proportion to their thickness
+        drainage: fraction of stored layer water that percolates per day (0-1)
+        crop_coefficient: multiplier applied to evap to get ET demand
+        initial_fraction: starting storage as a fraction of capacity
+        bounds_cm: layer boundaries in cm (defaults to the probe layers)
+        record: 'layers' stores water per layer, 'total' the profile total
+        dtype: dtype of the recorded output
+
+    Returns:
+        storage: (n_days, n_layers, n_config) for record='layers',
+                 (n_days, n_config) for record='total'; water in mm
+        deep_drainage: (n_days, n_config) water leaving the profile in mm
+    """
+    rain = np.asarray(rain, dtype=float)
+    evap = np.asarray(evap, dtype=float)
+    if rain.ndim == 1:
+        rain = rain[:, None]
+    if evap.ndim == 1:
+        evap = evap[:, None]
+    if rain.shape[0] != evap.shape[0]:
+        raise ValueError("rain and evap must have the same number of days.")
+    if record not in ("layers", "total"):
+        raise ValueError("record must be 'layers' or 'total'.")
+
+    n_days = rain.shape[0]
+    params = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(capacity, dtype=float)),
+        np.atleast_1d(np.asarray(drainage, dtype=float)),
+        np.atleast_1d(np.asarray(crop_coefficient, dtype=float)),
+        np.atleast_1d(np.asarray(initial_fraction, dtype=float)),
+    )
+    n_config = np.broadcast_shapes(rain.shape[1:], evap.shape[1:], params[0].shape)[0]
+    capacity, drainage, crop_coefficient, initial_fraction = (
+        np.broadcast_to(p, (n_config,)) for p in params
+    )
+
+    # Missing forcing counts as a dry, still day rather than poisoning the state
+    rain = np.broadcast_to(np.nan_to_num(rain, nan=0.0), (n_days, n_config))
+    demand = np.broadcast_to(
+        np.nan_to_num(evap, nan=0.0) * crop_coefficient, (n_days, n_config)
+    )
+
+    thickness = layer_thickness_mm(bounds_cm)
+    weights = thickness / thickness.sum()
+    n_layers = len(thickness)
+
+    # State is laid out (layer, config) so each layer is a contiguous row
+    cap = np.ascontiguousarray(weights[:, None] * capacity[None, :])
+    inv_cap = np.divide(1.0, cap, out=np.zeros_like(cap), where=cap > 0)
+    et_share = weights[:, None] * inv_cap
+    keep = np.ascontiguousarray(np.broadcast_to(1.0 - drainage, (n_config,)))
+    state = cap * initial_fraction[None, :]
+
+    if record == "layers":
+        storage = np.empty((n_days, n_layers, n_config), dtype=dtype)
+    else:
+        storage = np.empty((n_days, n_config), dtype=dtype)
+    deep_drainage = np.empty((n_days, n_config), dtype=dtype)
+
+    # Scratch buffers reused every day so the loop does not allocate
+    inflow = np.empty(n_config)
+    kept = np.empty(n_config)
+    et = np.empty((n_layers, n_config))
+
+    for t in range(n_days):
+        inflow[:] = rain[t]
+        for i in range(n_layers):
+            layer = state[i]
+            layer += inflow
+            np.minimum(layer, cap[i], out=kept)
+            np.subtract(layer, kept, out=inflow)  # overflow above capacity
+            np.multiply(kept, keep, out=layer)  # what stays after percolation
+            kept -= layer  # percolation
+            inflow += kept
+
+        # ET demand split by layer thickness, limited by relative wetness
+        np.multiply(state, et_share, out=et)
+        et *= demand[t]
+        np.minimum(et, state, out=et)
+        state -= et
+
+        if record == "layers":
+            storage[t] = state
+        else:
+            state.sum(axis=0, out=kept)
+            storage[t] = kept
+        deep_drainage[t] = inflow
+
+    return storage, deep_drainage
+
+
+def to_probe_frame(dates, storage, config=0, bounds_cm=LAYER_BOUNDS_CM):
+    """
+    Convert layered storage from run_bucket_model into volumetric water
+    content (%) with the moisture probe column names A1(10)...A5(90).
+    """
+    thickness = layer_thickness_mm(bounds_cm)
+    theta = storage[:, :, config] / thickness[None, :] * 100
+    columns = PROBE_COLUMNS if len(thickness) == len(PROBE_COLUMNS) else [
+        f"L{i + 1}" for i in range(len(thickness))
+    ]
+    frame = pd.DataFrame(np.round(theta, 2), columns=columns)
+    frame.insert(0, "Date", dates)
+    return frame
+
+
+def read_forcing(file_path):
+    """Read Date, Rain and Evap from a SILO or Katherine style CSV file."""
+    df = pd.read_csv(file_path)
+    df.columns = df.columns.str.strip()
+    for col in ["Date", "Rain", "Evap"]:
+        if col not in df.columns:
+            raise ValueError(f"Missing column: {col}")
+
+    # SILO downloads carry a units row under the header, e.g. "(mm)"
+    rain = pd.to_numeric(df["Rain"], errors="coerce")
+    if len(df) and pd.isna(rain.iloc[0]) and str(df["Rain"].iloc[0]).startswith("("):
+        df = df.iloc[1:].reset_index(drop=True)
+        rain = rain.iloc[1:].reset_index(drop=True)
+
+    return df["Date"], rain.to_numpy(), pd.to_numeric(df["Evap"], errors="coerce").to_numpy()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Daily soil water balance driven by SILO Rain and Evap."
+    )
+    parser.add_argument("input_csv", help="CSV file with Date, Rain and Evap columns")
+    parser.add_argument("--capacity", type=float, default=150.0, help="Profile capacity (mm)")
+    parser.add_argument("--drainage", type=float, default=0.1, help="Daily drainage fraction")
+    parser.add_argument("--kc", type=float, default=0.8, help="Crop coefficient")
+    parser.add_argument("--initial", type=float, default=0.5, help="Initial fraction of capacity")
+    parser.add_argument("-o", "--output", help="Output CSV (default: <input>_soil_water.csv)")
+    args = parser.parse_args()
+
+    dates, rain, evap = read_forcing(args.input_csv)
+    storage, _ = run_bucket_model(
+        rain,
+        evap,
+        capacity=args.capacity,
+        drainage=args.drainage,
+        crop_coefficient=args.kc,
+        initial_fraction=args.initial,
+    )
+    output_path = args.output or (
+        os.path.splitext(args.input_csv)[0] + "_soil_water.csv"
+    )
+    to_probe_frame(dates, storage).to_csv(output_path, index=False)
+    print(f"Soil water balance saved to: {output_path}")
@@ -0,0 +1,31 @@
+import os
+import signal
+
+import pandas as pd
+
+import batch_forecast
+from batch_forecast import batch_forecast as run_batch, run_isolated
+
+
+def _square_or_crash(x):
+    if x == 3:
+        os._exit(1)
+    return x * x
+
+
+def test_crashed_worker_fails_only_its_task():
+    results, crashed = [], []
+    run_isolated(_square_or_crash, [(x,) for x in range(8)], 2, results.append,
+                 lambda args, e: crashed.append(args))
+    assert sorted(results) == [x * x for x in range(8) if x != 3]
+    assert crashed == [(3,)]
+
+
+def test_failed_site_disarms_the_timer(monkeypatch):
+    def fail(*args, **kwargs):
+        raise ValueError('bad site')
+
+    monkeypatch.setattr(batch_forecast, 'forecast_site', fail)
+    forecasts, summary = run_batch([('Alpha', pd.DataFrame())], n_jobs=1, timeout=30)
+    assert summary.loc[0, 'status'] == 'failed'
+    assert signal.getitimer(signal.ITIMER_REAL) == (0.0, 0.0)
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from ets_baseline import align_series, ets_forecast, fit_ets
+
+
+def _holt_winters(alpha, beta, gamma, n=360, m=12, seed=0):
+    """Series from the additive Holt-Winters error-correction recursions fit_ets assumes."""
+    rng = np.random.default_rng(seed)
+    level, slope = 20.0, 0.02
+    season = list(3 * np.sin(2 * np.pi * np.arange(m) / m))
+    y = np.empty(n)
+    for t in range(n):
+        e = rng.normal()
+        y[t] = level + slope + season[t % m] + e
+        level += slope + alpha * e
+        slope += beta * e
+        season[t % m] += gamma * e
+    return pd.Series(y, index=pd.date_range('1990-01-01', periods=n, freq='MS'))
+
+
+def test_fit_ets_recovers_smoothing_parameters():
+    truth = (0.3, 0.01, 0.15)
+    Y, starts = align_series([_holt_winters(*truth, seed=seed) for seed in range(20)])
+    fit = fit_ets(Y, starts)
+    # Single series are noisy; the median over 20 series is close to the truth
+    medians = np.array([np.median(fit[key]) for key in ('alpha', 'beta', 'gamma')])
+    np.testing.assert_array_less(np.abs(medians - truth), [0.05, 0.01, 0.05])
+    np.testing.assert_allclose(np.median(fit['sigma2']), 1.0, rtol=0.1)
+
+
+def test_one_step_interval_uses_the_innovation_variance():
+    Y, starts = align_series([_holt_winters(0.3, 0.0, 0.1)])
+    fit = fit_ets(Y, starts, trend=False)
+    mean, lower, upper = ets_forecast(fit, 24)
+    np.testing.assert_allclose(upper[:, 0] - mean[:, 0], 1.959964 * np.sqrt(fit['sigma2']), rtol=1e-6)
+    # Intervals widen with the horizon
+    assert np.all(np.diff(upper - lower, axis=1) >= 0)
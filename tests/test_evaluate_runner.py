@@ -0,0 +1,21 @@
+import os
+
+import evaluate_runner
+from evaluate_runner import MODES, run_evaluations
+
+
+def _evaluate_or_crash(task, options, timeout, store_path=None):
+    if task['mode'] == 'daily':
+        os._exit(1)
+    return {'Site': task['Site'], 'mode': task['mode'], 'exog_vars': '', 'figure_dir': task['figure_dir'],
+            'status': 'ok', 'error': None, 'seconds': 0.0}
+
+
+def test_crashed_evaluation_fails_only_itself(monkeypatch, tmp_path):
+    monkeypatch.setattr(evaluate_runner, '_run_evaluation', _evaluate_or_crash)
+    table = run_evaluations([('Alpha', 'Alpha.csv'), ('Beta', 'Beta.csv')], output_dir=str(tmp_path), n_jobs=2)
+    assert len(table) == 2 * len(MODES)
+    failed = table[table['status'] == 'failed']
+    assert sorted(failed['mode']) == ['daily', 'daily']
+    assert failed['error'].str.startswith('worker crashed').all()
+    assert (table.loc[table['mode'] != 'daily', 'status'] == 'ok').all()
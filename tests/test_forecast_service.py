@@ -0,0 +1,64 @@
+import os
+
+from forecast_service import ForecastService, parse_site
+
+
+def test_parse_site_names_path_after_file():
+    assert parse_site(os.path.join('data', 'Alpha_InputData.csv')) == ('Alpha', os.path.join('data', 'Alpha_InputData.csv'))
+    assert parse_site('Beta=data/Beta_InputData.csv') == ('Beta', 'data/Beta_InputData.csv')
+
+
+class StubModel:
+    def __init__(self, key, size=0):
+        self.key = key
+        self.payload = b'x' * size
+        self.horizons = []
+
+    def forecast(self, periods):
+        self.horizons.append(periods)
+
+
+class StubService(ForecastService):
+    """ForecastService whose _build returns a stub instead of fitting."""
+
+    def __init__(self, size=0, **kwargs):
+        super().__init__(sites={}, **kwargs)
+        self.size = size
+        self.built = []
+
+    def _build(self, *key):
+        self.built.append(key)
+        return StubModel(key, self.size)
+
+
+def test_lru_hits_misses_and_eviction_order():
+    service = StubService(max_models=2, max_horizon=6)
+    a = service.get_model('A')
+    service.get_model('B')
+    assert service.get_model('A') is a
+    service.get_model('C')
+
+    assert [key[0] for key in service.cache_info()['keys']] == ['A', 'C']
+    assert (service.hits, service.misses) == (1, 3)
+    assert a.horizons == [6]
+    service.get_model('B')
+    assert [key[0] for key in service.built] == ['A', 'B', 'C', 'B']
+
+
+def test_lru_byte_bound_keeps_newest_entry():
+    service = StubService(size=1000, max_models=10, max_bytes=2500)
+    for site in 'ABC':
+        service.get_model(site)
+    assert [key[0] for key in service.cache_info()['keys']] == ['B', 'C']
+
+    service.max_bytes = 10
+    service.get_model('D')
+    assert [key[0] for key in service.cache_info()['keys']] == ['D']
+
+
+def test_add_site_evicts_only_that_site():
+    service = StubService()
+    service.get_model('A', exog_vars=['Radn'])
+    service.get_model('B')
+    service.add_site('A', 'A_InputData.csv')
+    assert [key[0] for key in service.cache_info()['keys']] == ['B']
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from model_update import update_site
+
+SETTINGS = dict(seasonal=False, start_p=0, start_q=0, max_p=1, max_q=1, d=0, stepwise=True)
+
+
+def _monthly(n=36, seed=0):
+    index = pd.date_range('2000-01-01', periods=n, freq='MS')
+    values = 20 + 5 * np.sin(np.arange(n) * 2 * np.pi / 12) + np.random.default_rng(seed).normal(size=n)
+    return pd.DataFrame({'Soil.Temp': values}, index=index)
+
+
+def _update(data, store_dir):
+    return update_site('Alpha', data, 'Soil.Temp', store_dir=str(store_dir), main_search_settings=SETTINGS,
+                       reselect_every=None, error_ratio=None)
+
+
+def test_partial_last_month_is_refiltered_not_reselected(tmp_path):
+    data = _monthly()
+    assert _update(data, tmp_path)['status'] == 'selected'
+    assert _update(data, tmp_path)['status'] == 'unchanged'
+
+    completed = data.copy()
+    completed.iloc[-1, 0] += 1.0
+    summary = _update(completed, tmp_path)
+    assert (summary['status'], summary['new_months']) == ('updated', 0)
+    assert _update(completed, tmp_path)['status'] == 'unchanged'
+
+    revised = completed.copy()
+    revised.iloc[10, 0] += 1.0
+    summary = _update(revised, tmp_path)
+    assert (summary['status'], summary['reason']) == ('reselected', 'earlier months changed')
@@ -0,0 +1,47 @@
+import os
+
+import monthly_data
+
+
+def _site_csv(path, temperature=25):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rows = [f'{day}/{month}/2000,30,{temperature + month}' for month in (1, 2) for day in (1, 2)]
+    path.write_text('\n'.join(['Date,T.Max,Soil_Temperature'] + rows) + '\n')
+    return str(path)
+
+
+def test_monthly_means_from_cache(tmp_path):
+    csv = _site_csv(tmp_path / 'a' / 'site.csv')
+    cache = str(tmp_path / 'cache')
+    _, first = monthly_data.load_frames(csv, cache)
+    _, cached = monthly_data.load_frames(csv, cache)
+    assert first['Soil_Temperature'].tolist() == [26, 27]
+    assert cached.equals(first)
+    assert len(os.listdir(cache)) == 1
+
+
+def test_same_named_sources_keep_their_own_cache(tmp_path):
+    cache = str(tmp_path / 'cache')
+    a = _site_csv(tmp_path / 'a' / 'site.csv', temperature=10)
+    b = _site_csv(tmp_path / 'b' / 'site.csv', temperature=20)
+    c = _site_csv(tmp_path / 'a' / 'site-2.csv', temperature=30)
+    for csv in (a, b, c):
+        monthly_data.load_frames(csv, cache)
+    assert len(os.listdir(cache)) == 3
+    assert monthly_data.load_monthly(a, cache)['Soil_Temperature'].iloc[0] == 11
+    assert monthly_data.load_monthly(b, cache)['Soil_Temperature'].iloc[0] == 21
+
+
+def test_edited_source_replaces_only_its_stale_cache(tmp_path):
+    cache = str(tmp_path / 'cache')
+    a = _site_csv(tmp_path / 'a' / 'site.csv', temperature=10)
+    b = _site_csv(tmp_path / 'b' / 'site.csv', temperature=20)
+    monthly_data.load_frames(a, cache)
+    monthly_data.load_frames(b, cache)
+    before = set(os.listdir(cache))
+
+    _site_csv(tmp_path / 'a' / 'site.csv', temperature=15)
+    assert monthly_data.load_monthly(a, cache)['Soil_Temperature'].iloc[0] == 16
+    after = set(os.listdir(cache))
+    assert len(after) == 2
+    assert len(before & after) == 1
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import norm
+
+from sarima_ensemble import ensemble_weights, mixture_quantiles
+
+
+def test_akaike_weights_and_failed_components():
+    table = pd.DataFrame({'aic': [100.0, 102.0, np.nan], 'backtest_rmse': np.nan,
+                          'status': ['ok', 'ok', 'failed']})
+    e = np.exp(-1)
+    np.testing.assert_allclose(ensemble_weights(table, 'aic'), [1 / (1 + e), e / (1 + e), 0])
+
+
+def test_backtest_weights_are_inverse_mse():
+    table = pd.DataFrame({'aic': [100.0, 50.0], 'backtest_rmse': [1.0, 2.0], 'status': ['ok', 'ok']})
+    np.testing.assert_allclose(ensemble_weights(table, 'backtest'), [0.8, 0.2])
+
+
+def test_weights_errors():
+    table = pd.DataFrame({'aic': [np.nan], 'backtest_rmse': [np.nan], 'status': ['failed']})
+    with pytest.raises(ValueError, match='No ensemble component'):
+        ensemble_weights(table, 'backtest')
+    with pytest.raises(ValueError, match='Unknown weighting'):
+        ensemble_weights(table, 'equal')
+
+
+def test_mixture_quantiles_single_normal():
+    quantiles = mixture_quantiles(np.array([[0.0, 10.0]]), np.array([[1.0, 2.0]]), [1.0], [0.025, 0.5, 0.975])
+    np.testing.assert_allclose(quantiles, [[-1.959964, 10 - 2 * 1.959964], [0, 10], [1.959964, 10 + 2 * 1.959964]],
+                               atol=1e-6)
+
+
+def test_mixture_quantiles_two_normals():
+    means, stds, weights = np.array([[-1.0], [1.0]]), np.array([[1.0], [1.0]]), [0.5, 0.5]
+    lower, median, upper = mixture_quantiles(means, stds, weights, [0.1, 0.5, 0.9])[:, 0]
+    assert median == pytest.approx(0, abs=1e-9)
+    assert upper == pytest.approx(-lower)
+    cdf = 0.5 * norm.cdf(upper + 1) + 0.5 * norm.cdf(upper - 1)
+    assert cdf == pytest.approx(0.9)
@@ -0,0 +1,65 @@
+import multiprocessing
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import sarima_search
+from sarima_search import best_candidate, screen_candidates, search_orders
+
+
+def _series(n=120, seed=0):
+    t = np.arange(n)
+    values = 20 + 5 * np.sin(2 * np.pi * t / 12) + np.random.default_rng(seed).normal(size=n)
+    return pd.Series(values, index=pd.date_range('2000-01-01', periods=n, freq='MS'))
+
+
+def test_pruned_candidates_are_not_fitted():
+    table = search_orders(_series(), m=12, max_p=1, max_q=1, max_P=1, max_Q=0, d=0, D=0, max_order=1, n_jobs=1)
+    assert len(table) == 8
+    orders = table['order'].map(lambda o: o[0] + o[2]) + table['seasonal_order'].map(lambda s: s[0] + s[2])
+    assert set(table.loc[orders > 1, 'status']) == {'pruned'}
+    assert set(table.loc[orders <= 1, 'status']) == {'ok'}
+    assert best_candidate(table)['aic'] == table.loc[table['status'] == 'ok', 'aic'].min()
+
+
+def test_prescreen_fits_only_the_top_k():
+    table = search_orders(_series(), m=12, max_p=2, max_q=1, max_P=1, max_Q=0, d=0, D=0, n_jobs=1, prescreen_top_k=3)
+    assert (table['status'] == 'ok').sum() == 3
+    assert (table['status'] == 'screened').sum() == len(table) - 3
+    assert table['screen_ic'].notna().all()
+
+
+def test_timeout_stops_running_workers():
+    start = time.monotonic()
+    table = search_orders(_series(), m=12, d=0, D=1, n_jobs=2, timeout=3)
+    assert time.monotonic() - start < 10
+    assert (table['status'] == 'timeout').any()
+    assert multiprocessing.active_children() == []
+
+
+def test_error_while_collecting_stops_running_workers(monkeypatch):
+    def interrupt(*args, **kwargs):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(sarima_search, 'print', interrupt, raising=False)
+    with pytest.raises(KeyboardInterrupt):
+        search_orders(_series(), m=12, d=0, D=1, n_jobs=2, trace=True)
+    assert multiprocessing.active_children() == []
+
+
+def test_screening_ranks_the_true_order_near_the_top():
+    rng = np.random.default_rng(1)
+    e = rng.normal(size=600)
+    y = np.zeros(600)
+    for t in range(2, 600):
+        y[t] = 0.6 * y[t - 1] - 0.3 * y[t - 2] + e[t]
+    candidates = [((p, 0, q), (0, 0, 0, 0)) for p in range(4) for q in range(3)]
+    scores = screen_candidates(y, candidates)
+    # A cheap ranking: the true order makes the top 3 that a prescreen would fit, and
+    # every candidate with fewer AR lags scores worse than it
+    true_score = scores[candidates.index(((2, 0, 0), (0, 0, 0, 0)))]
+    assert true_score <= np.sort(scores)[2]
+    assert min(score for ((p, _, _), _), score in zip(candidates, scores) if p < 2) > true_score
+    assert np.isnan(screen_candidates(y[:12], candidates)).all()
@@ -0,0 +1,52 @@
+import warnings
+
+import numpy as np
+import pytest
+from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+from sarima_simulation import simulate_paths
+
+N_PATHS = 20000
+
+
+def _fit(exog=False, seed=0, n=240):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=(n, 1))
+    y = np.zeros(n)
+    e = rng.normal(size=n)
+    for t in range(1, n):
+        y[t] = 0.7 * y[t - 1] + e[t]
+    y = y + 10 + 3 * np.sin(2 * np.pi * np.arange(n) / 12) + (2 * x[:, 0] if exog else 0)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return SARIMAX(y, exog=x if exog else None, order=(1, 0, 1), seasonal_order=(1, 0, 0, 12),
+                       trend='c').fit(disp=False)
+
+
+def _check_moments(paths, forecast):
+    mean, std = np.asarray(forecast.predicted_mean), np.sqrt(np.asarray(forecast.var_pred_mean))
+    # Monte Carlo error of the mean is std / sqrt(N); of the std and the quantiles a few percent of std
+    np.testing.assert_array_less(np.abs(paths.mean(axis=0) - mean), 4 * std / np.sqrt(N_PATHS))
+    np.testing.assert_allclose(paths.std(axis=0), std, rtol=0.03)
+    lower, upper = np.asarray(forecast.conf_int()).T
+    np.testing.assert_array_less(np.abs(np.quantile(paths, 0.025, axis=0) - lower), 0.06 * std)
+    np.testing.assert_array_less(np.abs(np.quantile(paths, 0.975, axis=0) - upper), 0.06 * std)
+
+
+def test_paths_match_get_forecast_moments():
+    results = _fit()
+    paths = simulate_paths(results, 24, N_PATHS, rng=0)
+    assert paths.shape == (N_PATHS, 24)
+    _check_moments(paths, results.get_forecast(24))
+
+
+def test_fixed_exog_paths_match_get_forecast():
+    results = _fit(exog=True)
+    future = np.random.default_rng(1).normal(size=(12, 1))
+    paths = simulate_paths(results, 12, N_PATHS, exog_paths=np.broadcast_to(future, (N_PATHS, 12, 1)), rng=0)
+    _check_moments(paths, results.get_forecast(12, exog=future))
+
+
+def test_exog_model_needs_exog_paths():
+    with pytest.raises(ValueError, match='exog_paths'):
+        simulate_paths(_fit(exog=True), 12, 10)
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from soil_temp_calibration import calibrate_sites
+from soil_temp_model import DAY_SECONDS, soil_temperature
+
+
+def _observations(site, alpha, depths_cm=(5, 10, 20), days=10, seed=0):
+    """Hourly 'observations' from the soil temperature model at several depths."""
+    rng = np.random.default_rng(seed)
+    t_sec = np.arange(days * 24) * 3600.0
+    tmax = np.repeat(rng.uniform(30, 38, days), 24)
+    tmin = np.repeat(rng.uniform(15, 22, days), 24)
+    frames = [pd.DataFrame({'Site': site, 't_sec': t_sec, 'Depth_cm': depth, 'T.Max': tmax, 'T.Min': tmin,
+                            'Observed': soil_temperature(t_sec, tmax, tmin, depth / 100, alpha)})
+              for depth in depths_cm]
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_calibration_recovers_known_alpha():
+    observations = pd.concat([_observations('Alpha', 5e-7), _observations('Beta', 2e-7, seed=1)], ignore_index=True)
+    params = calibrate_sites(observations).set_index('Site')
+    np.testing.assert_allclose(params.loc[['Alpha', 'Beta'], 'alpha'], [5e-7, 2e-7], rtol=1e-4)
+    # soil_temperature is the calibrated model with no extra damping or phase lag
+    np.testing.assert_allclose(params['damping'], 1, atol=1e-6)
+    np.testing.assert_allclose(params['phase_lag'], 0, atol=1e-6)
+    np.testing.assert_allclose(params['damping_depth_cm'], np.sqrt(params['alpha'] * DAY_SECONDS / np.pi) * 100)
+    assert (params['RMSE'] < 1e-6).all()
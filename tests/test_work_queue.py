@@ -0,0 +1,104 @@
+import json
+import os
+import time
+
+import pytest
+
+import work_queue
+
+
+def _site_csv(path, rows=3):
+    lines = ['Date,T.Max,Soil_Temperature'] + [f'{day}/1/2000,30,25' for day in range(1, rows + 1)]
+    path.write_text('\n'.join(lines) + '\n')
+    return str(path)
+
+
+def _age(path, seconds):
+    old = time.time() - seconds
+    os.utime(path, (old, old))
+
+
+def test_claim_of_old_pending_job_is_not_stale(tmp_path):
+    queue = str(tmp_path / 'queue')
+    [jid] = work_queue.enqueue([_site_csv(tmp_path / 'Alpha_site.csv')], queue)
+    _age(os.path.join(queue, 'pending', f'{jid}.json'), 600)
+
+    claimed_jid, claim_path, job = work_queue.claim(queue, worker='w1')
+    assert claimed_jid == jid
+    assert work_queue.requeue_stale(queue, stale_after=300, worker='w2') == []
+    assert os.path.exists(claim_path)
+
+
+def test_stale_claim_is_requeued_then_failed(tmp_path):
+    queue = str(tmp_path / 'queue')
+    [jid] = work_queue.enqueue([_site_csv(tmp_path / 'Alpha_site.csv')], queue)
+    for attempt in range(1, 3):
+        _, claim_path, _ = work_queue.claim(queue, worker='w1')
+        _age(claim_path, 600)
+        assert work_queue.requeue_stale(queue, stale_after=300, max_attempts=3, worker='w2') == [jid]
+        with open(os.path.join(queue, 'pending', f'{jid}.json')) as f:
+            assert json.load(f)['attempts'] == attempt
+
+    _, claim_path, _ = work_queue.claim(queue, worker='w1')
+    _age(claim_path, 600)
+    assert work_queue.requeue_stale(queue, stale_after=300, max_attempts=3, worker='w2') == []
+    with open(os.path.join(queue, 'results', f'{jid}.json')) as f:
+        assert json.load(f)['status'] == 'failed'
+
+
+def test_requeue_interrupted_after_takeover_is_swept_again(tmp_path, monkeypatch):
+    queue = str(tmp_path / 'queue')
+    [jid] = work_queue.enqueue([_site_csv(tmp_path / 'Alpha_site.csv')], queue)
+    _, claim_path, _ = work_queue.claim(queue, worker='w1')
+    _age(claim_path, 600)
+
+    def crash(path, text):
+        raise SystemExit('worker died')
+
+    # w2 dies between taking the claim over and writing the job back to pending
+    with monkeypatch.context() as patch:
+        patch.setattr(work_queue, '_write_atomic', crash)
+        with pytest.raises(SystemExit):
+            work_queue.requeue_stale(queue, stale_after=300, worker='w2')
+    [takeover] = os.listdir(os.path.join(queue, 'claimed'))
+    assert takeover == f'{jid}@requeue-w2.json'
+    # Its heartbeat is fresh, so it is not swept before it goes stale
+    assert work_queue.requeue_stale(queue, stale_after=300, worker='w3') == []
+
+    _age(os.path.join(queue, 'claimed', takeover), 600)
+    assert work_queue.requeue_stale(queue, stale_after=300, worker='w3') == [jid]
+    assert os.listdir(os.path.join(queue, 'claimed')) == []
+    assert work_queue.claim(queue, worker='w4')[0] == jid
+
+
+def test_heartbeat_touches_before_first_wait(tmp_path):
+    path = tmp_path / 'claim.json'
+    path.write_text('{}')
+    _age(path, 600)
+    stop = work_queue.threading.Event()
+    stop.set()
+    work_queue._heartbeat(str(path), stop, interval=3600)
+    assert time.time() - os.path.getmtime(path) < 60
+
+
+def test_enqueue_skips_same_input_but_not_updated_input(tmp_path):
+    queue = str(tmp_path / 'queue')
+    csv = _site_csv(tmp_path / 'Alpha_site.csv')
+    [first] = work_queue.enqueue([csv], queue)
+    assert work_queue.enqueue([csv], queue) == []
+
+    _site_csv(tmp_path / 'Alpha_site.csv', rows=4)
+    [second] = work_queue.enqueue([csv], queue)
+    assert second != first
+
+
+def test_collect_keeps_latest_run_of_a_site(tmp_path):
+    queue = str(tmp_path / 'queue')
+    work_queue.init_queue(queue)
+    for jid, finished_at, error in [('Alpha-new', 2.0, 'new'), ('Alpha-old', 1.0, 'old')]:
+        summary = {'Site': 'Alpha', 'status': 'failed', 'error': error, 'lineage': 'Alpha-x', 'finished_at': finished_at}
+        with open(os.path.join(queue, 'results', f'{jid}.json'), 'w') as f:
+            json.dump(summary, f)
+
+    _, summary = work_queue.collect(queue)
+    assert summary['error'].tolist() == ['new']
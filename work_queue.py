@@ -0,0 +1,340 @@
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+from batch_forecast import FORECAST_COLUMNS, SUMMARY_COLUMNS, _run_task, collect_sites
+from forecast_service import DEFAULT_TARGET, parse_site
+from monthly_data import file_fingerprint, load_daily
+
+DEFAULT_QUEUE_DIR = 'work_queue'
+
+# A claim whose file has not been touched for STALE_AFTER seconds belongs to a
+# worker that died or lost the share; it goes back to pending
+HEARTBEAT_INTERVAL = 30
+STALE_AFTER = 300
+
+# Claims requeued this many times (e.g. a site that keeps killing its worker) are failed
+MAX_ATTEMPTS = 3
+
+# Layout of a queue directory shared between machines:
+#   pending/<job>.json             jobs waiting for a worker
+#   claimed/<job>@<worker>.json    jobs being worked on; mtime is the heartbeat
+#                                  (<worker> is requeue-<worker> while a stale claim is requeued)
+#   results/<job>.csv              forecast rows of a finished job
+#   results/<job>.json             its summary row; written last, marks the job as done
+QUEUE_FOLDERS = ('pending', 'claimed', 'results')
+
+
+def _folder(queue_dir, name):
+    return os.path.join(queue_dir, name)
+
+
+def _write_atomic(path, text):
+    """Write to a temporary file in the same folder and rename it into place."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def job_id(job):
+    """
+    Stable id from the job's site, input (path and content fingerprint)
+    and options. Enqueuing the same work twice gives the same id, so it is
+    only queued and run once; an updated input file is a new job.
+    """
+    spec = json.dumps({k: job.get(k) for k in ('site', 'path', 'fingerprint', 'split', 'options', 'timeout')},
+                      sort_keys=True)
+    name = ''.join(c if c.isalnum() or c in '-_' else '_' for c in job['site'])
+    return f"{name}-{hashlib.sha1(spec.encode()).hexdigest()[:10]}"
+
+
+def init_queue(queue_dir=DEFAULT_QUEUE_DIR):
+    for name in QUEUE_FOLDERS:
+        os.makedirs(_folder(queue_dir, name), exist_ok=True)
+
+
+def enqueue(paths, queue_dir=DEFAULT_QUEUE_DIR, periods=12, target=DEFAULT_TARGET, exog_vars=(), timeout=None,
+            store_dir=None, main_search_settings=None, exog_search_settings=None, sarimax_kwargs=None):
+    """
+    Add one job per site to the queue. Sites are collected like in
+    batch_forecast (site files or multi-site CSVs with a Site column);
+    paths are stored absolute, so the share must be mounted at the same
+    path on every machine.
+
+    Returns the ids of the newly queued jobs. Jobs that are already
+    pending, claimed or finished are not queued again, unless the input
+    file's contents have changed since.
+    """
+    init_queue(queue_dir)
+    options = dict(periods=periods, target=target, exog_vars=list(exog_vars),
+                   store_dir=os.path.abspath(store_dir) if store_dir else None,
+                   main_search_settings=main_search_settings, exog_search_settings=exog_search_settings,
+                   sarimax_kwargs=sarimax_kwargs)
+    queued = []
+    for path in paths:
+        file_path = os.path.abspath(parse_site(path)[1])
+        fingerprint = file_fingerprint(file_path)
+        for site, source in collect_sites([path]):
+            # Sites of a multi-site CSV are read from the shared file by the worker
+            job = dict(site=site, path=file_path, fingerprint=fingerprint, split=not isinstance(source, str),
+                       options=options, timeout=timeout, attempts=0)
+            jid = job_id(job)
+            if (os.path.exists(os.path.join(_folder(queue_dir, 'results'), f'{jid}.json'))
+                    or os.path.exists(os.path.join(_folder(queue_dir, 'pending'), f'{jid}.json'))
+                    or glob.glob(os.path.join(_folder(queue_dir, 'claimed'), f'{jid}@*.json'))):
+                continue
+            _write_atomic(os.path.join(_folder(queue_dir, 'pending'), f'{jid}.json'), json.dumps(job, indent=2))
+            queued.append(jid)
+    return queued
+
+
+def claim(queue_dir=DEFAULT_QUEUE_DIR, worker=None):
+    """
+    Claim the next pending job by renaming it into claimed/. The rename
+    is atomic, so when several workers race for a job exactly one wins.
+
+    Returns (job id, claim path, job) or None when nothing is pending.
+    """
+    worker = worker or worker_id()
+    pending = _folder(queue_dir, 'pending')
+    for name in sorted(os.listdir(pending)):
+        if not name.endswith('.json'):
+            continue
+        jid = name[:-len('.json')]
+        claim_path = os.path.join(_folder(queue_dir, 'claimed'), f'{jid}@{worker}.json')
+        try:
+            os.rename(os.path.join(pending, name), claim_path)
+            # The rename keeps the pending file's mtime; without a fresh heartbeat a job
+            # that waited longer than STALE_AFTER would look stale as soon as it is claimed
+            os.utime(claim_path)
+        except FileNotFoundError:
+            # Another worker got there first
+            continue
+        with open(claim_path) as f:
+            return jid, claim_path, json.load(f)
+    return None
+
+
+def _heartbeat(claim_path, stop, interval):
+    """Touch the claim file now and then every `interval` until `stop` is set, so other workers can tell this one is alive."""
+    while True:
+        try:
+            os.utime(claim_path)
+        except FileNotFoundError:
+            # The claim was requeued after all; the result is written either way
+            return
+        if stop.wait(interval):
+            return
+
+
+def requeue_stale(queue_dir=DEFAULT_QUEUE_DIR, stale_after=STALE_AFTER, max_attempts=MAX_ATTEMPTS, worker=None):
+    """
+    Put claims without a heartbeat for `stale_after` seconds back to
+    pending. A job that has gone stale `max_attempts` times is recorded
+    as failed instead. Returns the ids of the jobs that were requeued.
+    """
+    worker = worker or worker_id()
+    claimed, requeued = _folder(queue_dir, 'claimed'), []
+    now = time.time()
+    for name in sorted(os.listdir(claimed)):
+        if not name.endswith('.json') or '@' not in name:
+            continue
+        path = os.path.join(claimed, name)
+        try:
+            if now - os.path.getmtime(path) < stale_after:
+                continue
+            # Take the claim over first, so only one worker requeues it. The takeover is itself
+            # a claim with a fresh heartbeat: if this worker dies before removing it, a later
+            # sweep finds it stale and requeues the job
+            jid = name.split('@')[0]
+            own_path = os.path.join(claimed, f'{jid}@requeue-{worker}.json')
+            os.rename(path, own_path)
+            os.utime(own_path)
+        except FileNotFoundError:
+            continue
+        with open(own_path) as f:
+            job = json.load(f)
+        job['attempts'] = job.get('attempts', 0) + 1
+        if job['attempts'] >= max_attempts:
+            summary = {'Site': job['site'], 'status': 'failed', 'seconds': float('nan'),
+                       'error': f"worker lost {job['attempts']} times"}
+            _write_atomic(os.path.join(_folder(queue_dir, 'results'), f'{jid}.json'), json.dumps(summary))
+        else:
+            _write_atomic(os.path.join(_folder(queue_dir, 'pending'), f'{jid}.json'), json.dumps(job, indent=2))
+            requeued.append(jid)
+        os.remove(own_path)
+    return requeued
+
+
+def run_job(queue_dir, jid, claim_path, job, heartbeat_interval=HEARTBEAT_INTERVAL):
+    """
+    Forecast one claimed job and write its results. Results are written
+    under the job id with atomic renames, so a job that ends up running
+    twice (a slow worker whose claim was requeued) just writes the same
+    files again.
+    """
+    results = _folder(queue_dir, 'results')
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(claim_path, stop, heartbeat_interval), daemon=True)
+    beat.start()
+    try:
+        source = job['path']
+        if job['split']:
+            df = load_daily(source)
+            source = df[df['Site'].astype(str) == job['site']].drop(columns='Site')
+        summary, table = _run_task(job['site'], source, job['options'], job['timeout'])
+    finally:
+        stop.set()
+        beat.join()
+
+    if table is not None:
+        _write_atomic(os.path.join(results, f'{jid}.csv'), table.to_csv(index=False))
+    # Runs of the same site and options on earlier versions of the input share a lineage;
+    # collect keeps the latest
+    summary.update(worker=worker_id(), attempts=job.get('attempts', 0) + 1,
+                   lineage=job_id(dict(job, fingerprint=None)), finished_at=time.time())
+    _write_atomic(os.path.join(results, f'{jid}.json'), json.dumps(summary, default=str))
+    try:
+        os.remove(claim_path)
+    except FileNotFoundError:
+        pass
+    return summary
+
+
+def work(queue_dir=DEFAULT_QUEUE_DIR, max_jobs=None, stale_after=STALE_AFTER, heartbeat_interval=HEARTBEAT_INTERVAL,
+         max_attempts=MAX_ATTEMPTS, wait=False, poll_interval=10):
+    """
+    Worker loop: claim, run and record jobs until the queue is empty (or
+    `max_jobs` have run). With `wait`, keep polling for new or requeued
+    jobs while other workers still hold claims. Any number of workers on
+    any number of machines can share one queue directory.
+    """
+    init_queue(queue_dir)
+    worker, done = worker_id(), 0
+    while max_jobs is None or done < max_jobs:
+        requeue_stale(queue_dir, stale_after, max_attempts, worker)
+        claimed = claim(queue_dir, worker)
+        if claimed is None:
+            if wait and os.listdir(_folder(queue_dir, 'claimed')):
+                time.sleep(poll_interval)
+                continue
+            break
+        jid, claim_path, job = claimed
+        result_path = os.path.join(_folder(queue_dir, 'results'), f'{jid}.json')
+        if os.path.exists(result_path):
+            # Finished by a worker whose claim had been requeued; nothing left to do
+            os.remove(claim_path)
+            continue
+        summary = run_job(queue_dir, jid, claim_path, job, heartbeat_interval)
+        done += 1
+        print(f"  [{worker}] {summary['Site']}: {summary['status']} ({summary['seconds']:.1f} s)"
+              + (f" - {summary['error']}" if summary['error'] else ""), flush=True)
+    return done
+
+
+def queue_status(queue_dir=DEFAULT_QUEUE_DIR):
+    """Number of pending, claimed and finished jobs."""
+    return {name: sum(n.endswith('.json') for n in os.listdir(_folder(queue_dir, name)))
+            for name in QUEUE_FOLDERS if os.path.isdir(_folder(queue_dir, name))}
+
+
+def collect(queue_dir=DEFAULT_QUEUE_DIR):
+    """
+    (forecasts, summary) over all finished jobs, in the same format as
+    batch_forecast. When a site was rerun on an updated input file, only
+    its latest run is kept.
+    """
+    results = _folder(queue_dir, 'results')
+    runs = []
+    for path in sorted(glob.glob(os.path.join(results, '*.json'))):
+        with open(path) as f:
+            runs.append((path, json.load(f)))
+    latest = {}
+    for path, summary in sorted(runs, key=lambda run: run[1].get('finished_at') or 0):
+        latest[summary.get('lineage') or path] = (path, summary)
+
+    summaries, tables = [], []
+    for path, summary in latest.values():
+        summaries.append(summary)
+        csv_path = path[:-len('.json')] + '.csv'
+        if summary['status'] == 'ok' and os.path.exists(csv_path):
+            tables.append(pd.read_csv(csv_path, parse_dates=['Date', 'Last Observed']))
+
+    forecasts = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=FORECAST_COLUMNS)
+    summary = pd.DataFrame(summaries).reindex(columns=SUMMARY_COLUMNS + ['worker', 'attempts'])
+    return (forecasts.sort_values(['Site', 'Date']).reset_index(drop=True),
+            summary.sort_values('Site').reset_index(drop=True))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Shared-directory work queue for batch site forecasts.')
+    parser.add_argument('--queue', default=DEFAULT_QUEUE_DIR, help='Queue directory (shared between machines)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    parser_enqueue = commands.add_parser('enqueue', help='Queue one job per site')
+    parser_enqueue.add_argument('files', nargs='+',
+                                help='Daily site CSVs (glob patterns and Name=path allowed), or a multi-site CSV with a Site column')
+    parser_enqueue.add_argument('--periods', type=int, default=12, help='Months to forecast')
+    parser_enqueue.add_argument('--target', default=DEFAULT_TARGET, help='Column to forecast')
+    parser_enqueue.add_argument('--exog', nargs='*', default=[], help='Exogenous variables')
+    parser_enqueue.add_argument('--timeout', type=float, help='Per-site time limit in seconds')
+    parser_enqueue.add_argument('--store', help='Model store directory for reusing fitted models')
+
+    parser_work = commands.add_parser('work', help='Run queued jobs')
+    parser_work.add_argument('--processes', type=int, default=1, help='Worker processes on this machine')
+    parser_work.add_argument('--max-jobs', type=int, help='Stop each worker after this many jobs')
+    parser_work.add_argument('--stale-after', type=float, default=STALE_AFTER,
+                             help='Seconds without a heartbeat before a claim is requeued')
+    parser_work.add_argument('--heartbeat', type=float, default=HEARTBEAT_INTERVAL, help='Heartbeat interval in seconds')
+    parser_work.add_argument('--wait', action='store_true', help='Keep polling while other workers hold claims')
+
+    parser_collect = commands.add_parser('collect', help='Consolidate finished jobs')
+    parser_collect.add_argument('-o', '--output', default='batch_forecast.csv', help='Consolidated forecast table (CSV)')
+
+    commands.add_parser('status', help='Show job counts')
+    args = parser.parse_args()
+
+    if args.command == 'enqueue':
+        paths = [path for pattern in args.files for path in (sorted(glob.glob(pattern)) or [pattern])]
+        queued = enqueue(paths, args.queue, args.periods, args.target, args.exog, args.timeout, args.store)
+        print(f"Queued {len(queued)} job(s) in {args.queue}")
+
+    elif args.command == 'work':
+        options = dict(queue_dir=args.queue, max_jobs=args.max_jobs, stale_after=args.stale_after,
+                       heartbeat_interval=args.heartbeat, wait=args.wait)
+        start = time.perf_counter()
+        if args.processes == 1:
+            work(**options)
+        else:
+            workers = [multiprocessing.Process(target=work, kwargs=options) for _ in range(args.processes)]
+            for process in workers:
+                process.start()
+            for process in workers:
+                process.join()
+        print(f"Done in {time.perf_counter() - start:.1f} s")
+
+    elif args.command == 'collect':
+        forecasts, summary = collect(args.queue)
+        forecasts.to_csv(args.output, index=False)
+        summary_file = os.path.splitext(args.output)[0] + '_summary.csv'
+        summary.to_csv(summary_file, index=False)
+        print(summary['status'].value_counts().to_string())
+        print(f"Forecasts saved to: {args.output}")
+        print(f"Site summary saved to: {summary_file}")
+
+    else:
+        print(json.dumps(queue_status(args.queue), indent=2))